@@ -11,15 +11,31 @@ mkdir -p frontend/public/data
 # countries
 cp data-prep/data/ne/ne_110m_admin_only.geojson frontend/public/data/ne_countries.geojson
 
+# quantized TopoJSON levels from 08_map_geometry
+mkdir -p frontend/public/data/topo
+cp data-prep/data/out/topo/countries_*.json frontend/public/data/topo/
+
 # radio
-for f in data-prep/data/out/stations_*.jsonl; do
-  cp "$f" frontend/public/data/
+# chunks from 06_split_chunks: stations_{i}.jsonl, .bin, or compressed .gz/.zst
+# (only the files index.json lists, never leftovers from an earlier build)
+for f in $(python3 -c 'import json; print("\n".join(json.load(open("data-prep/data/out/index.json"))["config"]["chunk_files"]))'); do
+  cp "data-prep/data/out/$f" frontend/public/data/
 done
 cp data-prep/data/out/index.json frontend/public/data/index.json
+# offset table, only present for the variable-width layout
+[ -f data-prep/data/out/offsets.bin ] && cp data-prep/data/out/offsets.bin frontend/public/data/offsets.bin
+
+# daily challenge bundles from 07_daily_bundles
+cp data-prep/data/out/daily.jsonl frontend/public/data/daily.jsonl
+cp data-prep/data/out/daily_index.json frontend/public/data/daily_index.json
 
 # country details
 cp data-prep/data/out/country_details_with_pics.json frontend/public/data/country_details_with_pics.json
 
 # copy country pics
 rm -rf frontend/public/country-pics
-cp -r data-prep/data/out/country-pics frontend/public/country-pics
\ No newline at end of file
+cp -r data-prep/data/out/country-pics frontend/public/country-pics
+
+# resized variants from 04_image_variants
+rm -rf frontend/public/country-pics-resized
+cp -r data-prep/data/out/country-pics-resized frontend/public/country-pics-resized
\ No newline at end of file
@@ -1,20 +1,11 @@
 #!/bin/zsh
 
-# clear files in data/out except .gitkeep
-rm -rf data
-
 # Create virtual environment if it doesn't exist
 [ ! -d ".venv" ] && uv venv
 
-uv run scripts/01_load_data.py
-uv run scripts/02_centroids.py
-uv run scripts/03_filter_radio.py
-uv run scripts/04_match_radio.py
-uv run scripts/05_organize.py
-uv run scripts/06_split_chunks.py
-
-# country details
-uv run scripts/country-details/01_scrape.py
-uv run scripts/country-details/02_get_pics.py
+# Run every stage whose inputs changed since the last run (01 -> 06 plus
+# country details). Pass --force to rebuild everything, or stage names to
+# build a subset, e.g. ./run_py.sh 05_organize
+uv run scripts/pipeline.py "$@"
 
-# TODO: replace with manually selected images
\ No newline at end of file
+# TODO: replace with manually selected images
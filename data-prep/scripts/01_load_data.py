@@ -4,21 +4,48 @@ Natural Earth Data Loading Script
 This script downloads Natural Earth GeoJSON datasets at multiple scales
 and saves them locally for use by downstream processing scripts.
 
+METHODOLOGY:
+- Only scales that a pipeline stage declares as an input (a data/ne path in its
+  INPUT constants), plus ALWAYS_SCALES, are fetched; pass scale names or --all
+  to fetch others
+- Downloads run concurrently and stream the raw bytes straight to disk (no
+  GeoJSON parsing), replacing each file atomically once complete
+- Each file's ETag and Last-Modified are kept in a cache manifest; later runs
+  send If-None-Match / If-Modified-Since and keep the local file on 304
+- --offline skips the network and only checks that cached files exist
+- Every fetched layer is also converted (ne_io.write_layers) to each of
+  LAYER_FORMATS next to the GeoJSON. The stages read the GeoParquet copy,
+  which prunes columns on read and keeps feature order; FlatGeobuf can be
+  added for external tools that want its spatial index
+
 INPUT:
 - Natural Earth GeoJSON files fetched from GitHub (nvkelso/natural-earth-vector)
 
 OUTPUT:
-- GeoJSON files saved to data/ne/ at 10m, 50m, and 110m scales
+- GeoJSON files saved to data/ne/ at 10m, 50m, and 110m scales, plus
+  a .parquet copy of each (and .fgb if listed in LAYER_FORMATS)
+- data/ne/ne_110m_admin_only.geojson (ADMIN + geometry, copied to the frontend)
+- data/ne/cache.json with the HTTP validators of every downloaded file
 
 USAGE:
-    uv run scripts/01_load_data.py
+    uv run scripts/01_load_data.py                # scales the pipeline needs
+    uv run scripts/01_load_data.py 50m --offline  # 50m as well, from cache only
+    uv run scripts/01_load_data.py --all
 """
 
+import argparse
+import json
 import os
-import shutil
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 import geopandas as gpd
+from instrument import instrument, step
+from ne_io import LAYER_EXTENSIONS, write_layers
+from pipeline import STAGES, read_declared_paths
 from rich.console import Console
+from rich.table import Table
 
 console = Console()
 
@@ -39,6 +66,115 @@ URLS = {
 }
 
 OUTPUT_DIR = "data/ne"
+CACHE_MANIFEST = "data/ne/cache.json"
+ADMIN_ONLY_FILE = "ne_110m_admin_only.geojson"
+
+# Converted copies written next to each GeoJSON ("parquet", "fgb")
+LAYER_FORMATS = ("parquet",)
+
+# Fetched even when no stage declares them: copy.sh ships ne_110m_admin_only
+ALWAYS_SCALES = ("110m",)
+
+MAX_DOWNLOADS = 4
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+TIMEOUT_SECONDS = 60
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def scale_filename(scale):
+    return f"ne_{scale}_admin_0_countries.geojson"
+
+
+def layer_base(scale):
+    """Path of a scale's layer without extension (shared by every format)."""
+    return os.path.join(OUTPUT_DIR, os.path.splitext(scale_filename(scale))[0])
+
+
+def required_scales():
+    """Scales whose files (in any format) some pipeline stage reads, plus ALWAYS_SCALES."""
+    declared = set()
+    for script in STAGES.values():
+        if os.path.exists(script):
+            declared.update(os.path.splitext(p)[0] for p in read_declared_paths(script)[0])
+    needed = {scale for scale in URLS if os.path.normpath(layer_base(scale)) in declared}
+    return sorted(needed | set(ALWAYS_SCALES), key=list(URLS).index)
+
+
+def load_manifest():
+    if not os.path.exists(CACHE_MANIFEST):
+        return {}
+    with open(CACHE_MANIFEST, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    tmp_path = CACHE_MANIFEST + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, CACHE_MANIFEST)
+
+
+def fetch(url, path, cached):
+    """
+    Download `url` to `path`, revalidating against the cached validators.
+    Returns (status, validators) where status is "downloaded" or "not modified".
+    """
+    headers = {}
+    if cached and os.path.exists(path):
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return "not modified", cached
+        raise
+
+    # Stream to a temporary file so an interrupted download never replaces a good one
+    tmp_path = path + ".part"
+    size = 0
+    try:
+        with response, open(tmp_path, "wb") as f_out:
+            while block := response.read(DOWNLOAD_BLOCK_SIZE):
+                f_out.write(block)
+                size += len(block)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return "downloaded", {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "size": size,
+    }
+
+
+def convert_layer(scale):
+    """
+    Write the LAYER_FORMATS copies of a scale's GeoJSON (and, for 110m, the
+    minimal ADMIN-only layer for the frontend map).
+    """
+    gdf = gpd.read_file(os.path.join(OUTPUT_DIR, scale_filename(scale)))
+    write_layers(gdf, layer_base(scale), LAYER_FORMATS)
+    if scale == "110m":
+        minimal = gdf[["ADMIN", "geometry"]]
+        minimal.to_file(os.path.join(OUTPUT_DIR, ADMIN_ONLY_FILE), driver="GeoJSON")
+
+
+def needs_conversion(scale, status):
+    targets = [layer_base(scale) + LAYER_EXTENSIONS[fmt] for fmt in LAYER_FORMATS]
+    if scale == "110m":
+        targets.append(os.path.join(OUTPUT_DIR, ADMIN_ONLY_FILE))
+    return status == "downloaded" or not all(os.path.exists(t) for t in targets)
 
 
 # ==============================================================================
@@ -47,41 +183,82 @@ OUTPUT_DIR = "data/ne"
 
 
 def main():
-    console.print("\n[bold cyan]Loading Natural Earth datasets...[/bold cyan]")
+    parser = argparse.ArgumentParser(description="Download Natural Earth layers")
+    parser.add_argument("scales", nargs="*", help=f"Extra scales to fetch ({', '.join(URLS)})")
+    parser.add_argument("--all", action="store_true", help="Fetch every scale")
+    parser.add_argument("--offline", action="store_true", help="Use cached files only")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.scales if s not in URLS]
+    if unknown:
+        parser.error(f"Unknown scale(s): {', '.join(unknown)}")
+    scales = list(URLS) if args.all else required_scales()
+    scales += [s for s in args.scales if s not in scales]
 
-    # Remove output directory if it exists
-    console.print(f"Cleaning output directory: {OUTPUT_DIR}")
-    if os.path.exists(OUTPUT_DIR):
-        shutil.rmtree(OUTPUT_DIR)
-    os.makedirs(OUTPUT_DIR)
+    step("Downloading Natural Earth layers")
+    console.print("\n[bold cyan]Loading Natural Earth datasets...[/bold cyan]")
+    console.print(f"Scales: {', '.join(scales)}")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    manifest = load_manifest()
 
-    for scale, url in URLS.items():
-        console.print(f"\n[bold cyan]Processing {scale} scale...[/bold cyan]")
-        try:
-            # Load directly from URL using geopandas
-            with console.status(f"Downloading from {url}..."):
-                gdf = gpd.read_file(url)
+    results = {}
+    if args.offline:
+        for scale in scales:
+            path = os.path.join(OUTPUT_DIR, scale_filename(scale))
+            results[scale] = "cached" if os.path.exists(path) else "missing"
+    else:
+        with ThreadPoolExecutor(max_workers=MAX_DOWNLOADS) as pool:
+            futures = {
+                scale: pool.submit(
+                    fetch,
+                    URLS[scale],
+                    os.path.join(OUTPUT_DIR, scale_filename(scale)),
+                    manifest.get(scale) if manifest.get(scale, {}).get("url") == URLS[scale] else None,
+                )
+                for scale in scales
+            }
+            for scale, future in futures.items():
+                try:
+                    status, validators = future.result()
+                    manifest[scale] = validators
+                    results[scale] = status
+                except Exception as e:
+                    path = os.path.join(OUTPUT_DIR, scale_filename(scale))
+                    results[scale] = f"failed, {'using cache' if os.path.exists(path) else 'missing'}"
+                    console.print(f"[bold red]Error downloading {scale}: {e}[/bold red]")
+        save_manifest(manifest)
 
-            # Construct output filename
-            filename = f"ne_{scale}_admin_0_countries.geojson"
-            output_path = os.path.join(OUTPUT_DIR, filename)
+    step("Converting layers")
+    # Convert layers that changed or whose converted copies are missing
+    for scale in scales:
+        if os.path.exists(os.path.join(OUTPUT_DIR, scale_filename(scale))) and needs_conversion(
+            scale, results[scale]
+        ):
+            console.print(f"Converting {scale} to {', '.join(LAYER_FORMATS)}...")
+            convert_layer(scale)
 
-            console.print(f"Saving to {filename}...")
-            gdf.to_file(output_path, driver="GeoJSON")
-            console.print(f"[bold green]Done[/bold green]")
+    # ==============================================================================
+    # VALIDATION & STATISTICS
+    # ==============================================================================
 
-            # For 110m, also save a minimal version with only the ADMIN field
-            if scale == "110m":
-                minimal = gdf[["ADMIN", "geometry"]]
-                minimal_filename = "ne_110m_admin_only.geojson"
-                minimal_path = os.path.join(OUTPUT_DIR, minimal_filename)
-                console.print(f"Saving to {minimal_filename}...")
-                minimal.to_file(minimal_path, driver="GeoJSON")
-                console.print(f"[bold green]Done[/bold green]")
+    step("Validation")
+    table = Table(title="Natural Earth Files")
+    table.add_column("Scale", style="cyan")
+    table.add_column("File")
+    table.add_column("Size", justify="right", style="green")
+    table.add_column("Status", style="magenta")
+    for scale in scales:
+        path = os.path.join(OUTPUT_DIR, scale_filename(scale))
+        size = f"{os.path.getsize(path) / (1024 * 1024):.1f} MB" if os.path.exists(path) else "-"
+        table.add_row(scale, scale_filename(scale), size, results[scale])
+    console.print(table)
 
-        except Exception as e:
-            console.print(f"[bold red]Error processing {scale}: {e}[/bold red]")
+    missing = [s for s in scales if not os.path.exists(os.path.join(OUTPUT_DIR, scale_filename(s)))]
+    if missing:
+        raise SystemExit(f"Missing Natural Earth files for: {', '.join(missing)}")
+    console.print("[bold green]Done[/bold green]")
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
@@ -10,9 +10,17 @@ METHODOLOGY:
 - Reprojects centroids back to EPSG:4326 for output
 - Ensures resulting points are guaranteed to be within country boundaries
 - Outputs centroids as a GeoJSON file with country metadata
+- Every step runs as a shapely 2 array operation over all countries at once
+
+POINT_MODE = "polylabel":
+- Uses the pole of inaccessibility instead (the interior point farthest from
+  the border, as in mapbox/polylabel), which suits map labels and markers
+  better than the centroid for concave or elongated shapes
+- Computed across a process pool in batches, so 10m and map_subunits inputs
+  (thousands of shapes) stay fast
 
 INPUT:
-- Natural Earth countries GeoJSON file
+- Natural Earth countries layer (GeoParquet from 01_load_data)
 
 OUTPUT:
 - GeoJSON file containing point geometries at centroid locations
@@ -23,10 +31,15 @@ USAGE:
 """
 
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import geopandas as gpd
+import numpy as np
+import shapely
+from instrument import instrument, rows, step
+from ne_io import read_layer
 from rich.console import Console
-from shapely.geometry import MultiPolygon, Polygon
+from shapely.ops import polylabel
 
 console = Console()
 
@@ -34,65 +47,78 @@ console = Console()
 # CONFIGURATION
 # ==============================================================================
 
-NE_INPUT = "data/ne/ne_110m_admin_0_countries.geojson"
+NE_INPUT = "data/ne/ne_110m_admin_0_countries.parquet"
 OUTPUT_FILE = "data/out/centers.geojson"
 
+# "centroid": area centroid, or a representative point when the centroid falls
+# outside the shape; "polylabel": pole of inaccessibility
+POINT_MODE = "centroid"
+
+# polylabel precision, in EPSG:8857 metres
+POLYLABEL_TOLERANCE = 1000
+# Processes for polylabel (None = one per CPU) and shapes per task
+POLYLABEL_WORKERS = None
+POLYLABEL_BATCH = 64
+
 # ==============================================================================
 # HELPER FUNCTIONS
 # ==============================================================================
 
 
-def get_largest_polygon(geometry):
+def largest_polygons(geometries):
     """
-    Extract the largest polygon from a geometry (mainland).
-    Handles both Polygon and MultiPolygon types.
+    Extract the largest polygon (mainland) of every geometry in one pass.
+    Polygons come back unchanged; empty or missing geometries are kept as is.
+    Ties go to the first part, like max() over geometry.geoms.
     """
-    if isinstance(geometry, Polygon):
-        return geometry
-    elif isinstance(geometry, MultiPolygon):
-        # Return the polygon with the largest area
-        return max(geometry.geoms, key=lambda p: p.area)
-    else:
-        return geometry
+    geometries = np.asarray(geometries, dtype=object)
+    parts, owner = shapely.get_parts(geometries, return_index=True)
+    if len(parts) == 0:
+        return geometries.copy()
 
+    # Sort by (owner, -area); the sort is stable, so equal areas keep part order
+    order = np.lexsort((-shapely.area(parts), owner))
+    owner_sorted = owner[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = owner_sorted[1:] != owner_sorted[:-1]
 
-def compute_representative_point(polygon):
-    """
-    Compute a representative point that is guaranteed to be within the polygon.
-    Uses shapely's representative_point() method, which implements an algorithm
-    to find a point inside the geometry.
-    """
-    try:
-        # Shapely's representative_point is guaranteed to be within the geometry
-        return polygon.representative_point()
-    except Exception as e:
-        console.print(
-            f"[yellow]Warning: Could not compute representative point: {e}[/yellow]"
-        )
-        # Fallback to centroid (may be outside polygon for complex shapes)
-        return polygon.centroid
-
-
-def compute_interior_centroid(polygon):
-    """
-    Compute a geometric centroid that is guaranteed to be within the polygon.
+    result = geometries.copy()
+    result[owner_sorted[first]] = parts[order[first]]
+    return result
 
-    This function first computes the geometric centroid. If that point falls
-    outside the polygon (which can happen with concave or complex shapes),
-    it falls back to using representative_point() which is guaranteed to be inside.
+
+def interior_centroids(polygons):
+    """
+    Geometric centroids, replaced by representative points (guaranteed to be
+    inside) wherever the centroid falls outside its polygon.
 
     Note: This is a geometric centroid based on the polygon's shape, NOT weighted
     by population, area, or any other factor.
     """
-    # First try the geometric centroid
-    centroid = polygon.centroid
-
-    # Check if centroid is within the polygon
-    if polygon.contains(centroid):
-        return centroid
-
-    # If not, use representative point (guaranteed to be inside)
-    return compute_representative_point(polygon)
+    centroids = shapely.centroid(polygons)
+    inside = shapely.contains(polygons, centroids)
+    if inside.all():
+        return centroids
+    representative = shapely.point_on_surface(polygons)
+    return np.where(inside, centroids, representative)
+
+
+def polylabel_batch(polygons):
+    return [polylabel(polygon, tolerance=POLYLABEL_TOLERANCE) for polygon in polygons]
+
+
+def pole_of_inaccessibility(polygons):
+    """polylabel for every polygon, spread over a process pool in batches."""
+    polygons = list(polygons)
+    batches = [
+        polygons[i : i + POLYLABEL_BATCH] for i in range(0, len(polygons), POLYLABEL_BATCH)
+    ]
+    if len(batches) <= 1 or POLYLABEL_WORKERS == 1:
+        points = [p for batch in batches for p in polylabel_batch(batch)]
+    else:
+        with ProcessPoolExecutor(max_workers=POLYLABEL_WORKERS) as pool:
+            points = [p for batch in pool.map(polylabel_batch, batches) for p in batch]
+    return np.array(points, dtype=object)
 
 
 # ==============================================================================
@@ -101,8 +127,9 @@ def compute_interior_centroid(polygon):
 
 
 def main():
+    step("Loading Natural Earth dataset")
     console.print("\n[bold cyan]Loading Natural Earth dataset...[/bold cyan]")
-    gdf = gpd.read_file(NE_INPUT)
+    gdf = read_layer(NE_INPUT)
 
     console.print(f"Loaded {len(gdf)} countries")
     console.print(f"CRS: {gdf.crs}")
@@ -110,10 +137,13 @@ def main():
     # Create a copy for processing
     gdf_processed = gdf.copy()
 
+    step("Computing centroids", rows_in=len(gdf))
     console.print("\n[bold cyan]Computing centroids...[/bold cyan]")
 
     # Extract mainland (largest polygon) for each country
-    gdf_processed["mainland"] = gdf_processed["geometry"].apply(get_largest_polygon)
+    gdf_processed["mainland"] = gpd.GeoSeries(
+        largest_polygons(gdf_processed.geometry.values), index=gdf_processed.index, crs=gdf.crs
+    )
 
     # Create a temporary GeoDataFrame for reprojection
     mainland_gdf = gpd.GeoDataFrame(geometry=gdf_processed["mainland"], crs=gdf.crs)
@@ -122,8 +152,15 @@ def main():
     mainland_8857 = mainland_gdf.to_crs("EPSG:8857")
 
     # Compute centroids in the projected CRS
-    console.print("Computing centroids in EPSG:8857...")
-    centroids_8857 = mainland_8857.geometry.apply(compute_interior_centroid)
+    if POINT_MODE == "centroid":
+        console.print("Computing centroids in EPSG:8857...")
+        points = interior_centroids(mainland_8857.geometry.values)
+    elif POINT_MODE == "polylabel":
+        console.print("Computing poles of inaccessibility in EPSG:8857...")
+        points = pole_of_inaccessibility(mainland_8857.geometry.values)
+    else:
+        raise ValueError(f"Unknown POINT_MODE: {POINT_MODE!r}")
+    centroids_8857 = gpd.GeoSeries(points, index=mainland_8857.index, crs="EPSG:8857")
 
     # Reproject centroids back to EPSG:4326
     centroids_gdf_8857 = gpd.GeoDataFrame(geometry=centroids_8857, crs="EPSG:8857")
@@ -152,12 +189,14 @@ def main():
     # VALIDATION & STATISTICS
     # ==============================================================================
 
+    step("Validation")
     console.print("\n[bold cyan]Validation Results:[/bold cyan]")
 
     # Check how many centroids are within their country boundaries
-    within_boundary = sum(
-        gdf_processed["mainland"].iloc[i].contains(gdf_processed["centroid"].iloc[i])
-        for i in range(len(gdf_processed))
+    within_boundary = int(
+        shapely.contains(
+            gdf_processed["mainland"].values, gdf_processed["centroid"].values
+        ).sum()
     )
 
     console.print(
@@ -168,16 +207,19 @@ def main():
     # SAVE OUTPUT
     # ==============================================================================
 
+    step("Saving centroids")
     console.print(f"\n[bold cyan]Saving centroids to {OUTPUT_FILE}...[/bold cyan]")
 
     # Ensure output directory exists
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
 
     centroids_gdf.to_file(OUTPUT_FILE, driver="GeoJSON")
+    rows(rows_out=len(centroids_gdf))
     console.print("[bold green]✓ Complete![/bold green]")
 
     return centroids_gdf
 
 
 if __name__ == "__main__":
-    centroids = main()
+    with instrument(__file__):
+        centroids = main()
@@ -5,24 +5,48 @@ This script loads crawled radio station data and applies quality filters
 to remove stations with missing or insecure stream URLs.
 
 METHODOLOGY:
+- Streams the CSV in batches of CHUNK_ROWS rows, so memory stays bounded
+  however large the crawl gets
 - Removes stations without resolved stream URLs
 - Removes stations whose stream URL is not HTTPS
+- Appends each filtered batch to the output as it goes, keeping per-filter
+  station counts as running totals
+- Optionally (PROBE_STREAMS) opens every stream with the async prober in
+  scripts/stream_probe.py and records status, time to first byte and
+  throughput: "report" writes a ranked CSV, "filter" also drops dead or slow
+  streams. Results are cached for PROBE_TTL_HOURS, so reruns only probe new
+  or stale URLs
+- Optionally (SNIFF_STREAMS) reads each stream up to its first ICY metadata
+  block (scripts/stream_sniff.py) and adds compact station fields: codec,
+  bitrate (kbps), sample_rate (Hz), icy_metaint and ttfb_ms, so clients can
+  prefer light, fast-starting streams
 
 INPUT:
 - CSV file of crawled radio station data (crawl/out/output.csv)
 
 OUTPUT:
-- JSON file containing filtered radio station records
+- Arrow IPC file containing filtered radio station records
+  (plus an optional JSON copy for debugging, see WRITE_DEBUG_JSON)
+- With PROBE_STREAMS on: data/out/stream_probe.csv, one row per station,
+  healthiest and fastest first
+- With SNIFF_STREAMS on: data/out/stream_sniff.csv with every sniffed detail
+  (including channels, icy-name and the first StreamTitle)
 
 USAGE:
     uv run scripts/03_filter_radio.py
 """
 
-import json
+import gc
+from contextlib import ExitStack
 
 import pandas as pd
+import pyarrow as pa
+from instrument import instrument, rows, step
+from radio_io import StationWriter
 from rich.console import Console
 from rich.table import Table
+from stream_probe import probe_urls
+from stream_sniff import sniff_urls
 
 console = Console()
 
@@ -31,7 +55,55 @@ console = Console()
 # ==============================================================================
 
 RADIO_INPUT = "crawl/out/output.csv"
-OUTPUT = "data/out/all_radio_filtered.json"
+OUTPUT = "data/out/all_radio_filtered.arrow"
+
+# Also write the hand-off as indented JSON for manual inspection
+WRITE_DEBUG_JSON = False
+DEBUG_JSON = "data/out/all_radio_filtered.json"
+
+
+# Rows read from the CSV per batch. Peak memory scales with this, not with the
+# size of the crawl.
+CHUNK_ROWS = 100_000
+
+# Everything else in the crawl CSV (crawldata.Station) is read as text
+NUMERIC_COLUMNS = {"geo_lat": "float64", "geo_lon": "float64"}
+
+# Stream health probing: "off", "report" (rank only) or "filter" (also drop
+# streams that fail or miss the thresholds below). Needs network access.
+PROBE_STREAMS = "off"
+PROBE_CACHE = "data/cache/stream_probe.json"
+PROBE_REPORT_OUTPUT = "data/out/stream_probe.csv"
+PROBE_TTL_HOURS = 24
+PROBE_CONNECTIONS = 64
+PROBE_PER_HOST = 4
+PROBE_TIMEOUT = 10.0
+PROBE_READ_BYTES = 32 * 1024
+# "filter" keeps a stream only if it answered with audio within PROBE_MAX_TTFB_MS
+# and sustained PROBE_MIN_KBPS (None disables either check)
+PROBE_MAX_TTFB_MS = 5000
+PROBE_MIN_KBPS = 16
+PROBE_REPORT_COLS = ["channel_id", "channel_name", "country", "channel_resolved_url"]
+# Probe result fields kept per station (explicit, so empty batches keep them too)
+PROBE_RESULT_KEYS = ["status", "http_status", "ttfb_ms", "kbps", "error"]
+
+# Stream header sniffing (codec, bitrate, ICY metadata); uses the PROBE_*
+# connection settings. Adds the SNIFF_FIELDS columns to every station.
+SNIFF_STREAMS = False
+SNIFF_CACHE = "data/cache/stream_sniff.json"
+SNIFF_REPORT_OUTPUT = "data/out/stream_sniff.csv"
+SNIFF_TTL_HOURS = 7 * 24
+# Sniff result key -> (station column, Arrow type)
+SNIFF_FIELDS = {
+    "codec": ("codec", pa.string()),
+    "kbps": ("bitrate", pa.int32()),
+    "sample_rate": ("sample_rate", pa.int32()),
+    "icy_metaint": ("icy_metaint", pa.int32()),
+    "ttfb_ms": ("ttfb_ms", pa.int32()),
+}
+SNIFF_REPORT_KEYS = [
+    "status", "codec", "kbps", "sample_rate", "channels", "icy_metaint", "icy_name", "title", "ttfb_ms", "error",
+]
 
 
 # ==============================================================================
@@ -39,58 +111,256 @@ OUTPUT = "data/out/all_radio_filtered.json"
 # ==============================================================================
 
 
-def filter_with_report(df, mask, description):
+def filter_with_report(df, mask, description, totals):
     """
-    Apply a boolean mask to the dataframe and report station count changes.
+    Apply a boolean mask to a batch and add its station counts to the
+    running totals for `description`.
     """
-    console.print(f"\n[bold cyan]Filtering: {description}[/bold cyan]")
-    before = len(df)
     new_df = df[mask]
-    after = len(new_df)
-    console.print(f"  Stations: {before:,} -> {after:,} (removed {before - after:,})")
+    before, after = totals.get(description, (0, 0))
+    totals[description] = (before + len(df), after + len(new_df))
     return new_df
 
 
+def print_filter_report(totals):
+    """Report station count changes per filter, summed over all batches."""
+    for description, (before, after) in totals.items():
+        console.print(f"\n[bold cyan]Filtering: {description}[/bold cyan]")
+        console.print(
+            f"  Stations: {before:,} -> {after:,} (removed {before - after:,})"
+        )
+
+
+def csv_schema(path):
+    """
+    Fix column types up front so every batch (and the Arrow output) agrees,
+    even when a batch happens to have a column that is entirely empty.
+    """
+    columns = pd.read_csv(path, nrows=0).columns
+    dtypes = {col: NUMERIC_COLUMNS.get(col, "str") for col in columns}
+    schema = pa.schema(
+        [
+            (col, pa.float64() if col in NUMERIC_COLUMNS else pa.string())
+            for col in columns
+        ]
+    )
+    return dtypes, schema
+
+
+def probe_batch(chunk):
+    """Probe a batch's stream URLs (cached); returns {url: result}."""
+    results, probed = probe_urls(
+        chunk["channel_resolved_url"],
+        cache_path=PROBE_CACHE,
+        ttl=PROBE_TTL_HOURS * 3600,
+        max_connections=PROBE_CONNECTIONS,
+        per_host=PROBE_PER_HOST,
+        timeout=PROBE_TIMEOUT,
+        read_bytes=PROBE_READ_BYTES,
+    )
+    console.print(f"  Probed {probed:,} streams ({len(results) - probed:,} from cache)")
+    return results
+
+
+def sniff_batch(chunk):
+    """
+    Sniff a batch's streams (cached). Returns (station field columns,
+    report rows).
+    """
+    results, sniffed = sniff_urls(
+        chunk["channel_resolved_url"],
+        cache_path=SNIFF_CACHE,
+        ttl=SNIFF_TTL_HOURS * 3600,
+        max_connections=PROBE_CONNECTIONS,
+        per_host=PROBE_PER_HOST,
+        timeout=PROBE_TIMEOUT,
+    )
+    console.print(f"  Sniffed {sniffed:,} streams ({len(results) - sniffed:,} from cache)")
+
+    sniffed = [results[url] for url in chunk["channel_resolved_url"]]
+    fields = {}
+    for key, (column, arrow_type) in SNIFF_FIELDS.items():
+        values = [result[key] for result in sniffed]
+        if pa.types.is_integer(arrow_type):
+            fields[column] = pd.array(
+                [None if v is None else round(v) for v in values], dtype="Int32"
+            )
+        else:
+            fields[column] = values
+    report = chunk[[c for c in PROBE_REPORT_COLS if c in chunk.columns]].join(
+        # Explicit columns, so a batch with nothing to sniff still has them
+        pd.DataFrame(
+            [{k: result[k] for k in SNIFF_REPORT_KEYS} for result in sniffed],
+            index=chunk.index,
+            columns=SNIFF_REPORT_KEYS,
+        )
+    )
+    return fields, report
+
+
+def sniff_summary(report):
+    """Per-codec station counts, median bitrate and ICY metadata support."""
+    ok = report[report["status"] == "ok"]
+    table = Table(title=f"Stream Formats ({len(ok):,} of {len(report):,} sniffed streams)")
+    table.add_column("Codec", style="cyan")
+    table.add_column("Stations", justify="right", style="green")
+    table.add_column("Median kbps", justify="right")
+    table.add_column("Median TTFB", justify="right")
+    table.add_column("ICY metadata", justify="right")
+    for codec, group in ok.groupby(ok["codec"].fillna("unknown")):
+        kbps, ttfb = group["kbps"].dropna(), group["ttfb_ms"].dropna()
+        table.add_row(
+            codec,
+            f"{len(group):,}",
+            f"{kbps.median():,.0f}" if len(kbps) else "-",
+            f"{ttfb.median():,.0f} ms" if len(ttfb) else "-",
+            f"{100 * group['icy_metaint'].notna().mean():.0f}%",
+        )
+    console.print(table)
+
+
+def is_healthy(result):
+    if result["status"] != "ok":
+        return False
+    if PROBE_MAX_TTFB_MS is not None and result["ttfb_ms"] > PROBE_MAX_TTFB_MS:
+        return False
+    if PROBE_MIN_KBPS is not None and result["kbps"] is not None and result["kbps"] < PROBE_MIN_KBPS:
+        return False
+    return True
+
+
+def probe_report(batches):
+    """
+    Station-level probe results, ranked: healthy streams first, then by time
+    to first byte and throughput. Prints a per-status summary.
+    """
+    report = pd.concat(batches, ignore_index=True)
+    report["healthy"] = report["healthy"].astype(bool)
+    report = report.sort_values(
+        ["healthy", "ttfb_ms", "kbps"], ascending=[False, True, False], na_position="last", kind="stable"
+    )
+
+    table = Table(title="Stream Probe Results")
+    table.add_column("Status", style="cyan")
+    table.add_column("Stations", justify="right", style="green")
+    table.add_column("Median TTFB", justify="right")
+    table.add_column("Median kbps", justify="right")
+    for status, group in report.groupby("status"):
+        ttfb, kbps = group["ttfb_ms"].dropna(), group["kbps"].dropna()
+        table.add_row(
+            status,
+            f"{len(group):,}",
+            f"{ttfb.median():,.0f} ms" if len(ttfb) else "-",
+            f"{kbps.median():,.0f}" if len(kbps) else "-",
+        )
+    console.print(table)
+    return report
+
+
 # ==============================================================================
 # MAIN PROCESSING
 # ==============================================================================
 
 
 def main():
-    console.print("\n[bold cyan]Loading radio station data...[/bold cyan]")
-    radio = pd.read_csv(RADIO_INPUT)
+    step("Streaming and filtering stations")
+    console.print("\n[bold cyan]Streaming radio station data...[/bold cyan]")
+    dtypes, schema = csv_schema(RADIO_INPUT)
+
+    total_rows = 0
+    countries = set()
+    totals = {}
+    probed_batches = []
+    sniffed_batches = []
+
+    if SNIFF_STREAMS:
+        for column, arrow_type in SNIFF_FIELDS.values():
+            schema = schema.append(pa.field(column, arrow_type))
+
+    with ExitStack() as stack:
+        writers = [stack.enter_context(StationWriter(OUTPUT, schema))]
+        if WRITE_DEBUG_JSON:
+            writers.append(stack.enter_context(StationWriter(DEBUG_JSON, schema)))
+
+        for chunk in pd.read_csv(RADIO_INPUT, dtype=dtypes, chunksize=CHUNK_ROWS):
+            total_rows += len(chunk)
+            countries.update(chunk["country"].dropna().unique())
+
+            # Filter: null channel URLs
+            chunk = filter_with_report(
+                chunk,
+                chunk["channel_resolved_url"].notnull(),
+                "Removing stations without 'resolved' URLs",
+                totals,
+            )
+
+            # Filter: insecure stream URLs
+            chunk = filter_with_report(
+                chunk,
+                chunk["channel_resolved_url"].str.startswith("https://"),
+                "Removing stations with non-HTTPS stream URLs",
+                totals,
+            )
+
+            if PROBE_STREAMS != "off":
+                results = probe_batch(chunk)
+                probe = pd.DataFrame(
+                    [results[url] for url in chunk["channel_resolved_url"]],
+                    index=chunk.index,
+                    columns=PROBE_RESULT_KEYS,
+                )
+                probe["healthy"] = [is_healthy(r) for r in probe.to_dict("records")]
+                probed_batches.append(
+                    chunk[[c for c in PROBE_REPORT_COLS if c in chunk.columns]].join(
+                        probe[["status", "http_status", "ttfb_ms", "kbps", "healthy", "error"]]
+                    )
+                )
+                if PROBE_STREAMS == "filter":
+                    chunk = filter_with_report(
+                        chunk, probe["healthy"], "Removing dead or slow streams", totals
+                    )
+
+            if SNIFF_STREAMS:
+                fields, report = sniff_batch(chunk)
+                chunk = chunk.assign(**fields)
+                sniffed_batches.append(report)
+
+            for writer in writers:
+                writer.write(chunk)
+
+            # The .str accessor ties each batch up in a reference cycle; collect
+            # it now rather than letting batches pile up until the next GC pass
+            gc.collect()
+
+    rows(rows_in=total_rows, rows_out=writers[0].rows)
 
     # Print summary table
     table = Table(title="Dataset Summary")
     table.add_column("Dataset", style="cyan")
     table.add_column("Records", justify="right", style="green")
-    table.add_row("Radio stations", f"{len(radio):,}")
-    table.add_row("Countries (Radio)", f"{radio['country'].nunique():,}")
+    table.add_row("Radio stations", f"{total_rows:,}")
+    table.add_row("Countries (Radio)", f"{len(countries):,}")
     console.print(table)
 
-    # Filter: null channel URLs
-    radio = filter_with_report(
-        radio,
-        radio["channel_resolved_url"].notnull(),
-        "Removing stations without 'resolved' URLs",
-    )
+    step("Reports")
+    print_filter_report(totals)
 
-    # Filter: insecure stream URLs
-    radio = filter_with_report(
-        radio,
-        radio["channel_resolved_url"].str.startswith("https://"),
-        "Removing stations with non-HTTPS stream URLs",
-    )
+    if probed_batches:
+        report = probe_report(probed_batches)
+        report.to_csv(PROBE_REPORT_OUTPUT, index=False)
+        console.print(f"Saved ranked probe results to {PROBE_REPORT_OUTPUT}")
 
-    # Save output
-    console.print(f"\n[bold cyan]Saving to {OUTPUT}...[/bold cyan]")
-    with open(OUTPUT, "w") as f:
-        json.dump(radio.to_dict(orient="records"), f, indent=2)
+    if sniffed_batches:
+        report = pd.concat(sniffed_batches, ignore_index=True)
+        sniff_summary(report)
+        report.to_csv(SNIFF_REPORT_OUTPUT, index=False)
+        console.print(f"Saved stream details to {SNIFF_REPORT_OUTPUT}")
 
     console.print(
-        f"[bold green]Successfully saved {len(radio):,} records to {OUTPUT}[/bold green]"
+        f"\n[bold green]Successfully saved {writers[0].rows:,} records to {OUTPUT}[/bold green]"
     )
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
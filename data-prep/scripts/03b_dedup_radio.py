@@ -0,0 +1,354 @@
+"""
+Cross-Source Radio Deduplication Script
+
+This script removes stations that the crawl lists more than once, usually
+once from Radio Garden (RG) and once from Radio Browser (RB) under slightly
+different names and URLs.
+
+METHODOLOGY:
+- Normalizes every stream URL (scheme, host case, default ports, duplicate
+  and trailing slashes or ";", tracking query parameters, query order) and
+  groups stations whose normalized URLs are equal through a hash table
+- Finds near-duplicate names in blocks: stations are put in GRID_DEG
+  coordinate cells and only compared with stations of the same or a
+  neighbouring cell. Names are normalized like country names
+  (name_matcher.normalize) without NAME_STOPWORDS, so "RADIO KISS FM" and
+  "Kiss" agree; a pair matches when the trigram Dice score reaches
+  NAME_MIN_SCORE and both names carry the same numbers ("Kiss 98.5" and
+  "Kiss 101.1" stay apart). Stations without coordinates only match by URL
+- Keeps the name comparisons linear with prefix filtering: each name's
+  trigrams are ordered rarest first, and only the first few (as many as a
+  name can miss while still reaching NAME_MIN_SCORE) go into the cell's
+  index, so candidates are found through rare trigrams only
+- Links all matches into clusters (union-find) and keeps one station per
+  cluster, by a rule that does not depend on row order: the first source in
+  SOURCE_PRIORITY, then the most filled-in fields, then the smallest
+  channel_id
+- Reports stations and bytes removed per rule, measured as the JSON
+  lines 05_organize writes per station (json.dumps, before padding)
+
+INPUT:
+- Filtered radio station Arrow file (data/out/all_radio_filtered.arrow)
+
+OUTPUT:
+- Arrow IPC file without the duplicates, in input order
+  (plus an optional JSON copy for debugging, see WRITE_DEBUG_JSON)
+- CSV with one row per removed station, its survivor and the rule that
+  matched them (data/out/radio_duplicates.csv)
+
+USAGE:
+    uv run scripts/03b_dedup_radio.py
+"""
+
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+from instrument import instrument, rows, step
+from name_matcher import normalize, trigrams
+from radio_io import read_stations, write_stations
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+RADIO_INPUT = "data/out/all_radio_filtered.arrow"
+OUTPUT = "data/out/all_radio_deduped.arrow"
+DUPLICATES_OUTPUT = "data/out/radio_duplicates.csv"
+
+# Also write the hand-off as indented JSON for manual inspection
+WRITE_DEBUG_JSON = False
+DEBUG_JSON = "data/out/all_radio_deduped.json"
+
+# Query parameters that never change which stream a URL plays
+TRACKING_QUERY_PARAMS = {"listening-from-radio-garden", "ref", "source", "aw_0_req.gdpr"}
+TRACKING_QUERY_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {80, 443}
+
+# Name matching: cell size in degrees (0.1 is about 11 km north-south), the
+# trigram Dice score a pair needs, and words dropped before comparing
+GRID_DEG = 0.1
+NAME_MIN_SCORE = 0.85
+NAME_MIN_CHARS = 3
+NAME_STOPWORDS = {"radio", "radyo", "fm", "am", "the"}
+# Also match names within one source (same-source listings are usually
+# separate stations that happen to share a name)
+NAME_MATCH_SAME_SOURCE = False
+
+# Survivor rule: earlier sources win; Radio Garden rows always have
+# coordinates and a place name
+SOURCE_PRIORITY = ["RG", "RB"]
+
+NEIGHBOUR_CELLS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+DUPLICATE_REPORT_COLS = ["source", "channel_id", "channel_name", "channel_resolved_url", "country"]
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def normalize_url(url):
+    """Key under which two listings of the same stream collide."""
+    if not isinstance(url, str):
+        return None
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        # A URL urlsplit rejects (e.g. "https://[broken") is never URL-matched
+        return None
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in DEFAULT_PORTS:
+        host = f"{host}:{port}"
+    # Paths are case-sensitive; "/;" is the SHOUTcast spelling of "/"
+    path = parts.path
+    if "//" in path:
+        path = re.sub(r"/+", "/", path)
+    path = path.rstrip("/;")
+    if not parts.query:
+        return host + path
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_QUERY_PARAMS and not key.lower().startswith(TRACKING_QUERY_PREFIXES)
+    )
+    return host + path + (f"?{urlencode(query)}" if query else "")
+
+
+def name_key(name):
+    """Normalized station name without NAME_STOPWORDS ("" for no name)."""
+    if not isinstance(name, str):
+        return ""
+    return " ".join(word for word in normalize(name).split() if word not in NAME_STOPWORDS)
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            # Lower index as root, so roots do not depend on the order of unions
+            self.parent[max(a, b)] = min(a, b)
+
+
+def url_pairs(urls):
+    """(first station, station) pairs for stations sharing a normalized URL."""
+    codes, _ = pd.factorize(pd.Series(urls, dtype=object), use_na_sentinel=True)
+    positions = pd.Series(np.arange(len(codes)))
+    first = positions.groupby(codes).transform("min").to_numpy()
+    duplicate = (codes >= 0) & (first != positions.to_numpy())
+    return list(zip(first[duplicate].tolist(), np.flatnonzero(duplicate).tolist()))
+
+
+def name_pairs(names, sources, lats, lons):
+    """
+    Pairs of stations with near-identical names in the same or neighbouring
+    GRID_DEG cells (see METHODOLOGY). Returns (pairs, candidates compared).
+    """
+    # Normalize each distinct name once
+    distinct = {name: name_key(name) for name in dict.fromkeys(names)}
+    keys = [distinct[name] for name in names]
+    distinct_grams = {key: trigrams(key) for key in set(keys) if len(key) >= NAME_MIN_CHARS}
+    grams = [distinct_grams.get(key) for key in keys]
+    numbers = [tuple(re.findall(r"\d+", key)) for key in keys]
+    frequency = Counter(gram for station_grams in grams if station_grams for gram in station_grams)
+    # Rarest first; ties broken by the trigram so the order is fixed
+    rank = {gram: i for i, gram in enumerate(sorted(frequency, key=lambda gram: (frequency[gram], gram)))}
+    # Dice >= s is Jaccard >= s / (2 - s); a name of n trigrams can then miss
+    # at most n - ceil(j * n) of them, so one of its first n - ceil(j * n) + 1
+    # (in a fixed order) is shared with every match
+    jaccard = NAME_MIN_SCORE / (2 - NAME_MIN_SCORE)
+
+    cells = defaultdict(lambda: defaultdict(list))  # cell -> {trigram: stations}
+    pairs = []
+    compared = 0
+    for i, station_grams in enumerate(grams):
+        lat, lon = lats[i], lons[i]
+        if station_grams is None or not (math.isfinite(lat) and math.isfinite(lon)) or (lat == 0 and lon == 0):
+            continue
+        row, col = math.floor(lat / GRID_DEG), math.floor(lon / GRID_DEG)
+        ordered = sorted(station_grams, key=rank.__getitem__)
+        prefix = ordered[: len(ordered) - math.ceil(jaccard * len(ordered) - 1e-9) + 1]
+
+        candidates = set()
+        for dy, dx in NEIGHBOUR_CELLS:
+            index = cells.get((row + dy, col + dx))
+            if index is None:
+                continue
+            for gram in prefix:
+                candidates.update(index.get(gram, ()))
+        compared += len(candidates)
+        for j in candidates:
+            if sources[i] == sources[j] and not NAME_MATCH_SAME_SOURCE:
+                continue
+            if numbers[i] != numbers[j]:
+                continue
+            shared = len(station_grams & grams[j])
+            if 2 * shared / (len(station_grams) + len(grams[j])) >= NAME_MIN_SCORE:
+                pairs.append((j, i))
+
+        index = cells[(row, col)]
+        for gram in prefix:
+            index[gram].append(i)
+    return pairs, compared
+
+
+def choose_survivors(radio, roots):
+    """
+    Survivor row position for each station's cluster (SOURCE_PRIORITY, filled
+    fields, channel_id). `radio` holds clustered stations; positions refer to
+    radio.index.
+    """
+    rank = {source: i for i, source in enumerate(SOURCE_PRIORITY)}
+    filled = (radio.notna() & radio.ne("")).sum(axis=1).to_numpy()
+    keys = pd.DataFrame(
+        {
+            "root": roots,
+            "source_rank": [rank.get(source, len(rank)) for source in radio["source"]],
+            "filled": -filled,
+            "channel_id": radio["channel_id"].fillna("").astype(str).to_numpy(),
+            "position": radio.index.to_numpy(),
+        }
+    )
+    best = keys.sort_values(["root", "source_rank", "filled", "channel_id", "position"], kind="stable")
+    best = best.drop_duplicates("root").set_index("root")["position"]
+    return best.reindex(roots).to_numpy()
+
+
+def json_line_bytes(radio, batch_rows=50_000):
+    """
+    UTF-8 size of each station's line in stations.jsonl (newline included).
+    Encodes column-wise with json.dumps, as 05_organize.encode_records does.
+    """
+    sizes = []
+    for start in range(0, len(radio), batch_rows):
+        batch = radio.iloc[start : start + batch_rows]
+        fragments = []
+        for name in batch.columns:
+            prefix = json.dumps(name) + ": "
+            fragments.append([prefix + value for value in map(json.dumps, batch[name].tolist())])
+        sizes.extend(len(("{" + ", ".join(row) + "}").encode("utf-8")) + 1 for row in zip(*fragments))
+    return np.array(sizes, dtype=np.int64)
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    step("Loading stations")
+    radio = read_stations(RADIO_INPUT).reset_index(drop=True)
+    console.print(f"Loaded {len(radio):,} stations from {RADIO_INPUT}")
+
+    step("Grouping normalized stream URLs", rows_in=len(radio))
+    console.print("\n[bold cyan]Grouping stations by normalized stream URL...[/bold cyan]")
+    urls = [normalize_url(url) for url in radio["channel_resolved_url"]]
+    by_url = url_pairs(urls)
+    console.print(f"  {len(by_url):,} stations share a stream URL with another")
+
+    step("Matching names within grid cells")
+    console.print(f"\n[bold cyan]Matching station names within {GRID_DEG}° cells...[/bold cyan]")
+    by_name, compared = name_pairs(
+        radio["channel_name"].tolist(),
+        radio["source"].tolist(),
+        radio["geo_lat"].astype(float).tolist(),
+        radio["geo_lon"].astype(float).tolist(),
+    )
+    console.print(f"  {len(by_name):,} near-duplicate name pairs ({compared:,} candidates compared)")
+
+    step("Choosing survivors")
+    clusters = UnionFind(len(radio))
+    for a, b in by_url + by_name:
+        clusters.union(a, b)
+    roots = np.array([clusters.find(i) for i in range(len(radio))], dtype=np.int64)
+    clustered = np.bincount(roots, minlength=len(radio))[roots] > 1
+    survivors = np.arange(len(radio))
+    survivors[clustered] = choose_survivors(radio[clustered], roots[clustered])
+    removed = survivors != np.arange(len(radio))
+    # Attribute each removal to the URL rule when it shares the survivor's URL
+    same_url = np.array([urls[i] is not None and urls[i] == urls[s] for i, s in enumerate(survivors)], dtype=bool)
+    rule = np.where(same_url, "url", "name")
+
+    step("Saving", rows_in=len(radio))
+    deduped = radio[~removed]
+    console.print(f"\n[bold cyan]Saving to {OUTPUT}...[/bold cyan]")
+    write_stations(deduped, OUTPUT)
+    rows(rows_out=len(deduped))
+    if WRITE_DEBUG_JSON:
+        write_stations(deduped, DEBUG_JSON)
+
+    cols = [col for col in DUPLICATE_REPORT_COLS if col in radio.columns]
+    report = radio.loc[removed, cols].reset_index(drop=True)
+    kept = radio.loc[survivors[removed], cols].reset_index(drop=True).add_prefix("kept_")
+    report = report.join(kept)
+    report.insert(0, "rule", rule[removed])
+    report.to_csv(DUPLICATES_OUTPUT, index=False)
+    console.print(f"Saved {len(report):,} removed stations to {DUPLICATES_OUTPUT}")
+
+    step("Summary")
+    line_bytes = json_line_bytes(radio)
+    total_bytes = int(line_bytes.sum())
+    table = Table(title="Duplicates Removed")
+    table.add_column("Rule", style="cyan")
+    table.add_column("Source", style="yellow")
+    table.add_column("Stations", justify="right", style="green")
+    table.add_column("JSON bytes", justify="right")
+    table.add_column("Share", justify="right")
+    summary = pd.DataFrame(
+        {
+            "rule": rule[removed],
+            "source": radio.loc[removed, "source"].fillna("").to_numpy(),
+            "bytes": line_bytes[removed],
+        }
+    )
+    for (rule_name, source), group in summary.groupby(["rule", "source"], sort=False):
+        table.add_row(
+            rule_name,
+            source,
+            f"{len(group):,}",
+            f"{int(group['bytes'].sum()):,}",
+            f"{100 * group['bytes'].sum() / total_bytes:.2f}%",
+        )
+    removed_bytes = int(line_bytes[removed].sum())
+    table.add_row(
+        "[bold]total[/bold]",
+        "",
+        f"[bold]{int(removed.sum()):,}[/bold]",
+        f"[bold]{removed_bytes:,}[/bold]",
+        f"[bold]{100 * removed_bytes / total_bytes:.2f}%[/bold]" if total_bytes else "-",
+    )
+    console.print(table)
+
+    console.print(
+        f"\n[bold green]Successfully saved {len(deduped):,} of {len(radio):,} records to {OUTPUT} "
+        f"({removed_bytes / 1024**2:.2f} MB of {total_bytes / 1024**2:.2f} MB station JSON removed)[/bold green]"
+    )
+
+
+if __name__ == "__main__":
+    with instrument(__file__):
+        main()
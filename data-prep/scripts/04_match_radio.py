@@ -5,28 +5,44 @@ This script matches filtered radio stations to Natural Earth country records
 using a name-based lookup, then filters out countries with too few stations.
 
 METHODOLOGY:
-- Builds a lowercase lookup map from Natural Earth ADMIN and NAME columns
-- Matches radio station country names to Natural Earth indices
+- Matches radio station country names to Natural Earth rows through the
+  shared name index (country_index.py, built from the ADMIN and NAME columns
+  and cached by the Natural Earth file hash)
+- Resolves names the exact lookup misses with a trigram fuzzy matcher
+  (name_matcher.py), caching results in MATCH_CACHE
+- Locates every station's geo_lat/geo_lon in the 10m Natural Earth polygons
+  (country_locator.py) to cross-check name matches and, with
+  COORDINATE_MATCH = "fallback", to place stations whose name matched nothing
 - Reports and drops unmatched stations
 - Filters out countries with fewer than MIN_STATIONS stations
 - Enriches radio data with selected Natural Earth metadata columns
 
 INPUT:
-- Filtered radio station JSON (data/out/all_radio_filtered.json)
-- Natural Earth 110m countries GeoJSON (data/ne/ne_110m_admin_0_countries.geojson)
+- Deduplicated radio station Arrow file (data/out/all_radio_deduped.arrow)
+- Natural Earth 110m countries attributes, read from GeoParquet without geometry
+  (data/ne/ne_110m_admin_0_countries.parquet)
+- Natural Earth 10m countries GeoParquet for coordinate lookup
+  (data/ne/ne_10m_admin_0_countries.parquet)
 
 OUTPUT:
-- JSON file with radio stations enriched with country metadata
+- Arrow IPC file with radio stations enriched with country metadata
+  (plus an optional JSON copy for debugging, see WRITE_DEBUG_JSON)
+- CSV of stations whose name and coordinates point to different countries
+  (data/out/country_disagreements.csv)
 
 USAGE:
     uv run scripts/04_match_radio.py
 """
 
-import json
-import re
+import os
 
-import geopandas as gpd
 import pandas as pd
+from country_index import CountryIndex, name_columns
+from country_locator import CountryLocator
+from instrument import instrument, rows, step
+from name_matcher import TrigramMatcher
+from ne_io import read_attributes, read_layer
+from radio_io import read_stations, write_stations
 from rich.console import Console
 from rich.table import Table
 
@@ -36,18 +52,34 @@ console = Console()
 # CONFIGURATION
 # ==============================================================================
 
-RADIO_INPUT = "data/out/all_radio_filtered.json"
-NE_INPUT = "data/ne/ne_110m_admin_0_countries.geojson"
-OUTPUT = "data/out/all_radio_with_countries.json"
+RADIO_INPUT = "data/out/all_radio_deduped.arrow"
+NE_INPUT = "data/ne/ne_110m_admin_0_countries.parquet"
+OUTPUT = "data/out/all_radio_with_countries.arrow"
+
+# Also write the hand-off as indented JSON for manual inspection
+WRITE_DEBUG_JSON = False
+DEBUG_JSON = "data/out/all_radio_with_countries.json"
 
 MIN_STATIONS = 5
 
-# Manual country name overrides applied after lowercasing and "the" stripping.
-# Keys and values should both be lowercase.
-COUNTRY_NAME_OVERRIDES = {
-    "united kingdom of great britain and northern ireland": "united kingdom",
-    "islamic republic of iran": "iran",
-}
+# Spelling overrides for the exact lookup live in country_index.COUNTRY_NAME_OVERRIDES
+
+# Fuzzy fallback for names with no exact match: accept the best trigram match
+# when its score reaches FUZZY_MIN_SCORE and beats the runner-up country by
+# FUZZY_MIN_MARGIN. Resolved names are cached in MATCH_CACHE.
+FUZZY_MATCH = True
+FUZZY_MIN_SCORE = 0.8
+FUZZY_MIN_MARGIN = 0.05
+MATCH_CACHE = "data/cache/country_name_matches.json"
+
+# Point-in-polygon lookup from geo_lat/geo_lon against NE_POLYGONS_INPUT:
+# "off", "crosscheck" (only report disagreements with the name match) or
+# "fallback" (also assign stations whose name matched nothing, when the
+# polygon's ADMIN exists in NE_INPUT)
+COORDINATE_MATCH = "fallback"
+NE_POLYGONS_INPUT = "data/ne/ne_10m_admin_0_countries.parquet"
+DISAGREEMENTS_OUTPUT = "data/out/country_disagreements.csv"
+DISAGREEMENT_COLS = ["channel_id", "channel_name", "place_name", "country", "geo_lat", "geo_lon"]
 
 SELECTED_NE_COLS = [
     "ADMIN",
@@ -57,6 +89,65 @@ SELECTED_NE_COLS = [
 ]
 
 
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def match_by_coordinates(radio, ne):
+    """
+    Locate every station in the NE_POLYGONS_INPUT polygons, write stations
+    whose name match disagrees with their coordinates to DISAGREEMENTS_OUTPUT,
+    and (in "fallback" mode) fill radio["ne_idx"] for stations with no name match.
+    """
+    console.print("\n[bold cyan]Locating stations by coordinates...[/bold cyan]")
+    # A missing layer is an error, not a silent skip; set COORDINATE_MATCH = "off" to skip
+    polygons = read_layer(NE_POLYGONS_INPUT, columns=["ADMIN"])
+
+    locator = CountryLocator(polygons.geometry.values, polygons["ADMIN"].values)
+    coord_admin = pd.Series(
+        locator.locate(radio["geo_lat"], radio["geo_lon"]), index=radio.index
+    )
+    name_admin = radio["ne_idx"].map(ne["ADMIN"])
+
+    both = name_admin.notna() & coord_admin.notna()
+    disagree = both & (name_admin != coord_admin)
+    report = radio.loc[disagree, [c for c in DISAGREEMENT_COLS if c in radio.columns]].copy()
+    report["name_admin"] = name_admin[disagree]
+    report["coord_admin"] = coord_admin[disagree]
+    os.makedirs(os.path.dirname(DISAGREEMENTS_OUTPUT), exist_ok=True)
+    report.to_csv(DISAGREEMENTS_OUTPUT, index=False)
+
+    filled = 0
+    if COORDINATE_MATCH == "fallback":
+        admin_to_idx = {admin: idx for idx, admin in ne["ADMIN"].items()}
+        fallback = radio["ne_idx"].isna() & coord_admin.isin(admin_to_idx.keys())
+        radio.loc[fallback, "ne_idx"] = coord_admin[fallback].map(admin_to_idx)
+        filled = int(fallback.sum())
+
+    table = Table(title="Coordinate Cross-Check")
+    table.add_column("Check", style="cyan")
+    table.add_column("Stations", justify="right", style="green")
+    table.add_row("Located in a country", f"{coord_admin.notna().sum():,}")
+    table.add_row("Outside every polygon / no coordinates", f"{coord_admin.isna().sum():,}")
+    table.add_row("Name and coordinates agree", f"{(both & ~disagree).sum():,}")
+    table.add_row("Name and coordinates disagree", f"{disagree.sum():,}")
+    if COORDINATE_MATCH == "fallback":
+        table.add_row("Assigned by coordinates (no name match)", f"{filled:,}")
+    console.print(table)
+
+    if len(report):
+        pairs = report.groupby(["name_admin", "coord_admin"]).size().nlargest(10)
+        pair_table = Table(title="Top Disagreements (name -> coordinates)")
+        pair_table.add_column("Name match", style="yellow")
+        pair_table.add_column("Coordinates", style="magenta")
+        pair_table.add_column("Stations", justify="right", style="red")
+        for (by_name, by_coord), count in pairs.items():
+            pair_table.add_row(str(by_name), str(by_coord), f"{count:,}")
+        console.print(pair_table)
+    console.print(f"Disagreements written to {DISAGREEMENTS_OUTPUT}")
+
+
 # ==============================================================================
 # MAIN PROCESSING
 # ==============================================================================
@@ -66,13 +157,12 @@ def main():
     # --------------------------------------------------------------------------
     # DATA LOADING
     # --------------------------------------------------------------------------
+    step("Loading datasets")
     console.print("\n[bold cyan]Loading datasets...[/bold cyan]")
     try:
-        radio = pd.read_json(RADIO_INPUT)
-        ne = gpd.read_file(NE_INPUT)
-        # Drop geometry immediately to avoid index/reindexing overhead during processing
-        if "geometry" in ne.columns:
-            ne = ne.drop(columns=["geometry"])
+        radio = read_stations(RADIO_INPUT)
+        # Attributes only: the geometry is never decoded
+        ne = read_attributes(NE_INPUT)
     except Exception as e:
         console.print(f"[bold red]Error loading files: {e}[/bold red]")
         return
@@ -89,44 +179,65 @@ def main():
     # --------------------------------------------------------------------------
     # COUNTRY MATCHING
     # --------------------------------------------------------------------------
-    console.print("\n[bold cyan]Building country name lookup map...[/bold cyan]")
-
-    # Identify all name-related columns in order
-    name_cols = [col for col in ne.columns if "NAME" in col.upper()]
-
-    # We want a lookup map: { lowercase_name: ne_index }
-    # Priorities: 1. ADMIN, 2. name_cols (in order)
-    lookup = {}
-
-    def populate_lookup(column_name):
-        if column_name not in ne.columns:
-            return
-        for idx, val in ne[column_name].items():
-            if pd.isna(val):
-                continue
-            key = re.sub(r"^the\s+", "", str(val).strip().lower())
-            if key not in lookup:
-                lookup[key] = idx
-
-    # Primary check: ADMIN
-    populate_lookup("ADMIN")
-
-    # Fallback checks: all NAME columns
-    for col in name_cols:
-        populate_lookup(col)
-
-    console.print(f"Lookup table built with {len(lookup):,} unique name variations")
-
-    # Map radio stations to NE indices
-    radio["ne_idx"] = (
-        radio["country"]
-        .str.strip()
-        .str.lower()
-        .str.replace(r"^the\s+", "", regex=True)
-        .map(lambda name: COUNTRY_NAME_OVERRIDES.get(name, name))
-        .map(lookup)
-    )
-
+    step("Matching names", rows_in=len(radio))
+    console.print("\n[bold cyan]Loading country name index...[/bold cyan]")
+
+    # Normalized ADMIN / NAME* -> NE row, cached by the NE file's hash
+    index = CountryIndex.load(NE_INPUT)
+    console.print(f"Name index holds {len(index):,} unique name variations")
+    radio["ne_idx"] = index.resolve_many(radio["country"])
+
+    # Fuzzy fallback: resolve the remaining distinct names through a trigram index
+    fuzzy_matches = {}
+    if FUZZY_MATCH and radio["ne_idx"].isna().any():
+        unmatched_names = radio.loc[radio["ne_idx"].isna(), "country"].dropna().unique()
+        step("Fuzzy matching names")
+        console.print(
+            f"\n[bold cyan]Fuzzy matching {len(unmatched_names):,} unmatched names...[/bold cyan]"
+        )
+        matcher = TrigramMatcher(
+            (
+                (val, idx)
+                for col in name_columns(ne.columns)
+                if col in ne.columns
+                for idx, val in ne[col].dropna().items()
+            ),
+            min_score=FUZZY_MIN_SCORE,
+            min_margin=FUZZY_MIN_MARGIN,
+        )
+        fuzzy_matches = matcher.resolve(sorted(map(str, unmatched_names)), MATCH_CACHE)
+        resolved = {
+            name: match["target"]
+            for name, match in fuzzy_matches.items()
+            if match["target"] is not None
+        }
+        radio["ne_idx"] = radio["ne_idx"].fillna(radio["country"].map(resolved))
+
+        if resolved:
+            station_counts = radio["country"].value_counts()
+            fuzzy_table = Table(title="Fuzzy Matched Countries")
+            fuzzy_table.add_column("Country", style="cyan")
+            fuzzy_table.add_column("Matched ADMIN", style="green")
+            fuzzy_table.add_column("Score", justify="right")
+            fuzzy_table.add_column("Confidence", style="magenta")
+            fuzzy_table.add_column("Stations", justify="right", style="green")
+            for name in sorted(resolved, key=lambda n: -station_counts.get(n, 0)):
+                match = fuzzy_matches[name]
+                fuzzy_table.add_row(
+                    name,
+                    str(ne.loc[match["target"], "ADMIN"]),
+                    f"{match['score']:.2f}",
+                    match["confidence"],
+                    f"{station_counts.get(name, 0):,}",
+                )
+            console.print(fuzzy_table)
+
+    step("Locating stations by coordinates")
+    # Coordinates: cross-check name matches and place stations no name matched
+    if COORDINATE_MATCH != "off":
+        match_by_coordinates(radio, ne)
+
+    step("Dropping unmatched and small countries")
     # Identify unmatched countries BEFORE filtering
     unmatched_mask = radio["ne_idx"].isna()
     unmatched_countries = radio.loc[unmatched_mask, "country"].value_counts()
@@ -138,9 +249,16 @@ def main():
         unmatch_table = Table(title="Unmatched Countries (will be dropped)")
         unmatch_table.add_column("Country", style="yellow")
         unmatch_table.add_column("Stations", justify="right", style="red")
+        if fuzzy_matches:
+            unmatch_table.add_column("Best guess (score)", style="dim")
 
         for country, count in unmatched_countries.items():
-            unmatch_table.add_row(str(country), f"{count:,}")
+            row = [str(country), f"{count:,}"]
+            if fuzzy_matches:
+                match = fuzzy_matches.get(str(country))
+                guess = match and match["candidate"]
+                row.append(f"{guess} ({match['score']:.2f})" if guess else "-")
+            unmatch_table.add_row(*row)
         console.print(unmatch_table)
 
         total_dropped = unmatched_mask.sum()
@@ -210,6 +328,7 @@ def main():
     # --------------------------------------------------------------------------
     # FINAL SUMMARY
     # --------------------------------------------------------------------------
+    step("Summary")
     console.print("\n[bold cyan]Final Summary: Radio Stations by Country[/bold cyan]")
 
     # Clean up temporary columns used for joining
@@ -265,15 +384,13 @@ def main():
     # --------------------------------------------------------------------------
     # OUTPUT
     # --------------------------------------------------------------------------
+    step("Saving", rows_in=len(radio_final))
     console.print(f"\n[bold cyan]Saving to {OUTPUT}...[/bold cyan]")
 
-    # Ensure we don't have NaN in the final JSON output (converts to null)
-    output_data = radio_final.where(pd.notnull(radio_final), None).to_dict(
-        orient="records"
-    )
-
-    with open(OUTPUT, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    write_stations(radio_final, OUTPUT)
+    rows(rows_out=len(radio_final))
+    if WRITE_DEBUG_JSON:
+        write_stations(radio_final, DEBUG_JSON)
 
     console.print(
         f"[bold green]Successfully saved {len(radio_final):,} records to {OUTPUT}[/bold green]"
@@ -281,4 +398,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
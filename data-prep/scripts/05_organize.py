@@ -1,21 +1,72 @@
 """
 Data Organization Script for HTTP Range Requests (Fixed-Width Line Indexing)
 
-This script converts the radio station JSON into a fixed-width JSONL format.
+This script converts the enriched radio station table into a fixed-width JSONL format.
 Every line is padded with spaces to a consistent length, allowing for
 O(1) byte-offset calculations without storing individual line offsets.
 
 METHODOLOGY:
+- Serializes each station once, column-wise, keeping the encoded bytes.
 - Finds the maximum length of a JSON-serialized station record.
 - Pads every record with spaces to match this 'LINE_LENGTH'.
 - The index only needs to store: { country: { start_byte, count } }.
 - Client calculates offset: start_byte + (station_index * LINE_LENGTH).
+
+VARIABLE LAYOUT (LAYOUT = "variable"):
+- Lines are written unpadded, so one long record no longer inflates every line.
+- Each country gets an offset table of count + 1 little-endian uint32 values:
+  the byte position of every line relative to the country's start, plus the
+  country's total length. Line i spans start + [offsets[i], offsets[i + 1]).
+- Tables are concatenated into OFFSETS_OUTPUT and referenced from the index as
+  offsets_ref: { start, length } (fetchable with one range request), or inlined
+  as base64 "offsets" when INLINE_OFFSETS is set.
+
+BINARY LAYOUT (LAYOUT = "binary"):
+- Writes BINARY_OUTPUT with fixed-size, dictionary-encoded records and a
+  per-country string heap (see station_binary.py for the format).
+- The schema and string tables go in index.json's config; each country entry
+  gets heap_length next to start and count.
+- Every record is decoded again after writing and checked against its JSONL
+  encoding.
+
+SAMPLE BLOCKS (SAMPLE_BLOCKS = K > 0, fixed layout):
+- After each country's lines come K blocks, each the same lines in a seeded
+  random order. Any SAMPLE_SIZE adjacent lines of a block are a random sample
+  without replacement, so a random round is one range request:
+    block b, window w -> start + ((1 + b) * count + w) * LINE_LENGTH
+  with b < K and w <= count - SAMPLE_SIZE.
+- The index config gets "sample_blocks": K; country entries are unchanged.
+- Prints how close each station's inclusion probability gets to uniform for
+  several K, against the extra bytes each K costs.
+
+EXTERNAL SORT (EXTERNAL_SORT = True, fixed and variable layouts):
+- Stations are read and encoded EXTERNAL_RUN_ROWS at a time; each run is
+  sorted by ADMIN and spilled to a temporary file, so memory is bounded by
+  the run size instead of the station count.
+- The runs are k-way merged straight into the layout writer, which adds each
+  country to the index as it ends. With more than EXTERNAL_MERGE_FANIN runs,
+  groups of them are merged into longer runs first.
+- Both paths sort stably (a country's stations keep their input order), so
+  the output is byte-identical to the in-memory path.
+- Sample blocks still hold one country's lines in memory.
 """
 
+import base64
+import heapq
+import itertools
 import json
 import os
+import random
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+import numpy as np
 
-import pandas as pd
+import station_binary
+from instrument import instrument, rows, step
+from radio_io import iter_stations, read_stations
 from rich.console import Console
 from rich.table import Table
 
@@ -25,14 +76,321 @@ console = Console()
 # CONFIGURATION
 # ==============================================================================
 
-RADIO_INPUT = "data/out/all_radio_with_countries.json"
+RADIO_INPUT = "data/out/all_radio_with_countries.arrow"
 DATA_OUTPUT = "data/out/stations.jsonl"
 INDEX_OUTPUT = "data/out/index.json"
+# Same index, kept for 06_split_chunks, which rewrites index.json per chunk
+UNCHUNKED_INDEX_OUTPUT = "data/out/index_unchunked.json"
+OFFSETS_OUTPUT = "data/out/offsets.bin"
+BINARY_OUTPUT = "data/out/stations.bin"
+
+# "fixed": every line padded to LINE_LENGTH (what the frontend reads today)
+# "variable": unpadded lines plus a per-country uint32 offset table
+# "binary": dictionary-encoded fixed-size binary records (BINARY_OUTPUT)
+LAYOUT = "fixed"
+
+# Variable layout only: embed each country's offset table in index.json
+# (base64) instead of writing OFFSETS_OUTPUT
+INLINE_OFFSETS = False
 
 # We define a fixed length that is guaranteed to fit any station record.
 # 1024 is usually safe for radio metadata, but we will calculate the real max.
 LINE_LENGTH = 0
 
+# Encode per-country groups across this many processes (1 = in-process).
+# Output is byte-identical either way; groups are reassembled in ADMIN order.
+ENCODE_WORKERS = 1
+
+# Fixed layout only: shuffled copies of each country appended after its lines
+# (0 = off). Each block costs one more copy of the station data.
+SAMPLE_BLOCKS = 0
+SAMPLE_SIZE = 5  # stations per round in useRadio.ts
+SAMPLE_SEED = 0
+# Block counts compared in the uniformity report
+SAMPLE_STATS_K = (1, 2, 4, 8, 16)
+
+# Sort and encode out of core (see EXTERNAL SORT above), for station files
+# that do not fit in memory. Encoding is in-process in this mode.
+EXTERNAL_SORT = False
+EXTERNAL_RUN_ROWS = 250_000
+EXTERNAL_MERGE_FANIN = 256  # run files open at once
+EXTERNAL_TMP_DIR = None  # None = the system temp directory
+
+RUN_HEADER = struct.Struct("<HI")  # ADMIN length, record length
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def encode_records(columns):
+    """
+    JSON-encode rows given column-wise as {name: [values]}.
+
+    Each value is encoded once per column (no per-row dicts or Series), and the
+    fragments are joined into exactly what json.dumps(row_dict) would produce.
+    Returns one UTF-8 bytes object per row.
+    """
+    fragments = []
+    for name, values in columns.items():
+        prefix = json.dumps(name) + ": "
+        fragments.append([prefix + value for value in map(json.dumps, values)])
+    return [("{" + ", ".join(row) + "}").encode("utf-8") for row in zip(*fragments)]
+
+
+def country_groups(radio):
+    """
+    Split the ADMIN-sorted frame into (admin, start_row, count) runs, matching
+    groupby("ADMIN") order. Rows without an ADMIN are dropped, as groupby would.
+    """
+    admins = radio["ADMIN"].tolist()
+    groups = []
+    start = 0
+    for i in range(1, len(admins) + 1):
+        if i == len(admins) or admins[i] != admins[start]:
+            if isinstance(admins[start], str):
+                groups.append((admins[start], start, i - start))
+            start = i
+    return groups
+
+
+def encode_groups(radio, groups):
+    """Encode every station exactly once, optionally fanning countries out to a pool."""
+    columns = {col: radio[col].tolist() for col in radio.columns}
+
+    def group_columns(start, count):
+        return {col: values[start : start + count] for col, values in columns.items()}
+
+    if ENCODE_WORKERS <= 1:
+        return [encode_records(group_columns(start, count)) for _, start, count in groups]
+
+    with ProcessPoolExecutor(max_workers=ENCODE_WORKERS) as pool:
+        return list(
+            pool.map(
+                encode_records,
+                (group_columns(start, count) for _, start, count in groups),
+                chunksize=8,
+            )
+        )
+
+
+def write_run(path, entries):
+    """Write (admin, record) pairs to a run file."""
+    with open(path, "wb", buffering=1024 * 1024) as f:
+        for admin, record in entries:
+            key = admin.encode("utf-8")
+            f.write(RUN_HEADER.pack(len(key), len(record)))
+            f.write(key)
+            f.write(record)
+
+
+def read_run(path):
+    with open(path, "rb", buffering=1024 * 1024) as f:
+        while header := f.read(RUN_HEADER.size):
+            key_length, record_length = RUN_HEADER.unpack(header)
+            yield f.read(key_length).decode("utf-8"), f.read(record_length)
+
+
+def merge_runs(paths):
+    """(admin, record) pairs of sorted runs in ADMIN order; equal ADMINs keep run order."""
+    return heapq.merge(*(read_run(path) for path in paths), key=itemgetter(0))
+
+
+def spill_sorted_runs(tmp_dir):
+    """
+    Encode the stations EXTERNAL_RUN_ROWS at a time and write each run,
+    sorted by ADMIN, to tmp_dir. Rows without an ADMIN are dropped, as in
+    country_groups. Returns (run paths, stations read, longest line).
+    """
+    paths = []
+    stations = 0
+    max_len = 0
+    for frame in iter_stations(RADIO_INPUT, EXTERNAL_RUN_ROWS):
+        stations += len(frame)
+        records = encode_records({col: frame[col].tolist() for col in frame.columns})
+        admins = frame["ADMIN"].tolist()
+        # sorted() is stable, matching sort_values(kind="stable")
+        order = sorted((i for i, admin in enumerate(admins) if isinstance(admin, str)), key=admins.__getitem__)
+        # +1 for the newline character
+        max_len = max([max_len] + [len(records[i]) + 1 for i in order])
+        path = os.path.join(tmp_dir, f"run_{len(paths):06d}.bin")
+        write_run(path, ((admins[i], records[i]) for i in order))
+        paths.append(path)
+    return paths, stations, max_len
+
+
+def reduce_runs(paths, tmp_dir):
+    """Merge runs EXTERNAL_MERGE_FANIN at a time until the rest can be merged at once."""
+    level = 0
+    while len(paths) > EXTERNAL_MERGE_FANIN:
+        merged = []
+        for i in range(0, len(paths), EXTERNAL_MERGE_FANIN):
+            group = paths[i : i + EXTERNAL_MERGE_FANIN]
+            path = os.path.join(tmp_dir, f"merge_{level}_{len(merged):06d}.bin")
+            write_run(path, merge_runs(group))
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        paths = merged
+        level += 1
+    return paths
+
+
+def country_runs(merged):
+    """Group merged (admin, record) pairs into (admin, records) per country."""
+    for admin, entries in itertools.groupby(merged, key=itemgetter(0)):
+        yield admin, (record for _, record in entries)
+
+
+def sample_permutations(admin, count, blocks):
+    """
+    The line order of each sample block. Seeded per country, so a country's
+    blocks don't depend on the others and the first k of them are the same
+    for any SAMPLE_BLOCKS >= k.
+    """
+    rng = random.Random(f"{SAMPLE_SEED}:{admin}")
+    permutations = []
+    for _ in range(blocks):
+        order = list(range(count))
+        rng.shuffle(order)
+        permutations.append(order)
+    return permutations
+
+
+def write_fixed(country_records):
+    """
+    Write padded, fixed-width lines from (admin, records) pairs in ADMIN
+    order. Returns the index's country entries.
+    """
+    countries = {}
+    current_offset = 0
+
+    with open(DATA_OUTPUT, "wb") as f_out:
+        for admin, records in country_records:
+            # Write: JSON + Spaces + Newline, padded so the last byte is \n
+            lines = (rec.ljust(LINE_LENGTH - 1) + b"\n" for rec in records)
+            if SAMPLE_BLOCKS:
+                lines = list(lines)
+            f_out.writelines(lines)
+            count = (f_out.tell() - current_offset) // LINE_LENGTH
+            for order in sample_permutations(admin, count, SAMPLE_BLOCKS):
+                f_out.writelines(lines[i] for i in order)
+
+            # Compact index entry
+            countries[str(admin)] = {"start": current_offset, "count": count}
+            current_offset += count * (1 + SAMPLE_BLOCKS) * LINE_LENGTH
+
+    return countries
+
+
+def sample_uniformity(groups, k):
+    """
+    How uniform a round is when the client picks one of k blocks and one
+    window of SAMPLE_SIZE lines uniformly at random.
+
+    Returns the station-weighted mean total variation distance between the
+    per-station inclusion probabilities and uniform (0 = perfectly uniform),
+    and the lowest/highest inclusion probability relative to uniform.
+    """
+    tvd_sum = 0.0
+    worst_low, worst_high = 1.0, 1.0
+    stations = 0
+    for admin, _, count in groups:
+        size = min(SAMPLE_SIZE, count)
+        windows = count - size + 1
+        # Windows covering each position of a block
+        position = np.arange(count)
+        covering = np.minimum(position, windows - 1) - np.maximum(0, position - size + 1) + 1
+
+        hits = np.zeros(count)
+        for order in sample_permutations(admin, count, k):
+            hits[order] += covering
+        ratio = hits / (k * windows) / (size / count)
+
+        tvd_sum += 0.5 * np.abs(ratio - 1).sum()
+        worst_low = min(worst_low, ratio.min())
+        worst_high = max(worst_high, ratio.max())
+        stations += count
+    return tvd_sum / max(stations, 1), worst_low, worst_high
+
+
+def write_variable(country_records):
+    """
+    Write unpadded lines plus per-country offset tables from (admin, records)
+    pairs in ADMIN order. Returns the index's country entries.
+    """
+    countries = {}
+    current_offset = 0
+    offsets_pos = 0
+
+    f_offsets = None if INLINE_OFFSETS else open(OFFSETS_OUTPUT, "wb")
+    try:
+        with open(DATA_OUTPUT, "wb") as f_out:
+            for admin, records in country_records:
+                boundaries = [0]
+                for rec in records:
+                    f_out.write(rec + b"\n")
+                    boundaries.append(boundaries[-1] + len(rec) + 1)
+                count = len(boundaries) - 1
+                if boundaries[-1] > 0xFFFFFFFF:
+                    raise ValueError(f"{admin} exceeds 4 GiB; offsets must fit in uint32")
+                table = struct.pack(f"<{count + 1}I", *boundaries)
+
+                entry = {"start": current_offset, "count": count}
+                if f_offsets is None:
+                    entry["offsets"] = base64.b64encode(table).decode("ascii")
+                else:
+                    f_offsets.write(table)
+                    entry["offsets_ref"] = {"start": offsets_pos, "length": len(table)}
+                    offsets_pos += len(table)
+                countries[str(admin)] = entry
+                current_offset += boundaries[-1]
+    finally:
+        if f_offsets is not None:
+            f_offsets.close()
+
+    return countries
+
+
+def write_binary(radio, groups):
+    """
+    Write dictionary-encoded binary country blocks.
+    Returns (schema, the index's country entries).
+    """
+    schema = station_binary.build_schema(radio)
+    columns = {col: radio[col].tolist() for col in radio.columns}
+    countries = {}
+    current_offset = 0
+
+    with open(BINARY_OUTPUT, "wb") as f_out:
+        for admin, start, count in groups:
+            records, heap = station_binary.encode_country(
+                schema,
+                {col: values[start : start + count] for col, values in columns.items()},
+            )
+            f_out.write(records)
+            f_out.write(heap)
+            countries[str(admin)] = {
+                "start": current_offset,
+                "count": count,
+                "heap_length": len(heap),
+            }
+            current_offset += len(records) + len(heap)
+
+    return schema, countries
+
+
+def verify_binary(schema, countries, encoded):
+    """Decode every binary record and compare it to its JSONL encoding."""
+    matched = total = 0
+    for (admin, entry), records in zip(countries.items(), encoded):
+        decoded = station_binary.read_country(BINARY_OUTPUT, schema, entry)
+        for row, rec in zip(decoded, records):
+            total += 1
+            matched += json.dumps(row).encode("utf-8") == rec
+    return matched, total
+
+
 # ==============================================================================
 # MAIN PROCESSING
 # ==============================================================================
@@ -51,17 +409,39 @@ def main():
         )
         return
 
-    radio = pd.read_json(RADIO_INPUT)
-    radio = radio.sort_values("ADMIN")
-
-    # Step 1: Calculate the maximum line length needed
-    console.print("Calculating maximum record length...")
-    max_len = 0
-    for _, row in radio.iterrows():
+    if EXTERNAL_SORT and LAYOUT == "binary":
+        raise ValueError("EXTERNAL_SORT supports the fixed and variable layouts")
+
+    if EXTERNAL_SORT:
+        # Steps 1 and 2 in one pass: encode, measure and spill sorted runs
+        step("Encoding and spilling sorted runs")
+        console.print(f"Encoding station records in sorted runs of {EXTERNAL_RUN_ROWS:,}...")
+        # Removed after writing, or at exit if writing fails
+        tmp_dir = tempfile.TemporaryDirectory(prefix="organize_", dir=EXTERNAL_TMP_DIR)
+        runs, station_total, max_len = spill_sorted_runs(tmp_dir.name)
+        rows(rows_in=station_total)
+        console.print(f"Spilled {len(runs):,} runs")
+        runs = reduce_runs(runs, tmp_dir.name)
+        country_records = country_runs(merge_runs(runs))
+    else:
+        step("Loading stations")
+        radio = read_stations(RADIO_INPUT)
+        # Stable, so the external sort can reproduce the order exactly
+        radio = radio.sort_values("ADMIN", kind="stable")
+        station_total = len(radio)
+
+        # Step 1: Serialize every record once and keep the bytes for the padding pass
+        step("Encoding station records", rows_in=len(radio))
+        console.print("Encoding station records...")
+        groups = country_groups(radio)
+        encoded = encode_groups(radio, groups)
+
+        # Step 2: Calculate the maximum line length needed
+        step("Calculating maximum record length")
+        console.print("Calculating maximum record length...")
         # +1 for the newline character
-        current_len = len(json.dumps(row.to_dict()).encode("utf-8")) + 1
-        if current_len > max_len:
-            max_len = current_len
+        max_len = max((len(rec) + 1 for recs in encoded for rec in recs), default=0)
+        country_records = zip((admin for admin, _, _ in groups), encoded)
 
     # Add a small buffer and round up to a nice power of 2 or a clean number
     # This makes manual inspection easier and provides room for minor data changes.
@@ -70,61 +450,146 @@ def main():
         f"Set fixed LINE_LENGTH to: [bold yellow]{LINE_LENGTH} bytes[/bold yellow]"
     )
 
-    index_map = {"config": {"line_length": LINE_LENGTH}, "countries": {}}
-
-    current_offset = 0
-
+    step(f"Writing {LAYOUT} layout")
     # Ensure output directory exists
     os.makedirs(os.path.dirname(DATA_OUTPUT), exist_ok=True)
 
-    console.print("Writing fixed-width JSONL and building compact index...")
-
-    with open(DATA_OUTPUT, "wb") as f_out:
-        for admin, group in radio.groupby("ADMIN"):
-            start_byte = current_offset
-
-            for _, row in group.iterrows():
-                # Convert to JSON
-                json_data = json.dumps(row.to_dict()).encode("utf-8")
-
-                # Calculate padding needed: (LINE_LENGTH - 1) because the last byte is \n
-                padding_size = (LINE_LENGTH - 1) - len(json_data)
-
-                if padding_size < 0:
-                    raise ValueError(f"Record too long for LINE_LENGTH {LINE_LENGTH}!")
-
-                # Write: JSON + Spaces + Newline
-                line = json_data + (b" " * padding_size) + b"\n"
-                f_out.write(line)
-
-                current_offset += len(line)
-
-            # Compact index entry
-            index_map["countries"][str(admin)] = {
-                "start": start_byte,
-                "count": len(group),
-            }
+    # Remove files left over from a build with a different layout
+    stale = [BINARY_OUTPUT] if LAYOUT != "binary" else [DATA_OUTPUT]
+    if LAYOUT != "variable" or INLINE_OFFSETS:
+        stale.append(OFFSETS_OUTPUT)
+    for path in stale:
+        if os.path.exists(path):
+            os.remove(path)
+
+    if SAMPLE_BLOCKS and LAYOUT != "fixed":
+        raise ValueError("SAMPLE_BLOCKS needs LAYOUT = 'fixed'")
+
+    if LAYOUT == "binary":
+        console.print("Writing dictionary-encoded binary records...")
+        config, countries = write_binary(radio, groups)
+    elif LAYOUT == "variable":
+        console.print("Writing variable-width JSONL and offset tables...")
+        config = {"layout": "variable"}
+        if not INLINE_OFFSETS:
+            config["offsets_file"] = os.path.basename(OFFSETS_OUTPUT)
+        countries = write_variable(country_records)
+    elif LAYOUT == "fixed":
+        console.print("Writing fixed-width JSONL and building compact index...")
+        config = {"line_length": LINE_LENGTH}
+        if SAMPLE_BLOCKS:
+            console.print(f"Appending {SAMPLE_BLOCKS} shuffled sample blocks per country...")
+            config["sample_blocks"] = SAMPLE_BLOCKS
+        countries = write_fixed(country_records)
+    else:
+        raise ValueError(f"Unknown LAYOUT: {LAYOUT!r}")
+
+    if EXTERNAL_SORT:
+        tmp_dir.cleanup()
+        groups = [(admin, None, entry["count"]) for admin, entry in countries.items()]
+
+    rows(rows_out=station_total)
+    index_map = {"config": config, "countries": countries}
 
     # Save the index
-    with open(INDEX_OUTPUT, "w") as f_index:
-        json.dump(index_map, f_index)
+    for path in (INDEX_OUTPUT, UNCHUNKED_INDEX_OUTPUT):
+        with open(path, "w") as f_index:
+            json.dump(index_map, f_index)
 
     # ==============================================================================
     # VALIDATION & STATISTICS
     # ==============================================================================
 
+    step("Validation")
     console.print("\n[bold cyan]Build Results:[/bold cyan]")
 
-    data_size_mb = os.path.getsize(DATA_OUTPUT) / (1024 * 1024)
+    if LAYOUT == "binary":
+        matched, total = verify_binary(config, countries, encoded)
+        style = "green" if matched == total else "red"
+        console.print(
+            f"[{style}]✓ Binary round-trip matches JSONL: {matched:,}/{total:,} records[/{style}]"
+        )
+        if matched != total:
+            raise ValueError("Binary records do not round-trip to their JSONL encoding")
+
+    data_path = BINARY_OUTPUT if LAYOUT == "binary" else DATA_OUTPUT
+    data_size_mb = os.path.getsize(data_path) / (1024 * 1024)
     index_size_kb = os.path.getsize(INDEX_OUTPUT) / 1024
 
     table = Table(title="Build Results")
     table.add_column("File", style="cyan")
     table.add_column("Size", justify="right", style="green")
-    table.add_row("Data (Fixed JSONL)", f"{data_size_mb:.2f} MB")
+    if LAYOUT == "binary":
+        table.add_row("Data (Binary records)", f"{data_size_mb:.2f} MB")
+    elif LAYOUT == "variable":
+        table.add_row("Data (Variable JSONL)", f"{data_size_mb:.2f} MB")
+        if os.path.exists(OFFSETS_OUTPUT):
+            offsets_size_kb = os.path.getsize(OFFSETS_OUTPUT) / 1024
+            table.add_row("Offsets (uint32)", f"{offsets_size_kb:.2f} KB")
+    else:
+        table.add_row("Data (Fixed JSONL)", f"{data_size_mb:.2f} MB")
     table.add_row("Index (JSON)", f"{index_size_kb:.2f} KB")
     console.print(table)
 
+    station_count = sum(entry["count"] for entry in countries.values())
+    if LAYOUT != "fixed":
+        # Compare against what the fixed-width layout would have written
+        fixed_bytes = station_count * LINE_LENGTH
+        new_bytes = os.path.getsize(data_path) + os.path.getsize(INDEX_OUTPUT)
+        if os.path.exists(OFFSETS_OUTPUT):
+            new_bytes += os.path.getsize(OFFSETS_OUTPUT)
+        saved = fixed_bytes - new_bytes
+        console.print(
+            f"Saved {saved / (1024 * 1024):,.2f} MB vs fixed-width layout "
+            f"({100 * saved / fixed_bytes:.1f}% of {fixed_bytes / (1024 * 1024):,.2f} MB)"
+        )
+
+    if LAYOUT == "binary":
+        record_size = config["record_size"]
+        heap_bytes = sum(entry["heap_length"] for entry in countries.values())
+        console.print(
+            f"Record size: {record_size} bytes + {heap_bytes / max(station_count, 1):.0f} heap bytes/station on average "
+            f"(fixed-width line: {LINE_LENGTH} bytes)"
+        )
+        console.print(
+            f"[bold green]Successfully created binary index for {len(countries)} regions.[/bold green]"
+        )
+        console.print(
+            f"[italic gray]App logic: start + (randomIndex * {record_size}), heap at start + (count * {record_size})[/italic gray]"
+        )
+        return
+
+    if LAYOUT == "variable":
+        console.print(
+            f"[bold green]Successfully created variable-width index for {len(countries)} regions.[/bold green]"
+        )
+        console.print(
+            "[italic gray]App logic: start + offsets\\[randomIndex] .. start + offsets\\[randomIndex + 1][/italic gray]"
+        )
+        return
+
+    if SAMPLE_BLOCKS:
+        # Inclusion uniformity vs. the bytes each extra block costs
+        base_mb = station_count * LINE_LENGTH / (1024 * 1024)
+        stats = Table(title=f"Sample Blocks (window of {SAMPLE_SIZE})")
+        stats.add_column("K", justify="right", style="cyan")
+        stats.add_column("Extra", justify="right", style="yellow")
+        stats.add_column("Mean TVD", justify="right", style="green")
+        stats.add_column("Min / max inclusion vs uniform", justify="right")
+        for k in sorted(set(SAMPLE_STATS_K) | {SAMPLE_BLOCKS}):
+            tvd, low, high = sample_uniformity(groups, k)
+            stats.add_row(
+                f"{k}{' *' if k == SAMPLE_BLOCKS else ''}",
+                f"{k * base_mb:,.1f} MB ({k * 100}%)",
+                f"{tvd:.4f}",
+                f"{low:.2f} / {high:.2f}",
+            )
+        console.print(stats)
+        console.print(
+            "[italic gray]Sample round: start + ((1 + block) * count + window) * "
+            f"{LINE_LENGTH}, {SAMPLE_SIZE} lines[/italic gray]"
+        )
+
     console.print(
         f"[bold green]Successfully created fixed-width index for {len(index_map['countries'])} regions.[/bold green]"
     )
@@ -134,4 +599,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
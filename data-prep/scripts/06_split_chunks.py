@@ -1,100 +1,420 @@
 """
 06_split_chunks.py
 
-Splits fixed-width stations.jsonl into chunks each under TARGET_MB,
-never splitting a country across two files. Outputs updated index.json
-with 'file' (chunk index) and local 'start' byte offset per country.
+Splits stations.jsonl into chunks each under TARGET_MB,
+never splitting a country across two files. Reads 05_organize's unchunked
+index (index_unchunked.json) and writes index.json with 'file' (chunk index)
+and local 'start' byte offset per country.
+
+Works with all 05_organize layouts: fixed-width (country size is
+count * line_length), variable-width (country size is the last entry of
+its offset table) and binary (count * record_size + heap_length, read from
+stations.bin into stations_{i}.bin). Offset tables and heaps are relative to
+each country's start, so they carry over unchanged.
+
+With COMPRESSION set, each country is cut into independently compressed
+frames (one per country, or one per FRAME_RECORDS records) before chunking,
+and TARGET_BYTES applies to the compressed sizes. Each index entry gets
+'frames': [[offset, length], ...] relative to its 'start', so a client can
+range-fetch and decompress a single frame. Record i lives in frame
+i // FRAME_RECORDS, at position i % FRAME_RECORDS within it.
+
+PACKING = "greedy" fills chunks in index order. PACKING = "balanced" packs
+countries into the fewest chunks under TARGET_BYTES with even sizes, instead
+of leaving a nearly empty last chunk; countries are then no longer in ADMIN
+order across files, which the index already handles ('file' + 'start').
+Country ranges are copied with copy_file_range/sendfile, never loaded whole;
+with COMPRESSION, each frame is read and compressed on its own.
+
+Chunk files from earlier runs that this run does not write are deleted, and
+the index config lists the current ones in 'chunk_files' (what copy.sh ships).
 
 Usage: uv run scripts/06_split_chunks.py
 """
 
+import base64
+import errno
+import gzip
 import json
+import math
 import os
+import re
+import struct
+import tempfile
+
+from instrument import instrument, rows, step
 
 DATA_INPUT = "data/out/stations.jsonl"
-INDEX_INPUT = "data/out/index.json"
+BINARY_INPUT = "data/out/stations.bin"
+# Always 05_organize's unchunked index: offsets in ADMIN order, whatever the
+# last packing was, so 06 can rerun on its own
+INDEX_INPUT = "data/out/index_unchunked.json"
+OFFSETS_INPUT = "data/out/offsets.bin"
 OUTPUT_DIR = "data/out"
 CHUNK_PREFIX = "stations"
 INDEX_OUTPUT = "data/out/index.json"
 TARGET_BYTES = 45 * 1024 * 1024  # 45MB
 
+# None (plain chunks), "gzip" or "zstd" (needs the zstandard package)
+COMPRESSION = None
+COMPRESSION_LEVEL = {"gzip": 9, "zstd": 19}
+# Records per compressed frame; None = one frame per country.
+# Binary-layout countries are always a single frame (their heap is shared).
+FRAME_RECORDS = None
+
+# "greedy": fill chunks in index order (countries stay in byte order)
+# "balanced": bin-pack into as few chunks as possible with even sizes
+PACKING = "greedy"
+
+# Buffer size for the read/write fallback when the kernel can't copy for us
+COPY_BUFFER_BYTES = 8 * 1024 * 1024
+
+# Index fields owned by this script, rebuilt on every run
+CHUNK_FIELDS = ("file", "start", "frames")
+CHUNK_CONFIG = ("compression", "frame_records", "chunk_files")
+
+
+def country_byte_sizes(idx):
+    """Byte length of each country's block of lines, for either layout."""
+    config = idx["config"]
+    if config.get("layout") == "binary":
+        return {
+            name: data["count"] * config["record_size"] + data["heap_length"]
+            for name, data in idx["countries"].items()
+        }
+    if "line_length" in config:
+        # Sample blocks (05_organize SAMPLE_BLOCKS) follow each country's lines
+        lines_per_station = 1 + config.get("sample_blocks", 0)
+        return {
+            name: data["count"] * lines_per_station * config["line_length"]
+            for name, data in idx["countries"].items()
+        }
+
+    # Variable layout: the last entry of each offset table is the country's length
+    return {name: offsets[-1] for name, offsets in offset_tables(idx).items()}
+
+
+def offset_tables(idx):
+    """Decode each country's uint32 offset table (variable layout)."""
+    tables = {}
+    f_offsets = None
+    try:
+        for name, data in idx["countries"].items():
+            if "offsets" in data:
+                table = base64.b64decode(data["offsets"])
+            else:
+                if f_offsets is None:
+                    f_offsets = open(OFFSETS_INPUT, "rb")
+                ref = data["offsets_ref"]
+                f_offsets.seek(ref["start"])
+                table = f_offsets.read(ref["length"])
+            tables[name] = struct.unpack(f"<{len(table) // 4}I", table)
+    finally:
+        if f_offsets is not None:
+            f_offsets.close()
+    return tables
+
+
+def get_compressor(method):
+    if method == "gzip":
+        level = COMPRESSION_LEVEL["gzip"]
+        # mtime=0 keeps the output deterministic
+        return lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+    if method == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit(
+                "COMPRESSION = 'zstd' needs the zstandard package (uv add zstandard)"
+            )
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL["zstd"]).compress
+    raise ValueError(f"Unknown COMPRESSION: {method!r}")
+
+
+def frame_cuts(idx, name, size, tables):
+    """Byte positions (relative to the country start) where frames begin, plus the end."""
+    config = idx["config"]
+    count = idx["countries"][name]["count"]
+    if FRAME_RECORDS is None or config.get("layout") == "binary":
+        return [0, size]
+    if "line_length" in config:
+        line_count = count * (1 + config.get("sample_blocks", 0))
+        return [i * config["line_length"] for i in range(0, line_count, FRAME_RECORDS)] + [size]
+    return [tables[name][i] for i in range(0, count, FRAME_RECORDS)] + [size]
+
+
+def compress_countries(idx, ordered, sizes, data_input, spool):
+    """
+    Compress every country into independent frames, appended to `spool`.
+    Returns (ordered, sizes, frames) describing the compressed blocks, in the
+    same shape the chunk planner uses for uncompressed data.
+    """
+    compress = get_compressor(COMPRESSION)
+    tables = offset_tables(idx) if idx["config"].get("layout") == "variable" else {}
+
+    new_ordered, new_sizes, frames = [], {}, {}
+    with open(data_input, "rb") as f_in:
+        for name, data in ordered:
+            cuts = frame_cuts(idx, name, sizes[name], tables)
+
+            block_start = spool.tell()
+            frames[name] = []
+            # One frame in memory at a time, not the whole country
+            for begin, end in zip(cuts, cuts[1:]):
+                f_in.seek(data["start"] + begin)
+                compressed = compress(f_in.read(end - begin))
+                frames[name].append([spool.tell() - block_start, len(compressed)])
+                spool.write(compressed)
+
+            new_ordered.append((name, {**data, "start": block_start}))
+            new_sizes[name] = spool.tell() - block_start
+
+    spool.flush()
+    return new_ordered, new_sizes, frames
+
+
+def plan_greedy(ordered, sizes):
+    """Cut the country list into chunks in order, starting a new chunk at TARGET_BYTES."""
+    chunks = [[]]
+    chunk_bytes = 0
+    for name, _ in ordered:
+        if chunk_bytes + sizes[name] > TARGET_BYTES and chunk_bytes > 0:
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append(name)
+        chunk_bytes += sizes[name]
+    return chunks
+
+
+def plan_balanced(ordered, sizes):
+    """
+    Bin-pack countries into the fewest chunks under TARGET_BYTES, then even
+    out their sizes.
+
+    Countries larger than TARGET_BYTES get a chunk of their own. The rest are
+    placed largest-first into the emptiest chunk that still has room, starting
+    from the lower bound ceil(total / TARGET_BYTES) and adding a chunk only
+    when some country fits nowhere. Within a chunk, countries keep index order.
+    """
+    position = {name: i for i, (name, _) in enumerate(ordered)}
+    oversized = [name for name, _ in ordered if sizes[name] > TARGET_BYTES]
+    rest = sorted(
+        (name for name, _ in ordered if sizes[name] <= TARGET_BYTES),
+        key=lambda name: (-sizes[name], position[name]),
+    )
+
+    num_bins = max(1, math.ceil(sum(sizes[name] for name in rest) / TARGET_BYTES))
+    while True:
+        bins = [[] for _ in range(num_bins)]
+        fill = [0] * num_bins
+        for name in rest:
+            fits = [i for i in range(num_bins) if fill[i] + sizes[name] <= TARGET_BYTES]
+            if not fits:
+                break
+            i = min(fits, key=lambda i: (fill[i], i))
+            bins[i].append(name)
+            fill[i] += sizes[name]
+        else:
+            break
+        num_bins += 1
+
+    chunks = [[name] for name in oversized] + [b for b in bins if b]
+    chunks = [sorted(chunk, key=position.get) for chunk in chunks]
+    # Number chunks in index order of their first country
+    chunks.sort(key=lambda chunk: position[chunk[0]])
+    return chunks or [[]]
+
+
+def copy_range(fd_in, fd_out, offset, count):
+    """
+    Append `count` bytes of fd_in, starting at `offset`, to fd_out.
+
+    Uses copy_file_range (Linux; can share extents on CoW filesystems), then
+    sendfile, so the bytes never pass through Python. Falls back to a bounded
+    pread/write loop elsewhere (e.g. macOS), so memory stays at
+    COPY_BUFFER_BYTES rather than the size of the largest country.
+    """
+    end = offset + count
+    for method in ("copy_file_range", "sendfile"):
+        if not hasattr(os, method) or method in _unsupported_copy:
+            continue
+        try:
+            while offset < end:
+                if method == "copy_file_range":
+                    n = os.copy_file_range(fd_in, fd_out, end - offset, offset)
+                else:
+                    n = os.sendfile(fd_out, fd_in, offset, end - offset)
+                if n == 0:
+                    break
+                offset += n
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSOCK, errno.EOPNOTSUPP):
+                raise
+            # Not supported for this pair of files: finish with the next method
+            _unsupported_copy.add(method)
+            continue
+        break
+
+    while offset < end:
+        data = os.pread(fd_in, min(COPY_BUFFER_BYTES, end - offset), offset)
+        if not data:
+            break
+        os.write(fd_out, data)
+        offset += len(data)
+
+    if offset != end:
+        raise RuntimeError(f"Short read: stopped at byte {offset}, expected {end}")
+
+
+_unsupported_copy = set()
+
+
+def remove_stale_chunks(keep):
+    """
+    Delete chunk files from earlier runs that `keep` (this run's chunk paths)
+    does not list: a higher chunk count, or another layout or compression.
+    """
+    pattern = re.compile(rf"{re.escape(CHUNK_PREFIX)}_\d+\.(jsonl|bin)(\.gz|\.zst)?")
+    keep = {os.path.normpath(path) for path in keep}
+    removed = []
+    for filename in sorted(os.listdir(OUTPUT_DIR)):
+        path = os.path.normpath(os.path.join(OUTPUT_DIR, filename))
+        if pattern.fullmatch(filename) and path not in keep:
+            os.remove(path)
+            removed.append(filename)
+    return removed
+
 
 def main():
+    step("Reading index")
     with open(INDEX_INPUT) as f:
         idx = json.load(f)
 
-    line_length = idx["config"]["line_length"]
-
-    sample = next(iter(idx["countries"].values()))
-    if "file" in sample:
-        # Index was already chunked — reconstruct global offsets from (file, local_start) order
-        by_file_order = sorted(idx["countries"].items(), key=lambda kv: (kv[1]["file"], kv[1]["start"]))
-        cumulative = 0
-        ordered = []
-        for name, data in by_file_order:
-            ordered.append((name, {**data, "start": cumulative}))
-            cumulative += data["count"] * line_length
-    else:
-        ordered = sorted(idx["countries"].items(), key=lambda kv: kv[1]["start"])
+    sizes = country_byte_sizes(idx)
+    binary = idx["config"].get("layout") == "binary"
+    data_input = BINARY_INPUT if binary else DATA_INPUT
+    chunk_ext = "bin" if binary else "jsonl"
+    if COMPRESSION:
+        chunk_ext += {"gzip": ".gz", "zstd": ".zst"}[COMPRESSION]
 
-    # Pass 1: plan chunk assignments
-    plan = []  # (name, global_start, count, chunk_id, local_start)
-    chunk_id = 0
-    chunk_bytes = 0
-    chunk_base_global = 0
+    if "file" in next(iter(idx["countries"].values()), {}):
+        raise SystemExit(f"{INDEX_INPUT} is already chunked; rerun 05_organize.py to rebuild it")
+    ordered = sorted(idx["countries"].items(), key=lambda kv: kv[1]["start"])
 
-    for name, data in ordered:
-        country_bytes = data["count"] * line_length
-        if chunk_bytes + country_bytes > TARGET_BYTES and chunk_bytes > 0:
-            chunk_id += 1
-            chunk_base_global += chunk_bytes
-            chunk_bytes = 0
+    raw_sizes = sizes
+    rows(rows_in=len(idx["countries"]))
+    frames = {}
+    spool = None
+    if COMPRESSION:
+        step("Compressing countries")
+        print(f"Compressing countries into {COMPRESSION} frames...")
+        spool = tempfile.TemporaryFile(dir=OUTPUT_DIR)
+        ordered, sizes, frames = compress_countries(idx, ordered, sizes, data_input, spool)
 
-        local_start = data["start"] - chunk_base_global
-        assert local_start == chunk_bytes, (
-            f"Offset mismatch for {name}: expected {chunk_bytes}, got {local_start}"
+    # Input countries must tile the file back to back, or the offsets are stale
+    expected = 0
+    for name, data in ordered:
+        assert data["start"] == expected, (
+            f"Offset mismatch for {name}: expected {expected}, got {data['start']}"
         )
-        plan.append((name, data["start"], data["count"], chunk_id, local_start))
-        chunk_bytes += country_bytes
+        expected += sizes[name]
+
+    step("Planning chunks")
+    # Pass 1: plan chunk assignments
+    if PACKING == "greedy":
+        chunks = plan_greedy(ordered, sizes)
+    elif PACKING == "balanced":
+        chunks = plan_balanced(ordered, sizes)
+    else:
+        raise ValueError(f"Unknown PACKING: {PACKING!r}")
 
-    num_chunks = chunk_id + 1
-    print(f"Creating {num_chunks} chunk files...")
+    global_starts = {name: data["start"] for name, data in ordered}
+    plan = []  # (name, global_start, country_bytes, chunk_id, local_start)
+    for chunk_id, names in enumerate(chunks):
+        local_start = 0
+        for name in names:
+            plan.append((name, global_starts[name], sizes[name], chunk_id, local_start))
+            local_start += sizes[name]
 
-    # Pass 2: write chunk files
+    num_chunks = len(chunks)
+    print(f"Creating {num_chunks} chunk files ({PACKING} packing)...")
+
+    step("Writing chunk files")
+    # Pass 2: write chunk files, one at a time, copying country ranges in the kernel
     out_paths = [
-        os.path.join(OUTPUT_DIR, f"{CHUNK_PREFIX}_{i}.jsonl") for i in range(num_chunks)
+        os.path.join(OUTPUT_DIR, f"{CHUNK_PREFIX}_{i}.{chunk_ext}") for i in range(num_chunks)
     ]
-    out_handles = [open(p, "wb") for p in out_paths]
+    stale = remove_stale_chunks(out_paths)
+    if stale:
+        print(f"Removed {len(stale)} stale chunk files: {', '.join(stale)}")
+    # Copy from the compressed spool when compressing, else straight from the input
+    f_in = spool if spool is not None else open(data_input, "rb")
     try:
-        with open(DATA_INPUT, "rb") as f_in:
-            for name, global_start, count, cid, _ in plan:
-                country_bytes = count * line_length
-                f_in.seek(global_start)
-                data_bytes = f_in.read(country_bytes)
-                if len(data_bytes) != country_bytes:
-                    raise RuntimeError(
-                        f"Short read for {name}: got {len(data_bytes)}, expected {country_bytes}"
-                    )
-                out_handles[cid].write(data_bytes)
+        for cid, path in enumerate(out_paths):
+            with open(path, "wb") as f_out:
+                for name, global_start, country_bytes, chunk_id, _ in plan:
+                    if chunk_id != cid:
+                        continue
+                    try:
+                        copy_range(f_in.fileno(), f_out.fileno(), global_start, country_bytes)
+                    except RuntimeError as e:
+                        raise RuntimeError(f"Copying {name}: {e}") from None
     finally:
-        for fh in out_handles:
-            fh.close()
+        f_in.close()
 
+    step("Writing index")
     # Write updated index.json
-    new_countries = {
-        name: {"file": cid, "start": local_start, "count": count}
-        for name, _, count, cid, local_start in plan
-    }
+    # (count and any offset table / ref are carried over as-is)
+    new_countries = {}
+    for name, _, _, cid, local_start in plan:
+        entry = {"file": cid, "start": local_start}
+        entry.update(
+            (k, v) for k, v in idx["countries"][name].items() if k not in CHUNK_FIELDS
+        )
+        if COMPRESSION:
+            entry["frames"] = frames[name]
+        new_countries[name] = entry
+
+    config = {k: v for k, v in idx["config"].items() if k not in CHUNK_CONFIG}
+    # Every chunk file, so copy.sh ships exactly these
+    config["chunk_files"] = [os.path.basename(path) for path in out_paths]
+    if COMPRESSION:
+        config["compression"] = COMPRESSION
+        config["frame_records"] = FRAME_RECORDS
     with open(INDEX_OUTPUT, "w") as f:
-        json.dump({"config": {"line_length": line_length}, "countries": new_countries}, f)
+        json.dump({"config": config, "countries": new_countries}, f)
+    rows(rows_out=len(new_countries))
 
     # Print summary
+    # Fill is relative to TARGET_BYTES; over 100% means a single oversized country
     for i, path in enumerate(out_paths):
-        size_mb = os.path.getsize(path) / (1024 * 1024)
+        size = os.path.getsize(path)
         country_ct = sum(1 for *_, cid, _ in plan if cid == i)
-        print(f"  {os.path.basename(path)}: {size_mb:.1f} MB, {country_ct} countries")
+        print(
+            f"  {os.path.basename(path)}: {size / (1024 * 1024):.1f} MB, "
+            f"{country_ct} countries, {size / TARGET_BYTES:.0%} full"
+        )
+    chunk_sizes = [os.path.getsize(p) for p in out_paths]
+    oversized = [size for size in sizes.values() if size > TARGET_BYTES]
+    fitting = sum(sizes.values()) - sum(oversized)
+    min_chunks = max(1, len(oversized) + math.ceil(fitting / TARGET_BYTES))
+    print(
+        f"  {num_chunks} chunks (lower bound {min_chunks}), "
+        f"mean fill {sum(chunk_sizes) / (num_chunks * TARGET_BYTES):.0%}, "
+        f"smallest {min(chunk_sizes) / TARGET_BYTES:.0%}"
+    )
+    if COMPRESSION:
+        raw_total = sum(raw_sizes.values())
+        compressed_total = sum(sizes.values())
+        frame_ct = sum(len(f) for f in frames.values())
+        print(
+            f"  {COMPRESSION}: {raw_total / (1024 * 1024):.1f} MB -> "
+            f"{compressed_total / (1024 * 1024):.1f} MB "
+            f"({raw_total / max(compressed_total, 1):.1f}x) in {frame_ct:,} frames"
+        )
     print("Done. index.json updated.")
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
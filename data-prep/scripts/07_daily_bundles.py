@@ -0,0 +1,283 @@
+"""
+Daily Challenge Bundles
+
+Precomputes the daily challenge for a range of dates so the frontend can load
+a day's country and all of its stations with one small range request, instead
+of an index fetch plus up to 5 station range requests.
+
+METHODOLOGY:
+- Replays the frontend's selection (useRadio.ts loadCountryBySeed) for each
+  date: seed = YYYYMMDD, SeededRandom LCG (1103515245 * s + 12345 mod 2^31),
+  country = sorted ADMIN names[nextInt(n)], then up to 5 unique station
+  indices drawn from a shrinking pool with nextInt(pool length).
+- Names are sorted by UTF-16 code units, like JavaScript's default sort.
+- Station records are read back from the chunk files through index.json, the
+  same way the frontend reads them, for every 05/06 layout and compression.
+- Each day becomes one JSON line padded to a shared LINE_LENGTH, so day d
+  lives at (d - start_date) * line_length.
+
+INPUT:
+- data/out/index.json and the stations_{i} chunks (from 06_split_chunks.py)
+
+OUTPUT:
+- data/out/daily.jsonl: one fixed-width line per day:
+    {"date", "seed", "day", "country", "stations": [...]}
+- data/out/daily_index.json:
+    {"start_date", "days", "line_length", "seed_format": "YYYYMMDD"}
+
+VALIDATION:
+- The LCG is checked against the sequence locked in
+  frontend/src/composables/__tests__/dailyChallenge.test.ts, and that test
+  re-derives every bundled day from index.json with the TypeScript code: a
+  small committed fixture (__tests__/fixtures/daily) always, the real bundle
+  once copy.sh has copied it
+- With START_DATE = None, pipeline.py reruns this stage when the UTC date
+  changes (DATED_STAGES), so the window moves forward with each daily run
+
+USAGE:
+    uv run scripts/07_daily_bundles.py
+"""
+
+import base64
+import datetime
+import gzip
+import json
+import os
+import struct
+
+import station_binary
+from instrument import instrument, rows, step
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+INDEX_INPUT = "data/out/index.json"
+CHUNK_DIR = "data/out"
+CHUNK_PREFIX = "stations"
+DAILY_OUTPUT = "data/out/daily.jsonl"
+DAILY_INDEX_OUTPUT = "data/out/daily_index.json"
+
+# First bundled date (UTC, "YYYY-MM-DD"); None = today
+START_DATE = None
+DAYS = 90
+
+# Day 1 of the daily challenge (getDailyChallengeNumber in useRadio.ts)
+DAILY_EPOCH = datetime.date(2026, 2, 2)
+
+# Stations per round (Math.min(5, count) in useRadio.ts)
+STATIONS_PER_DAY = 5
+
+# Locked in dailyChallenge.test.ts: first 10 nextInt(1000) values for this seed
+LCG_CHECK_SEED = 20251201
+LCG_CHECK_VALUES = [478, 607, 100, 61, 50, 875, 488, 1, 742, 87]
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+class SeededRandom:
+    """Port of SeededRandom in useRadio.ts."""
+
+    def __init__(self, seed):
+        self.state = seed
+
+    def next_int(self, max_value):
+        self.state = (1103515245 * self.state + 12345) % 2147483648
+        # JS `%` keeps the dividend's sign; the state is never negative here
+        return abs(self.state % max_value)
+
+
+def date_seed(date):
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def js_sorted(names):
+    """Sort like Array.prototype.sort(): by UTF-16 code units."""
+    return sorted(names, key=lambda name: name.encode("utf-16-be"))
+
+
+def select_for_seed(seed, names, countries):
+    """Country name and station indices, exactly as loadCountryBySeed picks them."""
+    rng = SeededRandom(seed)
+    country = names[rng.next_int(len(names))]
+    count = countries[country]["count"]
+    pool = list(range(count))
+    indices = [pool.pop(rng.next_int(len(pool))) for _ in range(min(STATIONS_PER_DAY, count))]
+    return country, indices
+
+
+def chunk_path(config, entry):
+    ext = "bin" if config.get("layout") == "binary" else "jsonl"
+    ext += {None: "", "gzip": ".gz", "zstd": ".zst"}[config.get("compression")]
+    return os.path.join(CHUNK_DIR, f"{CHUNK_PREFIX}_{entry['file']}.{ext}")
+
+
+def get_decompressor(method):
+    if method == "gzip":
+        return gzip.decompress
+    if method == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit("Reading zstd chunks needs the zstandard package (uv add zstandard)")
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown compression: {method!r}")
+
+
+def read_country_block(config, entry):
+    """A country's raw (uncompressed) bytes from its chunk file."""
+    with open(chunk_path(config, entry), "rb") as f:
+        if config.get("compression"):
+            decompress = get_decompressor(config["compression"])
+            parts = []
+            for offset, length in entry["frames"]:
+                f.seek(entry["start"] + offset)
+                parts.append(decompress(f.read(length)))
+            return b"".join(parts)
+
+        if config.get("layout") == "binary":
+            size = entry["count"] * config["record_size"] + entry["heap_length"]
+        elif "line_length" in config:
+            size = entry["count"] * config["line_length"]
+        else:
+            size = read_offset_table(config, entry)[-1]
+        f.seek(entry["start"])
+        return f.read(size)
+
+
+def read_offset_table(config, entry):
+    """Variable layout: the country's uint32 offset table, inline or from offsets.bin."""
+    if "offsets" in entry:
+        table = base64.b64decode(entry["offsets"])
+    else:
+        ref = entry["offsets_ref"]
+        with open(os.path.join(CHUNK_DIR, config["offsets_file"]), "rb") as f:
+            f.seek(ref["start"])
+            table = f.read(ref["length"])
+    return struct.unpack(f"<{len(table) // 4}I", table)
+
+
+def read_country_records(config, entry):
+    """Decode every station of one country, in index order."""
+    block = read_country_block(config, entry)
+    if config.get("layout") == "binary":
+        return station_binary.decode_country(config, block, entry["count"])
+    if "line_length" in config:
+        ll = config["line_length"]
+        lines = [block[i * ll : (i + 1) * ll] for i in range(entry["count"])]
+    else:
+        offsets = read_offset_table(config, entry)
+        lines = [block[a:b] for a, b in zip(offsets, offsets[1:])]
+    return [json.loads(line) for line in lines]
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    console.print("[bold cyan]Building daily challenge bundles[/bold cyan]")
+
+    step("Selecting daily stations")
+    rng = SeededRandom(LCG_CHECK_SEED)
+    values = [rng.next_int(1000) for _ in range(len(LCG_CHECK_VALUES))]
+    if values != LCG_CHECK_VALUES:
+        raise SystemExit(f"SeededRandom drifted from the frontend: {values} != {LCG_CHECK_VALUES}")
+
+    with open(INDEX_INPUT) as f:
+        idx = json.load(f)
+    config, countries = idx["config"], idx["countries"]
+    if "file" not in next(iter(countries.values())):
+        raise SystemExit(f"{INDEX_INPUT} is not chunked yet; run 06_split_chunks.py first")
+    names = js_sorted(countries)
+
+    start = (
+        datetime.date.fromisoformat(START_DATE)
+        if START_DATE
+        else datetime.datetime.now(datetime.timezone.utc).date()
+    )
+    dates = [start + datetime.timedelta(days=i) for i in range(DAYS)]
+
+    # Each country is decoded at most once, however many days pick it
+    records_cache = {}
+    lines = []
+    picks = []
+    for date in dates:
+        seed = date_seed(date)
+        country, indices = select_for_seed(seed, names, countries)
+        if country not in records_cache:
+            records_cache[country] = read_country_records(config, countries[country])
+        records = records_cache[country]
+        bundle = {
+            "date": date.isoformat(),
+            "seed": seed,
+            "day": (date - DAILY_EPOCH).days + 1,
+            "country": country,
+            "stations": [records[i] for i in indices],
+        }
+        lines.append(json.dumps(bundle).encode("utf-8"))
+        picks.append((date, country, indices))
+
+    step("Writing bundles")
+    # Same padding scheme as 05_organize's fixed-width layout
+    line_length = max(len(line) for line in lines) + 1
+    with open(DAILY_OUTPUT, "wb") as f:
+        for line in lines:
+            f.write(line.ljust(line_length - 1) + b"\n")
+
+    daily_index = {
+        "start_date": start.isoformat(),
+        "days": DAYS,
+        "line_length": line_length,
+        "seed_format": "YYYYMMDD",
+    }
+    with open(DAILY_INDEX_OUTPUT, "w") as f:
+        json.dump(daily_index, f, indent=2)
+    rows(rows_out=len(lines))
+
+    # ==============================================================================
+    # VALIDATION & STATISTICS
+    # ==============================================================================
+
+    step("Validation")
+    with open(DAILY_OUTPUT, "rb") as f:
+        for i, (date, country, indices) in enumerate(picks):
+            f.seek(i * line_length)
+            bundle = json.loads(f.read(line_length))
+            assert bundle["date"] == date.isoformat() and bundle["country"] == country
+            assert len(bundle["stations"]) == len(indices)
+            assert all(s.get("ADMIN") == country for s in bundle["stations"])
+
+    table = Table(title="Daily Bundles")
+    table.add_column("Date", style="cyan")
+    table.add_column("Day", justify="right")
+    table.add_column("Country", style="green")
+    table.add_column("Station indices", style="magenta")
+    for date, country, indices in picks[:7]:
+        table.add_row(
+            date.isoformat(),
+            str((date - DAILY_EPOCH).days + 1),
+            country,
+            ", ".join(map(str, indices)),
+        )
+    console.print(table)
+
+    size = os.path.getsize(DAILY_OUTPUT)
+    console.print(
+        f"\n[bold]{DAYS} days[/bold] from {start.isoformat()}: "
+        f"{line_length:,} bytes per day, {size / 1024:.1f} KB total "
+        f"({len(records_cache)} distinct countries)"
+    )
+    console.print(f"Saved to [bold]{DAILY_OUTPUT}[/bold] and [bold]{DAILY_INDEX_OUTPUT}[/bold]")
+
+
+if __name__ == "__main__":
+    with instrument(__file__):
+        main()
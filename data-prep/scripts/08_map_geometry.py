@@ -0,0 +1,335 @@
+"""
+Quantized Multi-Resolution Map Geometry
+
+This script encodes the country polygons the frontend draws as TopoJSON at
+several simplification levels, so the map can paint from a small file first
+and swap in detail later.
+
+METHODOLOGY:
+- Coordinates are snapped to a fine integer grid (BASE_QUANTIZATION steps
+  across the bounding box), so points shared by two countries are identical
+- Topology: a point is a junction where the rings passing through it disagree
+  on its neighbours (where a shared border starts or ends). Rings are cut at
+  junctions into arcs, and an arc that already exists (in either direction)
+  is referenced instead of stored again, so each border is stored once
+- Each level simplifies all arcs together with GEOS's topology-preserving
+  simplifier. Arc endpoints never move and arcs can't cross each other, so
+  neighbouring countries still meet without gaps or overlaps
+- The simplified arcs are quantized to the level's grid and delta-encoded
+  (first position absolute, then differences), as in the TopoJSON spec
+- Only ADMIN is kept as a property, like ne_110m_admin_only.geojson
+
+INPUT:
+- Natural Earth countries layer (GeoParquet from 01_load_data)
+
+OUTPUT:
+- data/out/topo/countries_{level}.json for every level in LEVELS, with one
+  GeometryCollection object named "countries"
+
+VALIDATION:
+- Every level is decoded back to polygons; the report shows the median and
+  worst relative area change per country and how many shapes became invalid
+- The size report compares raw and gzipped bytes against the GeoJSON the
+  frontend loads today
+
+USAGE:
+    uv run scripts/08_map_geometry.py
+"""
+
+import gzip
+import json
+import os
+
+import numpy as np
+import shapely
+from instrument import instrument, step
+from ne_io import read_layer
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+NE_INPUT = "data/ne/ne_110m_admin_0_countries.parquet"
+# For the size report only: what the frontend loads today
+GEOJSON_INPUT = "data/ne/ne_110m_admin_only.geojson"
+TOPO_OUTPUT = "data/out/topo"
+OBJECT_NAME = "countries"
+
+# Grid used to detect shared points (steps across the bounding box)
+BASE_QUANTIZATION = 10**7
+
+# Level name -> simplification tolerance (degrees, 0 = none) and output grid
+LEVELS = {
+    "low": {"tolerance": 0.25, "quantization": 10**4},
+    "medium": {"tolerance": 0.05, "quantization": 10**5},
+    "full": {"tolerance": 0, "quantization": 10**6},
+}
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def ring_coordinates(geometry):
+    """Rings of a (Multi)Polygon as lists of coordinate arrays, per polygon."""
+    polygons = [geometry] if geometry.geom_type == "Polygon" else list(geometry.geoms)
+    return [
+        [np.asarray(polygon.exterior.coords)] + [np.asarray(r.coords) for r in polygon.interiors]
+        for polygon in polygons
+    ]
+
+
+def quantize(coords, transform):
+    (kx, ky), (x0, y0) = transform["scale"], transform["translate"]
+    return np.column_stack(
+        [np.round((coords[:, 0] - x0) / kx), np.round((coords[:, 1] - y0) / ky)]
+    ).astype(np.int64)
+
+
+def make_transform(bbox, quantization):
+    x0, y0, x1, y1 = bbox
+    return {
+        "scale": [(x1 - x0) / (quantization - 1), (y1 - y0) / (quantization - 1)],
+        "translate": [x0, y0],
+    }
+
+
+def dedupe_consecutive(points):
+    """Drop points equal to their predecessor."""
+    if len(points) < 2:
+        return points
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    return points[keep]
+
+
+def find_junctions(rings):
+    """
+    Keys (x * 2^32 + y) of the points where rings disagree on the neighbours,
+    i.e. where a shared border begins or ends.
+    """
+    keys, pairs_a, pairs_b = [], [], []
+    for ring in rings:
+        k = (ring[:-1, 0] << 32) + ring[:-1, 1]
+        prev, nxt = np.roll(k, 1), np.roll(k, -1)
+        keys.append(k)
+        pairs_a.append(np.minimum(prev, nxt))
+        pairs_b.append(np.maximum(prev, nxt))
+    keys = np.concatenate(keys)
+    pairs = np.unique(
+        np.rec.fromarrays([keys, np.concatenate(pairs_a), np.concatenate(pairs_b)])
+    )
+    unique_keys, counts = np.unique(pairs.f0, return_counts=True)
+    return set(unique_keys[counts > 1].tolist())
+
+
+def build_topology(rings_per_feature):
+    """
+    Cut every ring into arcs at junctions and share identical arcs.
+    Returns (arcs as int64 arrays, per-feature polygons of rings of arc indices);
+    a negative index ~i means arc i reversed.
+    """
+    all_rings = [ring for polygons in rings_per_feature for rings in polygons for ring in rings]
+    junctions = find_junctions(all_rings)
+
+    arcs, arc_ids = [], {}
+
+    def arc_index(points):
+        forward = points.tobytes()
+        if forward in arc_ids:
+            return arc_ids[forward]
+        backward = points[::-1].tobytes()
+        if backward in arc_ids:
+            return ~arc_ids[backward]
+        arc_ids[forward] = len(arcs)
+        arcs.append(points)
+        return arc_ids[forward]
+
+    def ring_arcs(ring):
+        body = ring[:-1]
+        keys = ((body[:, 0] << 32) + body[:, 1]).tolist()
+        cuts = [i for i, key in enumerate(keys) if key in junctions]
+        if not cuts:
+            # A ring with no junction is one closed arc; start it at its smallest
+            # point so the same ring seen elsewhere (island / enclave hole) matches
+            start = int(np.argmin(keys))
+            rotated = np.concatenate([body[start:], body[:start]])
+            return [arc_index(np.concatenate([rotated, rotated[:1]]))]
+        rotated = np.concatenate([body[cuts[0] :], body[: cuts[0]], body[cuts[0] : cuts[0] + 1]])
+        offsets = [c - cuts[0] for c in cuts] + [len(body)]
+        return [arc_index(rotated[a : b + 1]) for a, b in zip(offsets, offsets[1:])]
+
+    features = [
+        [[ring_arcs(ring) for ring in rings] for rings in polygons]
+        for polygons in rings_per_feature
+    ]
+    return arcs, features
+
+
+def simplify_arcs(arcs, base_transform, tolerance):
+    """Arcs in degrees, simplified together so they cannot cross each other."""
+    (kx, ky), (x0, y0) = base_transform["scale"], base_transform["translate"]
+    lines = [np.column_stack([a[:, 0] * kx + x0, a[:, 1] * ky + y0]) for a in arcs]
+    if tolerance == 0:
+        return lines
+    simplified = shapely.simplify(shapely.MultiLineString(lines), tolerance, preserve_topology=True)
+    parts = shapely.get_parts(simplified)
+    assert len(parts) == len(lines), "simplification dropped arcs"
+    return [shapely.get_coordinates(part) for part in parts]
+
+
+def encode_arc(points):
+    """Delta-encode quantized positions; always at least two positions."""
+    points = dedupe_consecutive(points)
+    if len(points) == 1:
+        points = np.vstack([points, points])
+    deltas = np.vstack([points[:1], np.diff(points, axis=0)])
+    return deltas.tolist()
+
+
+def encode_level(names, features, arcs, bbox, base_transform, level):
+    transform = make_transform(bbox, level["quantization"])
+    lines = simplify_arcs(arcs, base_transform, level["tolerance"])
+    encoded_arcs = [encode_arc(quantize(line, transform)) for line in lines]
+
+    geometries = []
+    for name, polygons in zip(names, features):
+        if len(polygons) == 1:
+            geometries.append({"type": "Polygon", "arcs": polygons[0], "properties": {"ADMIN": name}})
+        else:
+            geometries.append(
+                {"type": "MultiPolygon", "arcs": polygons, "properties": {"ADMIN": name}}
+            )
+
+    return {
+        "type": "Topology",
+        "bbox": list(bbox),
+        "transform": transform,
+        "objects": {OBJECT_NAME: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": encoded_arcs,
+    }
+
+
+def decode_topology(topology):
+    """Polygons per geometry, rebuilt from the arcs (for validation)."""
+    (kx, ky), (x0, y0) = topology["transform"]["scale"], topology["transform"]["translate"]
+    arcs = []
+    for arc in topology["arcs"]:
+        q = np.cumsum(np.asarray(arc, dtype=np.int64), axis=0)
+        arcs.append(np.column_stack([q[:, 0] * kx + x0, q[:, 1] * ky + y0]))
+
+    def ring(indices):
+        pieces = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in indices]
+        return np.concatenate([pieces[0]] + [p[1:] for p in pieces[1:]])
+
+    decoded = []
+    for geometry in topology["objects"][OBJECT_NAME]["geometries"]:
+        polygons = [geometry["arcs"]] if geometry["type"] == "Polygon" else geometry["arcs"]
+        decoded.append(
+            shapely.multipolygons(
+                [shapely.Polygon(ring(rings[0]), [ring(r) for r in rings[1:]]) for rings in polygons]
+            )
+        )
+    return decoded
+
+
+def serialize(topology):
+    return json.dumps(topology, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    step("Loading Natural Earth dataset")
+    console.print("\n[bold cyan]Loading Natural Earth dataset...[/bold cyan]")
+    gdf = read_layer(NE_INPUT, columns=["ADMIN"])
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    console.print(f"Loaded {len(gdf)} countries")
+
+    bbox = tuple(float(v) for v in gdf.total_bounds)
+    base_transform = make_transform(bbox, BASE_QUANTIZATION)
+
+    step("Building topology", rows_in=len(gdf))
+    console.print("\n[bold cyan]Building topology...[/bold cyan]")
+    rings_per_feature = []
+    for geometry in gdf.geometry:
+        polygons = []
+        for rings in ring_coordinates(geometry):
+            rings = [dedupe_consecutive(quantize(r, base_transform)) for r in rings]
+            # Rings that collapse on the grid carry no area
+            rings = [r for r in rings if len(r) >= 4]
+            if rings:
+                polygons.append(rings)
+        rings_per_feature.append(polygons)
+
+    arcs, features = build_topology(rings_per_feature)
+    references = sum(len(r) for polygons in features for rings in polygons for r in rings)
+    console.print(f"{len(arcs):,} arcs for {references:,} arc references")
+
+    os.makedirs(TOPO_OUTPUT, exist_ok=True)
+    names = gdf["ADMIN"].tolist()
+    source_areas = shapely.area(gdf.geometry.values)
+
+    # ==============================================================================
+    # ENCODE, VALIDATE & SAVE
+    # ==============================================================================
+
+    step("Encoding levels")
+    table = Table(title="Map Geometry Sizes")
+    table.add_column("File", style="cyan")
+    table.add_column("Points", justify="right")
+    table.add_column("Bytes", justify="right", style="green")
+    table.add_column("Gzipped", justify="right", style="green")
+    table.add_column("vs today", justify="right", style="magenta")
+    table.add_column("Area err p50/max", justify="right")
+    table.add_column("Invalid", justify="right")
+
+    baseline_gz = None
+    if os.path.exists(GEOJSON_INPUT):
+        with open(GEOJSON_INPUT, "rb") as f:
+            raw = f.read()
+        baseline_gz = len(gzip.compress(raw, 9))
+        table.add_row(
+            os.path.basename(GEOJSON_INPUT), "-", f"{len(raw):,}", f"{baseline_gz:,}", "100.0%", "-", "-"
+        )
+
+    for level_name, level in LEVELS.items():
+        topology = encode_level(names, features, arcs, bbox, base_transform, level)
+        data = serialize(topology)
+        packed = len(gzip.compress(data, 9))
+
+        decoded = decode_topology(topology)
+        assert len(decoded) == len(names), f"{level_name}: geometry count changed"
+        decoded = np.array(decoded, dtype=object)
+        errors = np.abs(shapely.area(decoded) - source_areas) / np.maximum(source_areas, 1e-12)
+        # Simplification can pinch small shapes; MapLibre still draws them
+        invalid = int((~shapely.is_valid(decoded)).sum())
+
+        path = os.path.join(TOPO_OUTPUT, f"{OBJECT_NAME}_{level_name}.json")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        table.add_row(
+            os.path.basename(path),
+            f"{sum(len(a) for a in topology['arcs']):,}",
+            f"{len(data):,}",
+            f"{packed:,}",
+            f"{100 * packed / baseline_gz:.1f}%" if baseline_gz else "-",
+            f"{100 * np.median(errors):.2f}% / {100 * errors.max():.1f}%",
+            str(invalid),
+        )
+
+    console.print(table)
+    console.print(f"[bold green]✓ Saved {len(LEVELS)} levels to {TOPO_OUTPUT}/[/bold green]")
+
+
+if __name__ == "__main__":
+    with instrument(__file__):
+        main()
@@ -0,0 +1,321 @@
+"""
+Radio Pipeline Benchmark
+
+Runs the radio stages (03_filter_radio -> 06_split_chunks) offline on
+synthetic crawls of several sizes and compares their speed and memory with
+a stored baseline, so slowdowns show up before a real crawl grows into them.
+
+METHODOLOGY:
+- Each scale is a multiple of the real crawl's station count
+  (crawl/out/output.csv), or of BASE_STATIONS when there is no crawl
+- Every scale gets its own working directory under BENCH_DIR, holding the
+  synthetic crawl (synthetic_crawl.py) as crawl/out/output.csv and a link to
+  the real data/ne, so the stages run unmodified on their usual relative
+  paths and nothing in data/out is touched
+- A scale's crawl is generated once and reused while its station count and
+  seed are unchanged
+- Stages run one after another as subprocesses, like pipeline.py runs them,
+  with their default settings (no stream probing). Outputs and caches are
+  cleared before every pass, so each pass does the same work
+- Wall time, CPU time, peak RSS (of the stage's largest process, pool
+  workers included), rows and per-step times come from the stage's
+  instrument.py report, so interpreter start-up and imports are left out;
+  the whole subprocess time is kept as process_s
+- With --repeat N the chain runs N times and each stage's fastest pass counts
+- A stage regresses against BASELINE_FILE when its wall time grows by more
+  than WALL_TOLERANCE (and by at least MIN_WALL_DELTA_S) or its peak RSS by
+  more than RSS_TOLERANCE. Any regression makes the script exit with 1.
+  Baselines are machine-specific; record one on the machine that compares
+
+INPUT:
+- data/ne/ (from 01_load_data.py)
+- crawl/out/output.csv (optional; sets the 1x size and the country mix)
+
+OUTPUT:
+- data/bench/{stations}/          working directory per scale (crawl, outputs, logs)
+- data/bench/results.json         results of the latest run
+- data/bench/baseline.json        written with --save-baseline
+
+USAGE:
+    uv run scripts/benchmark.py                        # 1x and 10x, compared with the baseline
+    uv run scripts/benchmark.py --scales 1 10 100 --repeat 3
+    uv run scripts/benchmark.py --save-baseline        # keep these results as the baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+from instrument import REPORT_DIR, RUN_ID_ENV
+from rich.console import Console
+from rich.table import Table
+from synthetic_crawl import NE_INPUT, SAMPLE_CRAWL, SEED, generate
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+STAGES = ["03_filter_radio", "03b_dedup_radio", "04_match_radio", "05_organize", "06_split_chunks"]
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_DIR = "data/bench"
+RESULTS_FILE = "data/bench/results.json"
+BASELINE_FILE = "data/bench/baseline.json"
+
+# Stations at scale 1 when there is no real crawl to measure
+BASE_STATIONS = 50_000
+DEFAULT_SCALES = [1, 10]
+
+WALL_TOLERANCE = 0.25
+MIN_WALL_DELTA_S = 0.5  # smaller changes are noise
+RSS_TOLERANCE = 0.15
+
+# Cleared before every pass; data/ne is a link and stays
+CLEARED_DIRS = ["data/out", "data/cache", REPORT_DIR]
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def count_rows(path):
+    """CSV data rows (quoted fields never contain newlines in crawl output)."""
+    with open(path, "rb") as f:
+        return max(0, sum(block.count(b"\n") for block in iter(lambda: f.read(1024 * 1024), b"")) - 1)
+
+
+def prepare_workdir(stations, seed):
+    """Working directory for one scale, with its synthetic crawl. Returns its path."""
+    workdir = os.path.join(BENCH_DIR, str(stations))
+    crawl = os.path.join(workdir, "crawl", "out", "output.csv")
+    meta_path = crawl + ".json"
+    meta = {"stations": stations, "seed": seed}
+
+    current = None
+    if os.path.exists(crawl) and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            current = json.load(f)
+    if current != meta:
+        console.print(f"[cyan]Generating {stations:,} synthetic stations...[/cyan]")
+        start = time.perf_counter()
+        summary = generate(crawl, stations, seed)
+        console.print(
+            f"  {summary['bytes'] / 1024**2:,.1f} MB, mix from {summary['weights_from']} "
+            f"({time.perf_counter() - start:.1f}s)"
+        )
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    ne_link = os.path.join(workdir, "data", "ne")
+    if not os.path.islink(ne_link):
+        os.makedirs(os.path.dirname(ne_link), exist_ok=True)
+        os.symlink(os.path.abspath(os.path.dirname(NE_INPUT)), ne_link)
+    return workdir
+
+
+def run_stage(workdir, stage, run_id):
+    """Run one stage in `workdir`; returns its measurements, or None if it failed."""
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    log_path = os.path.join(workdir, "logs", f"{stage}.log")
+    env = {**os.environ, RUN_ID_ENV: run_id}
+
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        result = subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, f"{stage}.py")],
+            cwd=workdir,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        with open(log_path, encoding="utf-8", errors="replace") as f:
+            tail = f.read()[-2000:]
+        console.print(f"[bold red]✗ {stage} failed (exit {result.returncode}), see {log_path}[/bold red]")
+        console.out(tail.rstrip(), highlight=False)
+        return None
+
+    # Measured inside the stage: a child's peak RSS measured from here would
+    # include this process's memory, which the child starts out sharing
+    with open(os.path.join(workdir, REPORT_DIR, f"{stage}.json"), encoding="utf-8") as f:
+        report = json.load(f)
+    peaks = [p for p in (report["peak_rss_mb"], report.get("child_peak_rss_mb")) if p is not None]
+    return {
+        "wall_s": report["wall_s"],
+        "process_s": round(elapsed, 3),
+        "cpu_s": round(report["cpu_s"] + report["child_cpu_s"], 3),
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "rows_in": report["rows_in"],
+        "rows_out": report["rows_out"],
+        "steps": {s["name"]: s["wall_s"] for s in report["steps"]},
+    }
+
+
+def benchmark_scale(stations, seed, repeat, run_id):
+    """Fastest pass of every stage at one scale; a failed stage ends the scale."""
+    workdir = prepare_workdir(stations, seed)
+    best = {}
+    for attempt in range(repeat):
+        for path in CLEARED_DIRS:
+            shutil.rmtree(os.path.join(workdir, path), ignore_errors=True)
+        for stage in STAGES:
+            result = run_stage(workdir, stage, run_id)
+            if result is None:
+                return best, False
+            if stage not in best or result["wall_s"] < best[stage]["wall_s"]:
+                best[stage] = result
+            console.print(
+                f"  {stage}: {result['wall_s']:.1f}s, {result['peak_rss_mb']} MB"
+                + (f" (pass {attempt + 1}/{repeat})" if repeat > 1 else "")
+            )
+    return best, True
+
+
+def compare(current, baseline):
+    """'ok', 'faster', 'slower' or 'more memory' for one stage against its baseline."""
+    wall_delta = current["wall_s"] - baseline["wall_s"]
+    if wall_delta > max(WALL_TOLERANCE * baseline["wall_s"], MIN_WALL_DELTA_S):
+        return "slower"
+    if (
+        current["peak_rss_mb"] is not None
+        and baseline.get("peak_rss_mb")
+        and current["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + RSS_TOLERANCE)
+    ):
+        return "more memory"
+    if -wall_delta > max(WALL_TOLERANCE * baseline["wall_s"], MIN_WALL_DELTA_S):
+        return "faster"
+    return "ok"
+
+
+def change(current, previous):
+    if previous is None or current is None or not previous:
+        return "-"
+    return f"{100 * (current - previous) / previous:+.0f}%"
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the radio stages on synthetic crawls.")
+    parser.add_argument(
+        "--scales", type=float, nargs="+", default=DEFAULT_SCALES, help="Multiples of today's station count"
+    )
+    parser.add_argument("--stations", type=int, help="Station count at scale 1 (default: the real crawl's)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes per scale; the fastest counts")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    if not os.path.exists(NE_INPUT) and not os.path.exists(NE_INPUT.replace(".parquet", ".geojson")):
+        raise SystemExit(f"{NE_INPUT} not found; run 01_load_data.py first")
+
+    if args.stations:
+        base = args.stations
+    elif os.path.exists(SAMPLE_CRAWL):
+        base = count_rows(SAMPLE_CRAWL)
+    else:
+        base = BASE_STATIONS
+    sizes = sorted({max(1, round(base * scale)) for scale in args.scales})
+    run_id = "bench-" + time.strftime("%Y%m%dT%H%M%S")
+
+    console.print(
+        f"\n[bold cyan]Benchmarking {', '.join(STAGES)} at "
+        f"{', '.join(f'{n:,}' for n in sizes)} stations...[/bold cyan]"
+    )
+    runs = {}
+    failed = False
+    for stations in sizes:
+        console.print(f"\n[bold]{stations:,} stations[/bold]")
+        best, ok = benchmark_scale(stations, args.seed, args.repeat, run_id)
+        runs[str(stations)] = best
+        failed |= not ok
+
+    results = {
+        "run_id": run_id,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "runs": runs,
+    }
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(RESULTS_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    # ==============================================================================
+    # COMPARISON
+    # ==============================================================================
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["machine"] != results["machine"]:
+            console.print(
+                f"[yellow]Baseline was recorded on {baseline['machine']['platform']} "
+                f"({baseline['machine']['cpus']} CPUs); timings may not compare.[/yellow]"
+            )
+
+    table = Table(title="Radio Stage Benchmark" + (f" (baseline {baseline['created_at']})" if baseline else ""))
+    table.add_column("Stations", justify="right")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Wall", justify="right", style="green")
+    table.add_column("vs base", justify="right")
+    table.add_column("Stations/s", justify="right", style="green")
+    table.add_column("Peak RSS", justify="right", style="magenta")
+    table.add_column("vs base", justify="right")
+    table.add_column("Result", justify="right")
+
+    styles = {"ok": "green", "faster": "green", "slower": "red", "more memory": "red", "new": "dim"}
+    regressions = []
+    for stations, stages in runs.items():
+        for stage, result in stages.items():
+            previous = (baseline or {}).get("runs", {}).get(stations, {}).get(stage)
+            status = compare(result, previous) if previous else "new"
+            if status in ("slower", "more memory"):
+                regressions.append(f"{stage} at {int(stations):,} stations ({status})")
+            table.add_row(
+                f"{int(stations):,}",
+                stage,
+                f"{result['wall_s']:.2f}s",
+                change(result["wall_s"], previous and previous["wall_s"]),
+                f"{int(stations) / max(result['wall_s'], 1e-3):,.0f}",
+                f"{result['peak_rss_mb']:,.0f} MB" if result["peak_rss_mb"] is not None else "-",
+                change(result["peak_rss_mb"], previous and previous.get("peak_rss_mb")),
+                f"[{styles[status]}]{status}[/{styles[status]}]",
+            )
+    console.print(table)
+    console.print(f"Results saved to {RESULTS_FILE}")
+
+    if args.save_baseline:
+        if failed:
+            raise SystemExit("Not saving a baseline from a run with failed stages")
+        shutil.copyfile(RESULTS_FILE, BASELINE_FILE)
+        console.print(f"[bold green]✓ Baseline saved to {BASELINE_FILE}[/bold green]")
+    elif baseline is None:
+        console.print("[dim]No baseline yet; rerun with --save-baseline to record one.[/dim]")
+
+    if regressions:
+        console.print(f"\n[bold red]{len(regressions)} regression(s):[/bold red] {'; '.join(regressions)}")
+    if regressions or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,14 @@ USAGE:
 import json
 import os
 import re
+import sys
 
 import requests
 from bs4 import BeautifulSoup
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrument import instrument, rows, step
+
 # Note: Keeping the console/table logic for your reporting preference
 try:
     from rich.console import Console
@@ -26,7 +30,7 @@ except ImportError:
 # ==============================================================================
 # CONFIGURATION
 # ==============================================================================
-NE_INPUT = "data/ne/ne_110m_admin_0_countries.geojson"
+NE_INPUT = "data/ne/ne_110m_admin_0_countries.parquet"
 OUTPUT = "data/out/country_details.json"
 WPR_URL = "https://worldpopulationreview.com/country-rankings/languages-by-country"
 
@@ -48,6 +52,7 @@ def main():
 
     scraped_data = []
 
+    step("Scraping")
     try:
         response = requests.get(WPR_URL, headers=headers)
         response.raise_for_status()
@@ -124,63 +129,42 @@ def main():
         console.print(f"[red]Failed to scrape WPR:[/red] {e}")
         return
 
-    # 3. Matching with Natural Earth (GeoPandas)
+    # 3. Matching with Natural Earth (country_index.py)
+    step("Matching with Natural Earth", rows_in=len(scraped_data))
     # This section handles the ISO mapping. Note: France usually has ISO_A3 'FRA'.
     # If your GeoJSON shows '-99', it might be a property of that specific file version.
     try:
-        import geopandas as gpd
         import pandas as pd
-
-        if os.path.exists(NE_INPUT):
-            console.print(f"[bold blue]Loading Natural Earth data...[/bold blue]")
-            ne = gpd.read_file(NE_INPUT)
-
-            # Build lookup
-            lookup = {}
-            for idx, row in ne.iterrows():
-                # Add various name fields to lookup
-                names = [
-                    row.get("ADMIN"),
-                    row.get("NAME"),
-                    row.get("NAME_LONG"),
-                    row.get("BRK_NAME"),
-                ]
-                for name in names:
-                    if name:
-                        lookup[str(name).strip().lower()] = idx
+        from country_index import CountryIndex
+
+        if os.path.exists(NE_INPUT) or os.path.exists(NE_INPUT.replace(".parquet", ".geojson")):
+            console.print(f"[bold blue]Loading Natural Earth name index...[/bold blue]")
+            # Shared with 04_match_radio; cached by the NE file hash, so the
+            # layer itself is only read when it changed
+            index = CountryIndex.load(NE_INPUT)
+            positions = index.resolve_many(
+                pd.Series([item["country_clean"] for item in scraped_data], dtype=object)
+            )
 
             matched_data = []
-            for item in scraped_data:
-                key = item["country_clean"].lower()
-
-                # Manual fixes for common discrepancies
-                manual_map = {
-                    "united states": "united states of america",
-                    "dr congo": "democratic republic of the congo",
-                    "ivory coast": "côte d'ivoire",
-                    "czechia": "czech republic",
-                }
-                if key in manual_map:
-                    key = manual_map[key]
-
-                if key in lookup:
-                    ne_row = ne.iloc[lookup[key]]
-                    # Use ISO_A3, but fallback to ADM0_A3 if ISO is -99
-                    iso = str(ne_row.get("ISO_A3", "N/A"))
-                    if iso == "-99":
-                        iso = str(
-                            ne_row.get("ADM0_A3", "FRA" if key == "france" else "N/A")
-                        )
-
-                    matched_data.append(
-                        {
-                            "country": ne_row.get("ADMIN", item["country_clean"]),
-                            "iso_a3": iso,
-                            "official_languages": item["official_languages"],
-                            "minority_languages": item["minority_languages"],
-                            "regional_languages": item["regional_languages"],
-                        }
-                    )
+            for item, position in zip(scraped_data, positions):
+                if pd.isna(position):
+                    continue
+                ne_row = index.record(int(position))
+                # Use ISO_A3, but fallback to ADM0_A3 if ISO is -99
+                iso = str(ne_row.get("ISO_A3", "N/A"))
+                if iso == "-99":
+                    iso = str(ne_row.get("ADM0_A3") or "N/A")
+
+                matched_data.append(
+                    {
+                        "country": ne_row.get("ADMIN") or item["country_clean"],
+                        "iso_a3": iso,
+                        "official_languages": item["official_languages"],
+                        "minority_languages": item["minority_languages"],
+                        "regional_languages": item["regional_languages"],
+                    }
+                )
 
             final_output = matched_data
             console.print(f"[green]Matched {len(matched_data)} countries.[/green]")
@@ -195,6 +179,7 @@ def main():
         console.print("[yellow]Geopandas not found, saving raw scraped data.[/yellow]")
 
     # 4. Save to JSON
+    rows(rows_out=len(final_output))
     os.makedirs(os.path.dirname(OUTPUT), exist_ok=True)
     with open(OUTPUT, "w", encoding="utf-8") as f:
         json.dump(final_output, f, ensure_ascii=False, indent=2)
@@ -203,4 +188,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
@@ -1,19 +1,64 @@
 """
+Country Photo Fetcher
+
+Fetches a representative landscape photo for each country from the Pexels API.
+
+METHODOLOGY:
+- Countries are fetched concurrently by MAX_WORKERS threads
+- Every API request takes a token from a shared token bucket (REQUESTS_PER_HOUR,
+  bursts of up to BURST). The bucket follows the API's X-Ratelimit-Remaining /
+  X-Ratelimit-Reset headers, and a 429 pauses all workers until Retry-After
+  (or the reset time) before retrying; 5xx and network errors back off
+  exponentially
+- Search responses are cached in data/cache/pexels/ for CACHE_TTL_DAYS, so a
+  retry or rerun does not spend requests on searches already made. Cache keys
+  and progress records include PEXELS_SEARCH_URL, so a run against the stub
+  never answers or skips a run against the real API
+- Images download to a .part file that is renamed once complete, and their
+  SHA-256 is recorded in the progress file
+- The progress file is rewritten atomically after every country, so an
+  interrupted run resumes where it stopped: a country whose image exists with
+  the recorded checksum is skipped without any request
+- Images in IMAGE_DIR that no country references anymore are removed at the
+  end; a country whose fetch failed this run keeps its image
+
+INPUT:
+- data/out/country_details.json (from 01_scrape.py)
+- PEXELS_API_KEY environment variable
+
+OUTPUT:
+- data/out/country_details_with_pics.json (the input plus pexels_data and
+  local_image_path per country)
+- data/out/country-pics/{country}.jpg
+- data/cache/pexels_progress.json (resume state)
+
 USAGE:
     export PEXELS_API_KEY="your_key_here"
-    uv run scripts/country_details/02_get_pics.py
+    uv run scripts/country-details/02_get_pics.py
+
+    # against the local stub of the API
+    uv run scripts/country-details/pexels_stub.py &
+    PEXELS_API_KEY=stub PEXELS_SEARCH_URL=http://127.0.0.1:8710/v1/search \\
+        uv run scripts/country-details/02_get_pics.py
 """
 
+import email.utils
+import hashlib
 import json
 import os
 import re
-import shutil
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from rich.console import Console
 from rich.progress import Progress
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrument import instrument, rows, step
+
 console = Console()
 
 # ==============================================================================
@@ -22,29 +67,257 @@ console = Console()
 INPUT_JSON = "data/out/country_details.json"
 OUTPUT_JSON = "data/out/country_details_with_pics.json"
 IMAGE_DIR = "data/out/country-pics"  # Directory where images will be saved
-PEXELS_SEARCH_URL = "https://api.pexels.com/v1/search"
+PEXELS_SEARCH_URL = os.getenv("PEXELS_SEARCH_URL", "https://api.pexels.com/v1/search")
+
+CACHE_DIR = "data/cache/pexels"
+CACHE_TTL_DAYS = 30
+PROGRESS_FILE = "data/cache/pexels_progress.json"
+
+# Pexels allows 200 requests per hour by default
+REQUESTS_PER_HOUR = 200
+BURST = 20
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+MAX_BACKOFF_SECONDS = 60
 
 # Set to None to process all countries, or an integer to test a small sample
 SAMPLE_N = None
 
 
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
 def slugify(text):
     """Convert country name to a safe filename."""
     return re.sub(r"\W+", "_", text.lower()).strip("_")
 
 
-def download_image(url, save_path):
-    """Downloads an image from a URL and saves it to the specified path."""
+def search_params(country_name):
+    return {
+        "query": f"{country_name} famous scenic landscape",
+        "per_page": 1,
+        "orientation": "landscape",
+    }
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class BucketStopped(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `capacity`
+    banked. pause() blocks every caller until a point in time; after stop(),
+    waiting callers raise BucketStopped.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def acquire(self):
+        while True:
+            if self.stopped.is_set():
+                raise BucketStopped()
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            if self.stopped.wait(wait):
+                raise BucketStopped()
+
+    def stop(self):
+        self.stopped.set()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers):
+        """Never assume more tokens than the server says remain."""
+        remaining = headers.get("X-Ratelimit-Remaining")
+        if remaining is None or not remaining.isdigit():
+            return
+        with self.lock:
+            self.tokens = min(self.tokens, int(remaining))
+        if int(remaining) == 0:
+            self.pause(reset_delay(headers) or 60)
+
+
+def reset_delay(headers):
+    """Seconds until X-Ratelimit-Reset (a UNIX timestamp), if given."""
+    reset = headers.get("X-Ratelimit-Reset")
+    if reset and reset.isdigit():
+        return max(0.0, int(reset) - time.time())
+    return None
+
+
+def retry_after(headers):
+    """Seconds to wait from Retry-After (seconds or HTTP date), if given."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
     try:
-        response = requests.get(url, timeout=15, stream=True)
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def search(params, api_key, bucket):
+    """
+    Pexels search through the response cache and the token bucket.
+    Returns the decoded JSON response.
+    """
+    # The endpoint is part of the key, so stub responses never answer real runs
+    request = {"url": PEXELS_SEARCH_URL, "params": params}
+    key = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < CACHE_TTL_DAYS * 86400:
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            response = requests.get(
+                PEXELS_SEARCH_URL, headers={"Authorization": api_key}, params=params, timeout=10
+            )
+        except requests.RequestException:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(min(MAX_BACKOFF_SECONDS, 2**attempt))
+            continue
+
+        bucket.observe(response.headers)
+        if response.status_code == 429 and attempt < MAX_RETRIES:
+            wait = retry_after(response.headers) or reset_delay(response.headers) or 2**attempt
+            bucket.pause(wait)
+            continue
+        if response.status_code >= 500 and attempt < MAX_RETRIES:
+            time.sleep(min(MAX_BACKOFF_SECONDS, 2**attempt))
+            continue
         response.raise_for_status()
-        with open(save_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return True
-    except Exception as e:
-        console.print(f"\n[red]Error downloading {url}: {e}[/red]")
+        data = response.json()
+        write_json_atomic(cache_path, data)
+        return data
+
+
+def download_image(url, save_path):
+    """Download to a .part file, rename when complete; returns the SHA-256."""
+    tmp_path = save_path + ".part"
+    digest = hashlib.sha256()
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = requests.get(url, timeout=15, stream=True)
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        f.write(chunk)
+                        digest.update(chunk)
+                break
+            except requests.RequestException:
+                if attempt == MAX_RETRIES:
+                    raise
+                digest = hashlib.sha256()
+                time.sleep(min(MAX_BACKOFF_SECONDS, 2**attempt))
+        os.replace(tmp_path, save_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return digest.hexdigest()
+
+
+def fetch_country(entry, api_key, bucket):
+    """
+    Search and download one country's photo. Returns its progress record:
+    the search query and endpoint, the fields to add to the entry and the
+    image SHA-256.
+    """
+    country_name = entry.get("country")
+    filename = f"{slugify(country_name)}.jpg"
+    params = search_params(country_name)
+    data = search(params, api_key, bucket)
+    if not data.get("photos"):
+        fields = {"pexels_data": None, "local_image_path": None}
+        return {"query": params["query"], "endpoint": PEXELS_SEARCH_URL, "fields": fields, "sha256": None}
+
+    photo = data["photos"][0]
+    src = photo.get("src", {})
+    medium_url = src.get("medium")
+    sha256 = None
+    if medium_url:
+        sha256 = download_image(medium_url, os.path.join(IMAGE_DIR, filename))
+
+    fields = {
+        # This is the path we'll store in the JSON as requested
+        "local_image_path": f"country-pics/{filename}" if sha256 else None,
+        "pexels_data": {
+            "url": photo.get("url"),
+            "photographer": photo.get("photographer"),
+            "photographer_url": photo.get("photographer_url"),
+            "src": {
+                "large": src.get("large"),
+                "medium": medium_url,
+                "small": src.get("small"),
+            },
+            "alt": photo.get("alt"),
+        },
+    }
+    return {"query": params["query"], "endpoint": PEXELS_SEARCH_URL, "fields": fields, "sha256": sha256}
+
+
+def is_done(record, country_name):
+    """
+    A country is done if it was fetched from the current PEXELS_SEARCH_URL and
+    its recorded image is on disk with the recorded checksum.
+    """
+    if not record or record["query"] != search_params(country_name)["query"]:
+        return False
+    if record.get("endpoint") != PEXELS_SEARCH_URL:
         return False
+    path = record["fields"]["local_image_path"]
+    if path is None:
+        # Searched before and there was nothing to download: no photo, or a
+        # photo without a medium-size URL (a failed download raises instead)
+        return True
+    local_path = os.path.join(os.path.dirname(IMAGE_DIR), path)
+    return os.path.exists(local_path) and file_sha256(local_path) == record["sha256"]
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
 
 
 def main():
@@ -60,6 +333,7 @@ def main():
         return
 
     # 2. Load the data
+    step("Loading countries")
     if not os.path.exists(INPUT_JSON):
         console.print(
             f"[red]Error: Input file {INPUT_JSON} not found. Run the scraper first.[/red]"
@@ -75,114 +349,92 @@ def main():
         )
         countries = countries[:SAMPLE_N]
 
-    # 3. Setup output directories
-    # Ensure the parent directory for the JSON exists
+    # 3. Setup output directories and resume state
     os.makedirs(os.path.dirname(OUTPUT_JSON), exist_ok=True)
-
-    # Clean and recreate the image directory
-    if os.path.exists(IMAGE_DIR):
-        console.print(
-            f"[yellow]Cleaning existing image directory: {IMAGE_DIR}[/yellow]"
-        )
-        shutil.rmtree(IMAGE_DIR)
-
     os.makedirs(IMAGE_DIR, exist_ok=True)
+    os.makedirs(CACHE_DIR, exist_ok=True)
 
-    headers = {"Authorization": api_key}
-    updated_countries = []
+    progress_state = {}
+    if os.path.exists(PROGRESS_FILE):
+        with open(PROGRESS_FILE, encoding="utf-8") as f:
+            progress_state = json.load(f)
+    progress_lock = threading.Lock()
 
+    pending = [e for e in countries if not is_done(progress_state.get(e.get("country")), e.get("country"))]
     console.print(
-        f"[bold blue]Starting Pexels metadata retrieval and image downloads for {len(countries)} countries...[/bold blue]"
+        f"[bold blue]Fetching Pexels photos: {len(pending)} countries to fetch, "
+        f"{len(countries) - len(pending)} already done[/bold blue]"
     )
 
-    # 4. Process countries
-    with Progress() as progress:
-        task = progress.add_task("[cyan]Processing countries...", total=len(countries))
-
-        for entry in countries:
-            country_name = entry.get("country")
-            safe_name = slugify(country_name)
-            filename = f"{safe_name}.jpg"
-            local_save_path = os.path.join(IMAGE_DIR, filename)
-
-            # This is the path we'll store in the JSON as requested
-            json_image_path = f"country-pics/{filename}"
+    # 4. Fetch countries concurrently
+    step("Fetching photos", rows_in=len(pending))
+    bucket = TokenBucket(REQUESTS_PER_HOUR / 3600, BURST)
+    failed = []
+    with Progress() as progress, ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        task = progress.add_task("[cyan]Processing countries...", total=len(pending))
+        futures = {pool.submit(fetch_country, entry, api_key, bucket): entry for entry in pending}
 
+        def record_result(future):
+            country_name = futures[future].get("country")
             try:
-                # Search Pexels
-                params = {
-                    "query": f"{country_name} famous scenic landscape",
-                    "per_page": 1,
-                    "orientation": "landscape",
-                }
-
-                response = requests.get(
-                    PEXELS_SEARCH_URL, headers=headers, params=params, timeout=10
-                )
-
-                if response.status_code == 429:
-                    console.print("\n[yellow]Rate limit reached. Sleeping...[/yellow]")
-                    time.sleep(30)
-                    response = requests.get(
-                        PEXELS_SEARCH_URL, headers=headers, params=params, timeout=10
-                    )
-
-                response.raise_for_status()
-                data = response.json()
-
-                if data.get("photos") and len(data["photos"]) > 0:
-                    photo = data["photos"][0]
-                    src = photo.get("src", {})
-                    medium_url = src.get("medium")
-
-                    # Download the image
-                    if medium_url:
-                        success = download_image(medium_url, local_save_path)
-                        if success:
-                            entry["local_image_path"] = json_image_path
-                        else:
-                            entry["local_image_path"] = None
-                    else:
-                        entry["local_image_path"] = None
-
-                    # Store metadata
-                    entry["pexels_data"] = {
-                        "url": photo.get("url"),
-                        "photographer": photo.get("photographer"),
-                        "photographer_url": photo.get("photographer_url"),
-                        "src": {
-                            "large": src.get("large"),
-                            "medium": medium_url,
-                            "small": src.get("small"),
-                        },
-                        "alt": photo.get("alt"),
-                    }
-                else:
-                    entry["pexels_data"] = None
-                    entry["local_image_path"] = None
-                    console.print(
-                        f"\n[yellow]No image found for {country_name}[/yellow]"
-                    )
-
+                record = future.result()
+            except BucketStopped:
+                return
             except Exception as e:
-                console.print(
-                    f"\n[red]Failed to fetch data for {country_name}: {e}[/red]"
-                )
-                entry["pexels_data"] = None
-                entry["local_image_path"] = None
-
-            updated_countries.append(entry)
-            progress.update(task, advance=1)
-            time.sleep(0.5)  # Reduced delay slightly but kept for safety
-
-    # 5. Save updated JSON
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(updated_countries, f, ensure_ascii=False, indent=2)
-
-    console.print(f"\n[bold green]Success![/bold green]")
+                failed.append(country_name)
+                console.print(f"[red]Failed to fetch data for {country_name}: {e}[/red]")
+                return
+            with progress_lock:
+                progress_state[country_name] = record
+                write_json_atomic(PROGRESS_FILE, progress_state)
+            if record["fields"]["pexels_data"] is None:
+                console.print(f"[yellow]No image found for {country_name}[/yellow]")
+
+        try:
+            for future in as_completed(futures):
+                record_result(future)
+                progress.update(task, advance=1)
+        except KeyboardInterrupt:
+            # Stop waiting workers, drop queued countries and keep what finished
+            bucket.stop()
+            pool.shutdown(cancel_futures=True)
+            for future in futures:
+                if future.done() and not future.cancelled():
+                    record_result(future)
+            console.print("[yellow]Interrupted; rerun to resume.[/yellow]")
+            raise
+
+    # 5. Assemble the output in input order
+    step("Writing output")
+    updated_countries = []
+    for entry in countries:
+        record = progress_state.get(entry.get("country"))
+        fields = record["fields"] if record else {"pexels_data": None, "local_image_path": None}
+        updated_countries.append({**entry, **fields})
+    write_json_atomic(OUTPUT_JSON, updated_countries)
+    rows(rows_out=len(updated_countries))
+
+    # Remove images of countries that are no longer listed (not when sampling).
+    # Failed countries keep theirs, since they have no record to reference it yet
+    if SAMPLE_N is None:
+        referenced = {
+            os.path.basename(e["local_image_path"]) for e in updated_countries if e["local_image_path"]
+        }
+        referenced.update(f"{slugify(name)}.jpg" for name in failed)
+        for name in os.listdir(IMAGE_DIR):
+            if name not in referenced:
+                os.remove(os.path.join(IMAGE_DIR, name))
+
+    if failed:
+        console.print(
+            f"\n[bold yellow]{len(failed)} countries failed; rerun to retry them:[/bold yellow] {', '.join(failed)}"
+        )
+    else:
+        console.print("\n[bold green]Success![/bold green]")
     console.print(f"Images saved to: [white]{IMAGE_DIR}[/white]")
     console.print(f"Updated metadata saved to: [white]{OUTPUT_JSON}[/white]")
 
 
 if __name__ == "__main__":
-    main()
+    with instrument(__file__):
+        main()
@@ -0,0 +1,321 @@
+"""
+Country Photo Variants
+
+Builds resized AVIF and WebP copies of each country photo at several widths,
+plus a tiny inline placeholder, so the frontend can pick the smallest image
+that fills its slot and show something while it loads.
+
+METHODOLOGY:
+- Reads the photos listed in country_details_with_pics.json (local_image_path)
+- Each photo is decoded once per worker process and resized (Lanczos) to every
+  width in WIDTHS that is not larger than the photo itself; the photo's own
+  width is used when it is smaller than the largest requested width
+- Every size is encoded in each format in FORMATS; AVIF is skipped with a
+  warning if this Pillow build cannot write it
+- The placeholder is a PLACEHOLDER_WIDTH-pixel WebP, inlined as a data: URI
+  (a few hundred bytes, stretched and blurred by the client)
+- A photo is skipped when its SHA-256 and the settings match the cache and
+  every file recorded for it still exists, so only new or changed photos are
+  encoded
+- Work is spread over a process pool; encoding is CPU-bound
+- Files in VARIANT_OUTPUT that no photo references anymore are removed
+- The JSON is updated in place: each country gets an image_variants entry
+  (None when it has no photo)
+
+INPUT:
+- data/out/country_details_with_pics.json (from 02_get_pics.py)
+- data/out/country-pics/{country}.jpg
+
+OUTPUT:
+- data/out/country_details_with_pics.json (rewritten with image_variants)
+- data/out/country-pics-resized/{country}-{width}.{avif,webp}
+- data/cache/image_variants.json (source checksums, for skipping unchanged photos)
+
+USAGE:
+    uv run scripts/country-details/04_image_variants.py
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image, ImageOps, features
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrument import instrument, rows, step
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+INPUT_JSON = "data/out/country_details_with_pics.json"
+OUTPUT_JSON = "data/out/country_details_with_pics.json"  # updated in place
+IMAGE_INPUT = "data/out/country-pics"
+VARIANT_OUTPUT = "data/out/country-pics-resized"
+CACHE_FILE = "data/cache/image_variants.json"
+
+# The photo is shown at most 320 CSS px wide (200 px when small); 640 covers 2x screens
+WIDTHS = (160, 320, 480, 640)
+
+# Format -> Pillow save options. Listed smallest-first, which is also the
+# order the client should prefer them in.
+FORMATS = {
+    "avif": {"quality": 50, "speed": 6},
+    "webp": {"quality": 75, "method": 6},
+}
+
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_OPTIONS = {"quality": 30, "method": 6}
+
+MAX_WORKERS = None  # None = one per CPU
+
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def target_widths(source_width):
+    """WIDTHS that do not upscale, plus the source width if it is smaller than the largest."""
+    widths = [w for w in WIDTHS if w < source_width]
+    widths.append(min(source_width, max(WIDTHS)))
+    return sorted(set(widths))
+
+
+def resized(image, width):
+    height = max(1, round(image.height * width / image.width))
+    if (width, height) == image.size:
+        return image
+    return image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def build_variants(source_path, stem, formats):
+    """
+    Encode every size and format of one photo. Runs in a worker process.
+    Returns its image_variants entry.
+    """
+    with Image.open(source_path) as opened:
+        image = ImageOps.exif_transpose(opened).convert("RGB")
+
+    sources = {fmt: [] for fmt in formats}
+    for width in target_widths(image.width):
+        scaled = resized(image, width)
+        for fmt in formats:
+            path = os.path.join(VARIANT_OUTPUT, f"{stem}-{width}.{fmt}")
+            tmp_path = path + ".tmp"
+            scaled.save(tmp_path, format=fmt.upper(), **FORMATS[fmt])
+            os.replace(tmp_path, path)
+            sources[fmt].append(
+                {"path": f"{os.path.basename(VARIANT_OUTPUT)}/{os.path.basename(path)}", "width": width}
+            )
+
+    buffer = io.BytesIO()
+    resized(image, PLACEHOLDER_WIDTH).save(buffer, format="WEBP", **PLACEHOLDER_OPTIONS)
+    placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    return {
+        "width": image.width,
+        "height": image.height,
+        "placeholder": placeholder,
+        "sources": sources,
+    }
+
+
+def variant_paths(variants):
+    """Local paths of the files an image_variants entry refers to."""
+    out_dir = os.path.dirname(VARIANT_OUTPUT)
+    return [
+        os.path.join(out_dir, source["path"])
+        for sources in variants["sources"].values()
+        for source in sources
+    ]
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    if not os.path.exists(INPUT_JSON):
+        console.print(
+            f"[red]Error: Input file {INPUT_JSON} not found. Run 02_get_pics.py first.[/red]"
+        )
+        return
+
+    with open(INPUT_JSON, encoding="utf-8") as f:
+        countries = json.load(f)
+
+    formats = [fmt for fmt in FORMATS if features.check(fmt)]
+    for fmt in FORMATS.keys() - set(formats):
+        console.print(f"[yellow]Warning: this Pillow build cannot write {fmt}; skipping it.[/yellow]")
+
+    os.makedirs(VARIANT_OUTPUT, exist_ok=True)
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    cache = {}
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE, encoding="utf-8") as f:
+            cache = json.load(f)
+    # Changing any of these re-encodes every photo
+    settings = json.dumps(
+        {
+            "widths": WIDTHS,
+            "formats": {fmt: FORMATS[fmt] for fmt in formats},
+            "placeholder": [PLACEHOLDER_WIDTH, PLACEHOLDER_OPTIONS],
+        },
+        sort_keys=True,
+    )
+
+    # 1. Work out which photos changed
+    step("Checking photos", rows_in=len(countries))
+    console.print("[bold blue]Checking country photos...[/bold blue]")
+    variants_by_image = {}
+    pending = {}
+    missing = []
+    for entry in countries:
+        image_path = entry.get("local_image_path")
+        if not image_path or image_path in variants_by_image or image_path in pending:
+            continue
+        source_path = os.path.join(os.path.dirname(IMAGE_INPUT), image_path)
+        if not os.path.exists(source_path):
+            missing.append(image_path)
+            continue
+        sha256 = file_sha256(source_path)
+        cached = cache.get(image_path)
+        if (
+            cached
+            and cached["sha256"] == sha256
+            and cached["settings"] == settings
+            and all(os.path.exists(p) for p in variant_paths(cached["variants"]))
+        ):
+            variants_by_image[image_path] = cached["variants"]
+        else:
+            pending[image_path] = (source_path, sha256)
+
+    console.print(
+        f"  {len(pending)} photos to encode, {len(variants_by_image)} unchanged"
+        + (f", [yellow]{len(missing)} missing[/yellow]" if missing else "")
+    )
+
+    # 2. Encode the changed ones in parallel
+    step("Encoding variants", rows_in=len(pending))
+    failed = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = {
+                pool.submit(
+                    build_variants, source_path, os.path.splitext(os.path.basename(image_path))[0], formats
+                ): image_path
+                for image_path, (source_path, _) in pending.items()
+            }
+            for future in as_completed(futures):
+                image_path = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as e:
+                    failed.append(image_path)
+                    console.print(f"[red]Failed to encode {image_path}: {e}[/red]")
+                    continue
+                variants_by_image[image_path] = variants
+                cache[image_path] = {
+                    "sha256": pending[image_path][1],
+                    "settings": settings,
+                    "variants": variants,
+                }
+
+    # 3. Update the JSON in place and drop files nothing refers to
+    step("Writing output")
+    for entry in countries:
+        entry["image_variants"] = variants_by_image.get(entry.get("local_image_path"))
+    write_json_atomic(OUTPUT_JSON, countries)
+    rows(rows_out=len(countries))
+
+    cache = {path: cache[path] for path in variants_by_image}
+    write_json_atomic(CACHE_FILE, cache)
+
+    referenced = {p for v in variants_by_image.values() for p in variant_paths(v)}
+    removed = 0
+    for name in os.listdir(VARIANT_OUTPUT):
+        path = os.path.join(VARIANT_OUTPUT, name)
+        if path not in referenced:
+            os.remove(path)
+            removed += 1
+
+    # ==============================================================================
+    # VALIDATION
+    # ==============================================================================
+
+    step("Validation")
+    source_bytes = sum(
+        os.path.getsize(os.path.join(os.path.dirname(IMAGE_INPUT), path)) for path in variants_by_image
+    )
+    table = Table(title="Photo Variants")
+    table.add_column("Format", style="cyan")
+    table.add_column("Width", justify="right")
+    table.add_column("Files", justify="right")
+    table.add_column("Avg KB", justify="right", style="green")
+    table.add_column("Total KB", justify="right", style="green")
+
+    totals = {}
+    for variants in variants_by_image.values():
+        for fmt, sources in variants["sources"].items():
+            for source in sources:
+                # Photos narrower than the largest width get one at their own width
+                width = str(source["width"]) if source["width"] in WIDTHS else "native"
+                size = os.path.getsize(os.path.join(os.path.dirname(VARIANT_OUTPUT), source["path"]))
+                totals.setdefault((fmt, width), []).append(size)
+    for fmt in formats:
+        for width in [str(w) for w in WIDTHS] + ["native"]:
+            sizes = totals.get((fmt, width))
+            if sizes:
+                table.add_row(
+                    fmt, width, str(len(sizes)), f"{sum(sizes) / len(sizes) / 1024:.1f}", f"{sum(sizes) / 1024:,.0f}"
+                )
+    table.add_row("source jpg", "", str(len(variants_by_image)), "", f"{source_bytes / 1024:,.0f}")
+    console.print(table)
+
+    placeholders = [len(v["placeholder"]) for v in variants_by_image.values()]
+    if placeholders:
+        console.print(
+            f"Placeholders: {len(placeholders)}, {sum(placeholders) / len(placeholders):.0f} bytes on average "
+            f"({sum(placeholders) / 1024:.1f} KB added to {os.path.basename(OUTPUT_JSON)})"
+        )
+    if removed:
+        console.print(f"Removed {removed} stale files from {VARIANT_OUTPUT}")
+
+    problems = missing + failed
+    if problems:
+        console.print(
+            f"\n[bold yellow]{len(problems)} photos have no variants:[/bold yellow] {', '.join(problems)}"
+        )
+    else:
+        console.print("\n[bold green]Success![/bold green]")
+    console.print(f"Variants saved to: [white]{VARIANT_OUTPUT}[/white]")
+    console.print(f"Updated metadata saved to: [white]{OUTPUT_JSON}[/white]")
+
+
+if __name__ == "__main__":
+    with instrument(__file__):
+        main()
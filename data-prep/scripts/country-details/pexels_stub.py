@@ -0,0 +1,111 @@
+"""
+Local Pexels API Stub
+
+Stands in for api.pexels.com so 02_get_pics.py can be run without a key or
+network access.
+
+ROUTES:
+- /v1/search?query=...   one fake photo per query (none if the query contains
+                         "Atlantis"), with X-Ratelimit-* headers. Every
+                         --limit-every-th request answers 429 with Retry-After.
+                         Requests without an Authorization header get 401.
+- /img/{id}.jpg          deterministic image bytes for a photo id
+
+USAGE:
+    uv run scripts/country-details/pexels_stub.py
+    uv run scripts/country-details/pexels_stub.py --port 8710 --limit-every 5 --retry-after 2
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def make_handler(limit_every, retry_after, quota):
+    lock = threading.Lock()
+    state = {"requests": 0, "remaining": quota}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, status, body, content_type="application/json", headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.startswith("/img/"):
+                photo_id = url.path.rsplit("/", 1)[1].removesuffix(".jpg")
+                body = b"\xff\xd8\xff\xe0" + hashlib.sha256(photo_id.encode()).digest() * 64
+                self.send(200, body, "image/jpeg")
+                return
+            if url.path != "/v1/search":
+                self.send(404, b"{}")
+                return
+            if not self.headers.get("Authorization"):
+                self.send(401, b'{"error": "missing key"}')
+                return
+
+            with lock:
+                state["requests"] += 1
+                limited = limit_every and state["requests"] % limit_every == 0
+                if not limited:
+                    state["remaining"] = max(0, state["remaining"] - 1)
+                remaining = state["remaining"]
+            rate_headers = [
+                ("X-Ratelimit-Limit", str(quota)),
+                ("X-Ratelimit-Remaining", str(remaining)),
+                ("X-Ratelimit-Reset", str(int(time.time()) + 3600)),
+            ]
+            if limited:
+                self.send(429, b'{"error": "rate limited"}', headers=[("Retry-After", str(retry_after))])
+                return
+
+            query = parse_qs(url.query).get("query", [""])[0]
+            photos = []
+            if "Atlantis" not in query:
+                photo_id = int(hashlib.sha256(query.encode()).hexdigest()[:8], 16)
+                base = f"http://{self.headers.get('Host')}/img/{photo_id}"
+                photos.append(
+                    {
+                        "id": photo_id,
+                        "url": f"https://www.pexels.com/photo/{photo_id}/",
+                        "photographer": "Stub Photographer",
+                        "photographer_url": "https://www.pexels.com/@stub",
+                        "src": {
+                            "large": f"{base}.jpg?large",
+                            "medium": f"{base}.jpg",
+                            "small": f"{base}.jpg?small",
+                        },
+                        "alt": query,
+                    }
+                )
+            body = json.dumps({"page": 1, "per_page": 1, "photos": photos}).encode("utf-8")
+            self.send(200, body, headers=rate_headers)
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Pexels API")
+    parser.add_argument("--port", type=int, default=8710)
+    parser.add_argument("--limit-every", type=int, default=0, help="429 every N-th search (0 = never)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--quota", type=int, default=200, help="X-Ratelimit-Limit reported")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(args.limit_every, args.retry_after, args.quota)
+    )
+    print(f"Pexels stub on http://127.0.0.1:{args.port}/v1/search")
+    server.serve_forever()
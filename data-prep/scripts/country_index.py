@@ -0,0 +1,133 @@
+"""
+Natural Earth Country Name Index
+
+Shared exact-name lookup from country names to Natural Earth rows, used by
+04_match_radio and country-details/01_scrape so both resolve names the same way.
+
+METHODOLOGY:
+- Keys are names lowercased, trimmed and without a leading "the"
+- Every row's ADMIN is indexed first, then each NAME* column in file order;
+  the first row to claim a key keeps it, so ADMIN always wins
+- COUNTRY_NAME_OVERRIDES maps spellings no column carries onto an indexed key;
+  an override is only used when its target is in the index
+- Lookups are batched: each distinct name is resolved once and the result is
+  mapped back over the whole Series
+
+The index, plus RECORD_COLUMNS of every row, is stored as JSON in CACHE_DIR,
+keyed by the SHA-256 of the Natural Earth file, so later runs load it instead
+of reading the layer. A changed file (or INDEX_VERSION) rebuilds it.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from ne_io import existing_path, read_attributes
+
+CACHE_DIR = "data/cache"
+INDEX_VERSION = 1
+
+# Attributes kept per row, so callers that only need these never read the layer
+RECORD_COLUMNS = ["ADMIN", "NAME", "ISO_A3", "ADM0_A3", "ISO_A2_EH", "CONTINENT"]
+
+# Applied after normalize(); keys and values are normalized names
+COUNTRY_NAME_OVERRIDES = {
+    "united kingdom of great britain and northern ireland": "united kingdom",
+    "islamic republic of iran": "iran",
+    "united states": "united states of america",
+    "dr congo": "democratic republic of the congo",
+    "ivory coast": "côte d'ivoire",
+    "czechia": "czech republic",
+}
+
+
+def normalize(name):
+    return re.sub(r"^the\s+", "", str(name).strip().lower())
+
+
+def name_columns(columns):
+    """ADMIN followed by every NAME* column, in file order."""
+    return ["ADMIN"] + [c for c in columns if "NAME" in c.upper() and c != "ADMIN"]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CountryIndex:
+    """
+    Normalized name -> Natural Earth row position (0-based, in file order),
+    with a few attributes of every row.
+    """
+
+    def __init__(self, names, records):
+        self.names = names
+        self.records = records
+
+    @classmethod
+    def build(cls, ne):
+        """Index a Natural Earth attribute DataFrame."""
+        names = {}
+        for column in name_columns(ne.columns):
+            if column not in ne.columns:
+                continue
+            for position, value in enumerate(ne[column]):
+                if not isinstance(value, str):
+                    continue
+                names.setdefault(normalize(value), position)
+        kept = ne[[c for c in RECORD_COLUMNS if c in ne.columns]]
+        records = kept.astype(object).where(kept.notna(), None).to_dict(orient="records")
+        return cls(names, records)
+
+    @classmethod
+    def load(cls, ne_path, cache_dir=CACHE_DIR):
+        """
+        The index for the Natural Earth file at `ne_path`, from the cache when
+        its hash matches, otherwise built and cached.
+        """
+        sha256 = file_sha256(existing_path(ne_path))
+        stem = os.path.splitext(os.path.basename(ne_path))[0]
+        cache_path = os.path.join(cache_dir, f"country_index_{stem}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("sha256") == sha256 and data.get("version") == INDEX_VERSION:
+                return cls(data["names"], data["records"])
+
+        index = cls.build(read_attributes(ne_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": INDEX_VERSION, "sha256": sha256, "names": index.names, "records": index.records},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, cache_path)
+        return index
+
+    def resolve(self, name):
+        """Row position for one name, or None."""
+        key = normalize(name)
+        override = COUNTRY_NAME_OVERRIDES.get(key)
+        if override in self.names:
+            return self.names[override]
+        return self.names.get(key)
+
+    def resolve_many(self, names):
+        """Row positions for a Series of names (float, NaN where unmatched)."""
+        distinct = names.dropna().unique()
+        positions = {name: self.resolve(name) for name in distinct}
+        return names.map(positions).astype(float)
+
+    def record(self, position):
+        return self.records[position]
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,56 @@
+"""
+Point-in-Polygon Country Lookup
+
+Assigns coordinates to countries with one vectorized query over an STRtree of
+Natural Earth polygons.
+
+METHODOLOGY:
+- MultiPolygons are split into their parts, so a country's far-flung islands
+  don't give it a world-sized bounding box.
+- Parts are prepared (shapely.prepare) and indexed in a shapely STRtree.
+- All points are queried at once: the tree returns every (point, part) pair
+  whose bounding boxes intersect, then shapely.contains_xy tests those pairs
+  in one vectorized call against the prepared parts.
+- A point inside several polygons (shared borders, overlapping claims) takes
+  the first country in input order. Points outside every polygon, or with
+  missing coordinates, get None.
+"""
+
+import numpy as np
+import shapely
+
+
+class CountryLocator:
+    """STRtree over country polygons; `labels[i]` names `geometries[i]`."""
+
+    def __init__(self, geometries, labels):
+        geometries = np.asarray(geometries, dtype=object)
+        self.labels = np.asarray(labels, dtype=object)
+        self.parts, self.owner = shapely.get_parts(geometries, return_index=True)
+        shapely.prepare(self.parts)
+        self.tree = shapely.STRtree(self.parts)
+
+    def locate(self, lat, lon):
+        """Country label for each (lat, lon) pair, as an object array (None = no country)."""
+        lat = np.asarray(lat, dtype="float64")
+        lon = np.asarray(lon, dtype="float64")
+        result = np.full(len(lat), None, dtype=object)
+
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        if len(valid) == 0:
+            return result
+
+        points = shapely.points(lon[valid], lat[valid])
+        point_pos, part_pos = self.tree.query(points)
+        inside = shapely.contains_xy(
+            self.parts[part_pos], lon[valid][point_pos], lat[valid][point_pos]
+        )
+        point_pos, owner = point_pos[inside], self.owner[part_pos[inside]]
+
+        # First country (lowest input index) per point
+        order = np.lexsort((owner, point_pos))
+        point_pos, owner = point_pos[order], owner[order]
+        first = np.ones(len(point_pos), dtype=bool)
+        first[1:] = point_pos[1:] != point_pos[:-1]
+        result[valid[point_pos[first]]] = self.labels[owner[first]]
+        return result
@@ -0,0 +1,275 @@
+"""
+Stage Instrumentation
+
+Records how long each data-prep stage takes and how much memory it uses,
+overall and per named sub-step, and writes it as a JSON report.
+
+METHODOLOGY:
+- A stage wraps its main() in instrument(__file__); inside, step("...") marks
+  the start of each sub-step and ends the previous one, so steps follow the
+  stage's existing console headings without re-indenting its code
+- Each step records wall time (perf_counter), CPU time of the process and of
+  child processes it waited for (os.times), current and peak RSS, and the
+  rows it read and wrote when the stage reports them with rows()
+- Peak RSS is the process high-water mark (VmHWM, or getrusage without
+  /proc), so a step's value is the peak reached by the time it ended; the
+  step that raised it is the one where it grows. The stage total also has
+  the largest child process's peak (process pools)
+- With DATA_PREP_TRACEMALLOC=N, Python allocations are traced: every step
+  records its own allocation peak and the N source lines whose allocations
+  grew most during it. Tracing slows a stage down several times
+- With DATA_PREP_PROFILE=1, the whole stage runs under cProfile and the stats
+  are dumped next to the report (open with `python -m pstats` or snakeviz)
+- step() and rows() do nothing when no stage is being instrumented, so the
+  stage functions can still be imported and called on their own
+
+OUTPUT:
+- data/reports/{stage}.json       the latest run of the stage
+- data/reports/history.jsonl      one line per run, for tracking growth over time
+- data/reports/{stage}.prof       cProfile stats (DATA_PREP_PROFILE only)
+
+USAGE (in a stage):
+    from instrument import instrument, rows, step
+
+    def main():
+        step("Loading datasets")
+        radio = read_stations(RADIO_INPUT)
+        step("Matching names", rows_in=len(radio))
+        ...
+        rows(rows_out=len(matched))
+
+    if __name__ == "__main__":
+        with instrument(__file__):
+            main()
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_DIR = "data/reports"
+HISTORY_FILE = "data/reports/history.jsonl"
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TRACEMALLOC_ENV = "DATA_PREP_TRACEMALLOC"
+PROFILE_ENV = "DATA_PREP_PROFILE"
+RUN_ID_ENV = "DATA_PREP_RUN_ID"  # set by pipeline.py so one run's reports can be grouped
+
+_active = None
+
+
+# ==============================================================================
+# MEASUREMENTS
+# ==============================================================================
+
+
+def peak_rss_mb(children=False):
+    """Peak RSS of this process, or of its largest waited-for child process."""
+    if not children:
+        # getrusage keeps the high-water mark from before exec, i.e. the
+        # memory of whatever process started this one; VmHWM does not
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) or None
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024**2, 1)
+
+
+def cpu_times():
+    """(own CPU seconds, CPU seconds of waited-for child processes)."""
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+def stage_name(script_path):
+    """Stage name as pipeline.py knows it, e.g. "05_organize" or "country-details/02_get_pics"."""
+    relative = os.path.relpath(os.path.abspath(script_path), SCRIPTS_DIR)
+    return os.path.splitext(relative)[0].replace(os.sep, "/")
+
+
+# ==============================================================================
+# REPORT
+# ==============================================================================
+
+
+class StageReport:
+    def __init__(self, stage, top_allocators=0):
+        self.stage = stage
+        self.top_allocators = top_allocators
+        self.steps = []
+        self.current = None
+        self._snapshot = None
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.start_wall = time.perf_counter()
+        self.start_cpu = cpu_times()
+
+    def step(self, name, rows_in=None):
+        """End the current step and start `name`."""
+        self.end_step()
+        if self.top_allocators:
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        self.current = {
+            "name": name,
+            "rows_in": rows_in,
+            "rows_out": None,
+            "_wall": time.perf_counter(),
+            "_cpu": cpu_times(),
+        }
+
+    def rows(self, rows_in=None, rows_out=None):
+        if self.current is None:
+            self.step("main")
+        if rows_in is not None:
+            self.current["rows_in"] = rows_in
+        if rows_out is not None:
+            self.current["rows_out"] = rows_out
+
+    def end_step(self):
+        step = self.current
+        if step is None:
+            return
+        self.current = None
+        own, children = cpu_times()
+        record = {
+            "name": step["name"],
+            "wall_s": round(time.perf_counter() - step["_wall"], 4),
+            "cpu_s": round(own - step["_cpu"][0], 4),
+            "child_cpu_s": round(children - step["_cpu"][1], 4),
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "rows_in": step["rows_in"],
+            "rows_out": step["rows_out"],
+        }
+        if self.top_allocators:
+            snapshot = tracemalloc.take_snapshot()
+            growth = snapshot.compare_to(self._snapshot, "lineno")[: self.top_allocators]
+            record["tracemalloc"] = {
+                "peak_mb": round(tracemalloc.get_traced_memory()[1] / 1024**2, 2),
+                "top": [
+                    {
+                        "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        "size_diff_kb": round(stat.size_diff / 1024, 1),
+                        "size_kb": round(stat.size / 1024, 1),
+                        "count_diff": stat.count_diff,
+                    }
+                    for stat in growth
+                ],
+            }
+            self._snapshot = None
+        self.steps.append(record)
+
+    def to_dict(self, status):
+        own, children = cpu_times()
+        with_rows_in = [s["rows_in"] for s in self.steps if s["rows_in"] is not None]
+        with_rows_out = [s["rows_out"] for s in self.steps if s["rows_out"] is not None]
+        return {
+            "stage": self.stage,
+            "run_id": os.environ.get(RUN_ID_ENV),
+            "started_at": self.started_at,
+            "status": status,
+            "wall_s": round(time.perf_counter() - self.start_wall, 4),
+            "cpu_s": round(own - self.start_cpu[0], 4),
+            "child_cpu_s": round(children - self.start_cpu[1], 4),
+            "peak_rss_mb": peak_rss_mb(),
+            # Process pools; workers start as copies of the stage process
+            "child_peak_rss_mb": peak_rss_mb(children=True),
+            # The first step's input and the last step's output
+            "rows_in": with_rows_in[0] if with_rows_in else None,
+            "rows_out": with_rows_out[-1] if with_rows_out else None,
+            "tracemalloc": bool(self.top_allocators),
+            "python": sys.version.split()[0],
+            "steps": self.steps,
+        }
+
+
+def step(name, rows_in=None):
+    """Start sub-step `name` of the instrumented stage (no-op outside one)."""
+    if _active is not None:
+        _active.step(name, rows_in)
+
+
+def rows(rows_in=None, rows_out=None):
+    """Record rows read / written by the current sub-step (no-op outside a stage)."""
+    if _active is not None:
+        _active.rows(rows_in, rows_out)
+
+
+@contextmanager
+def instrument(script_path):
+    """Instrument a stage run and write its report, whether it succeeds or not."""
+    global _active
+    stage = stage_name(script_path)
+    top_allocators = int(os.environ.get(TRACEMALLOC_ENV) or 0)
+    profile = os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+    if top_allocators:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if profile else None
+    report = _active = StageReport(stage, top_allocators)
+    if profiler:
+        profiler.enable()
+
+    status = "ok"
+    try:
+        yield report
+    except KeyboardInterrupt:
+        status = "interrupted"
+        raise
+    except SystemExit as e:
+        status = "ok" if e.code in (None, 0) else "error"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        report.end_step()
+        _active = None
+        data = report.to_dict(status)
+        if top_allocators:
+            tracemalloc.stop()
+
+        report_path = os.path.join(REPORT_DIR, f"{stage}.json")
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        tmp_path = report_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, report_path)
+        # One short line per run; appends of a single line do not interleave
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps({k: v for k, v in data.items() if k != "steps"}) + "\n")
+        if profiler:
+            profiler.dump_stats(os.path.join(REPORT_DIR, f"{stage}.prof"))
+
+        print(
+            f"[{stage}] {data['wall_s']:.1f}s wall, {data['cpu_s']:.1f}s CPU, "
+            f"peak RSS {data['peak_rss_mb']} MB -> {report_path}",
+            file=sys.stderr,
+        )
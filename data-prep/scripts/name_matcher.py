@@ -0,0 +1,153 @@
+"""
+Fuzzy Country-Name Matcher
+
+Resolves free-text country names (as found in the radio crawl) to candidate
+records by character trigram similarity.
+
+METHODOLOGY:
+- Names are normalized: accents stripped, lowercased, punctuation removed,
+  a leading "the" dropped, whitespace collapsed.
+- Every candidate name is split into padded trigrams ("  c", " ca", "can", ...)
+  and added to an inverted index {trigram: [candidate ids]}.
+- A query only scores candidates that share at least one trigram with it,
+  found through the index, so its cost depends on how common its trigrams are,
+  not on the total number of candidates.
+- Candidates are scored by the Dice coefficient of their trigram sets,
+  2 * |shared| / (|query| + |candidate|), and each target keeps its best score.
+- A match is accepted when the best score reaches min_score and beats the best
+  different target by at least min_margin (so "Congo" is not forced onto
+  either Congo).
+
+Resolved names can be cached in a JSON file, keyed by a fingerprint of the
+candidate set and settings; a changed candidate set discards the cache.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+
+HIGH_CONFIDENCE = 0.9
+
+
+def normalize(name):
+    """Lowercase, accent- and punctuation-free form of a name."""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"^the\s+", "", text)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def confidence_label(score):
+    return "high" if score >= HIGH_CONFIDENCE else "medium"
+
+
+class TrigramMatcher:
+    """
+    Inverted trigram index over (name, target) pairs. Several names may point
+    to the same target (e.g. every NAME* column of one country).
+    """
+
+    def __init__(self, candidates, min_score=0.8, min_margin=0.05):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.names = []
+        self.targets = []
+        self.gram_counts = []
+        self.index = defaultdict(list)
+
+        seen = set()
+        for name, target in candidates:
+            key = normalize(name)
+            if not key or (key, target) in seen:
+                continue
+            seen.add((key, target))
+            grams = trigrams(key)
+            cid = len(self.names)
+            self.names.append(key)
+            self.targets.append(target)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.index[gram].append(cid)
+
+    def fingerprint(self):
+        """Identifies the candidate set and settings, for cache invalidation."""
+        digest = hashlib.sha256()
+        for name, target in sorted(zip(self.names, map(str, self.targets))):
+            digest.update(f"{name}\t{target}\n".encode("utf-8"))
+        digest.update(f"{self.min_score}:{self.min_margin}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def candidates(self, name, k=5):
+        """Top-k (target, candidate name, score), one entry per target."""
+        grams = trigrams(normalize(name))
+        shared = defaultdict(int)
+        for gram in grams:
+            for cid in self.index.get(gram, ()):
+                shared[cid] += 1
+
+        best = {}
+        for cid, count in shared.items():
+            score = 2 * count / (len(grams) + self.gram_counts[cid])
+            target = self.targets[cid]
+            if target not in best or score > best[target][1]:
+                best[target] = (self.names[cid], score)
+
+        top = heapq.nlargest(k, best.items(), key=lambda item: (item[1][1], item[1][0]))
+        return [(target, cand, score) for target, (cand, score) in top]
+
+    def match(self, name):
+        """
+        Best match for `name` as a dict with target, candidate, score, margin
+        and confidence ("high", "medium", or "low" when rejected).
+        """
+        top = self.candidates(name, k=2)
+        if not top:
+            return {"target": None, "candidate": None, "score": 0.0, "margin": 0.0, "confidence": "low"}
+
+        target, candidate, score = top[0]
+        margin = score - (top[1][2] if len(top) > 1 else 0.0)
+        accepted = score >= self.min_score and margin >= self.min_margin
+        return {
+            "target": target if accepted else None,
+            "candidate": candidate,
+            "score": round(score, 4),
+            "margin": round(margin, 4),
+            "confidence": confidence_label(score) if accepted else "low",
+        }
+
+    def resolve(self, names, cache_path=None):
+        """
+        Match every distinct name, reusing and updating the cache at
+        `cache_path` when given. Returns {name: match dict}.
+        """
+        fingerprint = self.fingerprint()
+        cached = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("fingerprint") == fingerprint:
+                cached = data["matches"]
+
+        results = {}
+        for name in dict.fromkeys(names):
+            if name not in cached:
+                cached[name] = self.match(name)
+            results[name] = cached[name]
+
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "matches": cached}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, cache_path)
+        return results
@@ -0,0 +1,74 @@
+"""
+Natural Earth Layer I/O
+
+Shared reader/writer for the Natural Earth layers in data/ne.
+
+01_load_data stores every layer as the downloaded GeoJSON plus faster copies,
+and the consumer stages read whichever format their path names:
+- .parquet -> GeoParquet; columns are pruned on read, so attribute-only
+  readers never decode geometry
+- .fgb     -> FlatGeobuf, with a packed R-tree spatial index. Features are
+  stored in Hilbert order, not input order, so stages whose output depends
+  on feature order should read .parquet
+- .geojson -> the original download
+
+If the requested file is missing but the .geojson it was converted from
+exists (e.g. data/ne predates the conversion), that is read instead.
+"""
+
+import os
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+
+LAYER_EXTENSIONS = {"parquet": ".parquet", "fgb": ".fgb"}
+
+
+def existing_path(path):
+    """`path`, or the .geojson it was converted from if only that exists."""
+    if os.path.exists(path):
+        return path
+    fallback = os.path.splitext(path)[0] + ".geojson"
+    if os.path.exists(fallback):
+        return fallback
+    raise FileNotFoundError(
+        f"Natural Earth layer {path} not found; run scripts/01_load_data.py, which "
+        f"downloads every scale a stage declares in its INPUT constants"
+    )
+
+
+def read_layer(path, columns=None):
+    """GeoDataFrame with `columns` (all if None) plus the geometry."""
+    path = existing_path(path)
+    if path.endswith(".parquet"):
+        return gpd.read_parquet(path, columns=None if columns is None else [*columns, "geometry"])
+    return gpd.read_file(path, columns=columns)
+
+
+def read_attributes(path, columns=None):
+    """
+    Plain DataFrame of the attribute columns, without geometry. `columns`
+    missing from the layer are skipped rather than raising.
+    """
+    path = existing_path(path)
+    if path.endswith(".parquet"):
+        available = [name for name in pq.read_schema(path).names if name != "geometry"]
+        wanted = available if columns is None else [c for c in columns if c in available]
+        return pd.read_parquet(path, columns=wanted)
+
+    df = pd.DataFrame(gpd.read_file(path, ignore_geometry=True))
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+
+def write_layers(gdf, base_path, formats):
+    """Write `gdf` as base_path + extension for each format name. Returns the paths."""
+    paths = []
+    for fmt in formats:
+        path = base_path + LAYER_EXTENSIONS[fmt]
+        if fmt == "parquet":
+            gdf.to_parquet(path, write_covering_bbox=True)
+        else:
+            gdf.to_file(path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+        paths.append(path)
+    return paths
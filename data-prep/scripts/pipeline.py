@@ -0,0 +1,536 @@
+"""
+Incremental Pipeline Runner
+
+This script runs the data-prep stage scripts as a dependency graph, skipping
+stages whose inputs have not changed since their last successful run.
+
+METHODOLOGY:
+- Reads each stage's INPUT/OUTPUT constants straight from its source (via ast,
+  so no stage is imported and no heavy dependency is loaded)
+- Derives stage dependencies by matching each input path to the stage that
+  declares it as an output (exact file first, then the closest output directory)
+- Hashes each stage's script, the shared modules it imports from scripts/
+  (followed through their own imports) and its input files with SHA-256;
+  hashes are cached by (size, mtime) so unchanged files are never re-read
+- Skips a stage when its hashes match the last successful run and every output
+  that run produced still exists; DATED_STAGES also rerun when the UTC date
+  changes
+- Runs independent branches concurrently (02_centroids, the 03 -> 07 radio
+  chain and the country-details scripts)
+- Stages write timing and memory reports (instrument.py); the summary shows
+  each stage's CPU time and peak RSS from them
+
+INPUT:
+- Stage scripts listed in STAGES and the files they declare as inputs
+
+OUTPUT:
+- Whatever the stages produce
+- Run state (data/pipeline_state.json) with the hashes of the last successful run
+- Stage reports (data/reports/), grouped per pipeline run by run_id
+
+USAGE:
+    uv run scripts/pipeline.py                  # run stale stages
+    uv run scripts/pipeline.py 05_organize      # run 05_organize and its upstream stages
+    uv run scripts/pipeline.py --force          # rerun everything
+    uv run scripts/pipeline.py --dry-run        # show what would run
+    uv run scripts/pipeline.py --profile --tracemalloc 10   # heavier per-stage reports
+"""
+
+import argparse
+import ast
+import datetime
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrument import PROFILE_ENV, REPORT_DIR, RUN_ID_ENV, TRACEMALLOC_ENV
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+# Stage name -> script path, relative to the data-prep directory.
+# Order only matters for display; execution order comes from the dependency graph.
+STAGES = {
+    "01_load_data": "scripts/01_load_data.py",
+    "02_centroids": "scripts/02_centroids.py",
+    "03_filter_radio": "scripts/03_filter_radio.py",
+    "03b_dedup_radio": "scripts/03b_dedup_radio.py",
+    "04_match_radio": "scripts/04_match_radio.py",
+    "05_organize": "scripts/05_organize.py",
+    "06_split_chunks": "scripts/06_split_chunks.py",
+    "07_daily_bundles": "scripts/07_daily_bundles.py",
+    "08_map_geometry": "scripts/08_map_geometry.py",
+    "country-details/01_scrape": "scripts/country-details/01_scrape.py",
+    "country-details/02_get_pics": "scripts/country-details/02_get_pics.py",
+    "country-details/04_image_variants": "scripts/country-details/04_image_variants.py",
+}
+
+# Paths a stage reads or writes that are not captured by its *INPUT*/*OUTPUT* constants
+EXTRA_INPUTS = {
+    # Reads the stations_{i} chunks, which are cut from these 05_organize outputs
+    "07_daily_bundles": ["data/out/stations.jsonl", "data/out/stations.bin", "data/out/offsets.bin"],
+}
+EXTRA_OUTPUTS = {
+    "country-details/02_get_pics": ["data/out/country-pics"],
+}
+
+# Stage -> directory whose files it fetches for whichever stages declare them
+# as inputs (01_load_data downloads the Natural Earth scales other stages
+# read). The declared paths are part of its fingerprint, so a stage that
+# starts reading a new scale makes it stale while other edits do not
+DECLARED_BY_CONSUMERS = {"01_load_data": "data/ne"}
+
+# Stages whose output depends on today's date (UTC), e.g. 07_daily_bundles
+# with START_DATE = None; they go stale once a day
+DATED_STAGES = {"07_daily_bundles"}
+
+# Shared modules that do not change what a stage produces, so editing them
+# does not make every stage stale
+UNTRACKED_MODULES = {"instrument"}
+
+SCRIPTS_DIR = "scripts"
+STATE_FILE = "data/pipeline_state.json"
+MAX_WORKERS = 4
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+def read_declared_paths(script_path):
+    """
+    Extract module-level string constants whose names contain INPUT or OUTPUT.
+    Returns (inputs, outputs) as lists of normalized paths.
+    """
+    with open(script_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script_path)
+
+    inputs, outputs = [], []
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        if not (isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)):
+            continue
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            path = os.path.normpath(node.value.value)
+            if "INPUT" in target.id:
+                inputs.append(path)
+            elif "OUTPUT" in target.id:
+                outputs.append(path)
+    return inputs, outputs
+
+
+def imported_names(path):
+    """Top-level names of the absolute imports in a Python file."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names.add(node.module.split(".")[0])
+    return names
+
+
+def read_local_imports(script_path):
+    """
+    Find the shared helper modules in scripts/ that a stage imports, directly
+    or through other helpers, so edits to them invalidate the stage just like
+    edits to the script itself.
+    """
+    modules = []
+    seen = set(UNTRACKED_MODULES)
+    pending = [script_path]
+    while pending:
+        path = pending.pop()
+        for name in sorted(imported_names(path) - seen):
+            seen.add(name)
+            for directory in (os.path.dirname(path), SCRIPTS_DIR):
+                candidate = os.path.normpath(os.path.join(directory, f"{name}.py"))
+                if os.path.exists(candidate):
+                    modules.append(candidate)
+                    pending.append(candidate)
+                    break
+    return sorted(modules)
+
+
+def load_stages(selected=None):
+    """
+    Build the stage graph: {name: {script, inputs, outputs, deps}}.
+    If `selected` is given, only those stages and their upstream stages are kept.
+    """
+    stages = {}
+    for name, script in STAGES.items():
+        inputs, outputs = read_declared_paths(script)
+        inputs += [os.path.normpath(p) for p in EXTRA_INPUTS.get(name, [])]
+        outputs += [os.path.normpath(p) for p in EXTRA_OUTPUTS.get(name, [])]
+        stages[name] = {
+            "script": script,
+            "sources": [script] + read_local_imports(script),
+            "inputs": list(dict.fromkeys(inputs)),
+            "outputs": list(dict.fromkeys(outputs)),
+            "dated": name in DATED_STAGES,
+            "deps": set(),
+        }
+
+    for name, directory in DECLARED_BY_CONSUMERS.items():
+        prefix = os.path.normpath(directory) + os.sep
+        stages[name]["consumed"] = sorted(
+            {path for other, stage in stages.items() if other != name for path in stage["inputs"] if path.startswith(prefix)}
+        )
+
+    for name, stage in stages.items():
+        for path in stage["inputs"]:
+            producer = find_producer(stages, name, path)
+            if producer:
+                stage["deps"].add(producer)
+
+    if selected:
+        unknown = [s for s in selected if s not in stages]
+        if unknown:
+            raise SystemExit(f"Unknown stage(s): {', '.join(unknown)}")
+        keep = set()
+        pending = list(selected)
+        while pending:
+            name = pending.pop()
+            if name not in keep:
+                keep.add(name)
+                pending.extend(stages[name]["deps"])
+        stages = {name: stage for name, stage in stages.items() if name in keep}
+
+    return stages
+
+
+def find_producer(stages, consumer, path):
+    """
+    Find the stage that writes `path`: an exact output match wins, otherwise
+    the stage whose output directory most closely contains it. When several
+    stages write the same file (05_organize and 06_split_chunks both write
+    index.json), the last one in STAGES order is the producer.
+    """
+    exact, best, best_len = None, None, -1
+    for name, stage in stages.items():
+        if name == consumer:
+            continue
+        for out in stage["outputs"]:
+            if out == path:
+                exact = name
+            elif path.startswith(out + os.sep) and len(out) > best_len:
+                best, best_len = name, len(out)
+    return exact or best
+
+
+def topological_order(stages):
+    order, seen = [], set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for dep in sorted(stages[name]["deps"]):
+            visit(dep)
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def iter_files(path):
+    """Yield files under `path` (or `path` itself) in a stable order."""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                yield os.path.join(root, filename)
+    elif os.path.exists(path):
+        yield path
+
+
+class HashCache:
+    """SHA-256 file hashes, reused while a file's size and mtime are unchanged."""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def file_hash(self, path):
+        st = os.stat(path)
+        cached = self.entries.get(path)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(HASH_BLOCK_SIZE):
+                digest.update(block)
+        sha = digest.hexdigest()
+        self.entries[path] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha,
+        }
+        return sha
+
+    def path_hash(self, path):
+        """Hash a file, or every file under a directory. Missing paths hash to None."""
+        if not os.path.exists(path):
+            return None
+        if not os.path.isdir(path):
+            return self.file_hash(path)
+        digest = hashlib.sha256()
+        for file_path in iter_files(path):
+            digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+            digest.update(self.file_hash(file_path).encode("ascii"))
+        return digest.hexdigest()
+
+
+def fingerprint(stage, hashes):
+    """
+    Hashes that decide whether a stage is up to date: its code plus its
+    inputs, the paths other stages read from DECLARED_BY_CONSUMERS
+    directories, and today's date for DATED_STAGES.
+    """
+    current = {
+        "sources": {path: hashes.path_hash(path) for path in stage["sources"]},
+        "inputs": {path: hashes.path_hash(path) for path in stage["inputs"]},
+    }
+    if "consumed" in stage:
+        current["consumed"] = stage["consumed"]
+    if stage["dated"]:
+        current["date"] = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    return current
+
+
+def is_fresh(stage, previous, current):
+    if previous is None:
+        return False
+    if previous.get("sources") != current["sources"]:
+        return False
+    if previous.get("inputs") != current["inputs"]:
+        return False
+    if previous.get("consumed") != current.get("consumed"):
+        return False
+    if previous.get("date") != current.get("date"):
+        return False
+    # Only outputs the last run actually produced are required; some are
+    # optional depending on a stage's settings (e.g. 05_organize's offsets.bin)
+    produced = previous.get("outputs", stage["outputs"])
+    return all(os.path.exists(path) for path in produced)
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {"stages": {}, "hashes": {}}
+    with open(STATE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state):
+    """Write the state file atomically so an interrupted run keeps completed stages."""
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def read_report(name, run_id):
+    """The stage's instrument.py report from this run, or None."""
+    path = os.path.join(REPORT_DIR, f"{name}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return report if report.get("run_id") == run_id else None
+
+
+def run_stage(name, stage):
+    """Run one stage script as a subprocess, capturing its output."""
+    for path in stage["outputs"]:
+        parent = path if not os.path.splitext(path)[1] else os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+    env = dict(os.environ)
+    if console.is_terminal:
+        env.setdefault("FORCE_COLOR", "1")
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, stage["script"]],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    elapsed = time.perf_counter() - start
+    return result.returncode, result.stdout + result.stderr, elapsed
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the data-prep pipeline incrementally.")
+    parser.add_argument("stages", nargs="*", help="Stages to build (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rerun every selected stage")
+    parser.add_argument("--dry-run", action="store_true", help="Only report stage status")
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS, help="Max concurrent stages")
+    parser.add_argument("--profile", action="store_true", help="Save cProfile stats for each stage")
+    parser.add_argument(
+        "--tracemalloc",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Trace allocations and report the N largest growing lines per step (slow)",
+    )
+    args = parser.parse_args()
+
+    stages = load_stages(args.stages)
+    state = load_state()
+    hashes = HashCache(state.get("hashes"))
+
+    if args.dry_run:
+        table = Table(title="Pipeline Status")
+        table.add_column("Stage", style="cyan")
+        table.add_column("Depends on", style="dim")
+        table.add_column("Status", justify="right")
+        stale = set()
+        for name in topological_order(stages):
+            stage = stages[name]
+            if args.force or stage["deps"] & stale:
+                status = "[yellow]stale[/yellow]"
+            else:
+                current = fingerprint(stage, hashes)
+                fresh = is_fresh(stage, state["stages"].get(name), current)
+                status = "[green]fresh[/green]" if fresh else "[yellow]stale[/yellow]"
+            if "stale" in status:
+                stale.add(name)
+            table.add_row(name, ", ".join(sorted(stage["deps"])), status)
+        console.print(table)
+        return
+
+    console.print(
+        f"\n[bold cyan]Running pipeline ({len(stages)} stages, {args.jobs} workers)...[/bold cyan]"
+    )
+
+    # Read by instrument.py in each stage subprocess
+    run_id = time.strftime("%Y%m%dT%H%M%S")
+    os.environ[RUN_ID_ENV] = run_id
+    if args.profile:
+        os.environ[PROFILE_ENV] = "1"
+    if args.tracemalloc:
+        os.environ[TRACEMALLOC_ENV] = str(args.tracemalloc)
+
+    results = {}  # name -> (status, elapsed)
+    pending = dict(stages)
+    running = {}
+    total_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while pending or running:
+            # Schedule every stage whose upstream stages have all finished
+            progressed = False
+            for name in list(pending):
+                stage = pending[name]
+                if not stage["deps"] <= results.keys():
+                    continue
+                del pending[name]
+                progressed = True
+
+                if any(results[dep][0] in ("failed", "blocked") for dep in stage["deps"]):
+                    results[name] = ("blocked", 0.0)
+                    console.print(f"[red]✗ {name}: skipped (upstream failed)[/red]")
+                    continue
+
+                current = fingerprint(stage, hashes)
+                if not args.force and is_fresh(stage, state["stages"].get(name), current):
+                    results[name] = ("skipped", 0.0)
+                    console.print(f"[dim]• {name}: up to date[/dim]")
+                    continue
+
+                console.print(f"[cyan]▶ {name}: running[/cyan]")
+                running[pool.submit(run_stage, name, stage)] = name
+
+            if not running:
+                if pending and not progressed:
+                    raise SystemExit(f"Dependency cycle between: {', '.join(pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                stage = stages[name]
+                returncode, output, elapsed = future.result()
+
+                console.rule(f"[bold]{name}[/bold]")
+                console.out(output.rstrip(), highlight=False)
+
+                if returncode != 0:
+                    results[name] = ("failed", elapsed)
+                    state["stages"].pop(name, None)
+                    console.print(f"[bold red]✗ {name} failed (exit {returncode})[/bold red]")
+                else:
+                    results[name] = ("ran", elapsed)
+                    # Recorded after the run, so a stage that rewrites one of its own
+                    # inputs in place stays fresh next time
+                    state["stages"][name] = {
+                        **fingerprint(stage, hashes),
+                        "outputs": [p for p in stage["outputs"] if os.path.exists(p)],
+                        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    }
+                    console.print(f"[bold green]✓ {name} ({elapsed:.1f}s)[/bold green]")
+
+                state["hashes"] = hashes.entries
+                save_state(state)
+
+    state["hashes"] = hashes.entries
+    save_state(state)
+
+    # ==============================================================================
+    # SUMMARY
+    # ==============================================================================
+
+    table = Table(title="Pipeline Summary")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Result", justify="right")
+    table.add_column("Time", justify="right", style="green")
+    table.add_column("CPU", justify="right", style="green")
+    table.add_column("Peak RSS", justify="right", style="magenta")
+    styles = {"ran": "green", "skipped": "dim", "failed": "red", "blocked": "red"}
+    for name in stages:
+        status, elapsed = results[name]
+        report = read_report(name, run_id) if status in ("ran", "failed") else None
+        table.add_row(
+            name,
+            f"[{styles[status]}]{status}[/{styles[status]}]",
+            f"{elapsed:.1f}s",
+            # Child processes (process pools) count towards the stage's CPU
+            f"{report['cpu_s'] + report['child_cpu_s']:.1f}s" if report else "-",
+            f"{report['peak_rss_mb']:,.0f} MB" if report and report["peak_rss_mb"] is not None else "-",
+        )
+    console.print(table)
+    console.print(f"Stage reports: {REPORT_DIR}/ (run {run_id})")
+    console.print(f"Total wall time: {time.perf_counter() - total_start:.1f}s")
+
+    if any(status in ("failed", "blocked") for status, _ in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Radio Station Hand-off I/O
+
+Shared reader/writer for the station tables passed between 03_filter_radio,
+04_match_radio and 05_organize.
+
+The format is picked from the file extension:
+- .arrow   -> Arrow IPC file, memory-mapped on read (default hand-off)
+- .parquet -> Parquet, memory-mapped on read
+- .json    -> JSON array of records (the original format; kept for debugging)
+
+Arrow IPC is written uncompressed so a reader maps the column buffers straight
+from the page cache instead of parsing text.
+"""
+
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class StationWriter:
+    """
+    Incremental station writer: call write() once per DataFrame chunk, so a
+    stage never has to hold its whole output in memory.
+
+    The Arrow/Parquet schema is taken from `schema` or, if omitted, from the
+    first chunk; later chunks are cast to it.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.ext = os.path.splitext(path)[1]
+        if self.ext not in (".arrow", ".parquet", ".json"):
+            raise ValueError(f"Unsupported station file format: {path}")
+        self.schema = schema
+        self.rows = 0
+        self._sink = None
+        self._writer = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.ext == ".json":
+            self._sink = open(self.path, "w", encoding="utf-8")
+            self._sink.write("[")
+        return self
+
+    def write(self, df):
+        if self.ext == ".json":
+            # Missing values become null rather than NaN so the file stays valid JSON
+            records = df.astype(object).where(pd.notnull(df), None).to_dict(orient="records")
+            for record in records:
+                self._sink.write(",\n  " if self.rows else "\n  ")
+                self._sink.write(
+                    json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+                )
+                self.rows += 1
+            return
+
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            self._open(table.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.ext == ".arrow":
+            self._sink = pa.OSFile(self.path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, schema)
+        else:
+            self._writer = pq.ParquetWriter(self.path, schema)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.ext == ".json":
+            self._sink.write("\n]\n" if self.rows else "]\n")
+            self._sink.close()
+            return
+        if self._writer is None and self.schema is not None:
+            # Nothing was written: still produce a valid, empty file
+            self._open(self.schema)
+        if self._writer is not None:
+            self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+def write_stations(df, path):
+    """Write a station DataFrame in the format implied by `path`'s extension."""
+    with StationWriter(path) as writer:
+        writer.write(df)
+
+
+def read_station_table(path, columns=None):
+    """Read a station file as a pyarrow Table, memory-mapping binary formats."""
+    ext = os.path.splitext(path)[1]
+
+    if ext == ".arrow":
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+    if ext == ".parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if ext == ".json":
+        return pa.Table.from_pandas(read_stations(path, columns), preserve_index=False)
+    raise ValueError(f"Unsupported station file format: {path}")
+
+
+def _to_frame(table):
+    df = table.to_pandas()
+    # Integer columns with nulls would come back as float NaN; keep them as
+    # int / None so they stay integers (and valid JSON) downstream
+    for field in table.schema:
+        if pa.types.is_integer(field.type) and table[field.name].null_count:
+            df[field.name] = pd.Series(table[field.name].to_pylist(), index=df.index, dtype=object)
+    return df
+
+
+def read_stations(path, columns=None):
+    """Read a station file as a pandas DataFrame."""
+    if os.path.splitext(path)[1] == ".json":
+        df = pd.read_json(path)
+        return df[columns] if columns else df
+    return _to_frame(read_station_table(path, columns))
+
+
+def iter_stations(path, batch_rows, columns=None):
+    """
+    Read a station file as DataFrames of at most `batch_rows` rows, with the
+    same values read_stations would give. Arrow files are memory-mapped and
+    Parquet is read batch by batch, so only one batch is held in memory
+    (JSON is parsed whole).
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == ".json":
+        df = read_stations(path, columns)
+        for start in range(0, len(df), batch_rows):
+            yield df.iloc[start : start + batch_rows]
+        return
+    if ext == ".parquet":
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_rows, columns=columns)
+    else:
+        batches = read_station_table(path, columns).to_batches(max_chunksize=batch_rows)
+    for batch in batches:
+        yield _to_frame(pa.Table.from_batches([batch]))
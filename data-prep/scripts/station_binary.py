@@ -0,0 +1,171 @@
+"""
+Dictionary-Encoded Binary Station Records
+
+Encoder and decoder for the LAYOUT = "binary" output of 05_organize.
+
+FORMAT:
+- Each country is one contiguous block: count fixed-size records followed by
+  the country's string heap. Blocks never reference each other, so
+  06_split_chunks can move them between files like JSONL line runs.
+- A record holds one little-endian slot per column, in column order:
+    "dict" -> uint16 code into a string table (0xFFFF = null)
+    "heap" -> uint32 offset + uint32 length into the country heap
+              (offset relative to the heap start, length 0xFFFFFFFF = null)
+    "f64"  -> float64
+    "i64"  -> int64
+    "i32"  -> int32 (-2^31 = null), for integer columns with missing values
+- Text columns with few distinct values (country-level fields such as ADMIN,
+  CONTINENT, ISO_A3, plus source, language, ...) are dictionary-encoded; free
+  text (channel_name, place_name, URLs, ...) goes in the heap.
+- The schema and string tables live in index.json's config, so a client
+  fetches them once and then needs a single range per record:
+    record i of a country -> start + i * record_size
+    its heap              -> start + count * record_size, heap_length bytes
+
+Decoded records are dicts with the same keys, order and values as the JSONL
+records, so json.dumps(decoded) reproduces the JSONL line exactly.
+"""
+
+import math
+import struct
+
+import pandas as pd
+
+DICT_NULL = 0xFFFF
+HEAP_NULL = 0xFFFFFFFF
+I32_NULL = -(2**31)
+
+# Text columns are dictionary-encoded when distinct values are at most this
+# fraction of rows (and fit in a uint16 code)
+DICT_MAX_RATIO = 0.25
+
+SLOT_FORMATS = {"dict": "H", "heap": "II", "f64": "d", "i64": "q", "i32": "i"}
+
+
+def is_nullable_int32(series):
+    """Object column of ints and Nones (how radio_io returns integers with nulls)."""
+    values = series.dropna()
+    return (
+        series.dtype == object
+        and len(values) > 0
+        and all(type(v) is int and I32_NULL < v < 2**31 for v in values)
+    )
+
+
+def build_schema(radio):
+    """
+    Choose a slot type per column and build the string tables.
+    Returns the schema dict stored in index.json's config.
+    """
+    fields = []
+    dictionaries = {}
+    for col in radio.columns:
+        series = radio[col]
+        if pd.api.types.is_float_dtype(series):
+            fields.append({"name": col, "type": "f64"})
+        elif pd.api.types.is_integer_dtype(series):
+            fields.append({"name": col, "type": "i64"})
+        elif is_nullable_int32(series):
+            fields.append({"name": col, "type": "i32"})
+        else:
+            values = sorted(series.dropna().unique().tolist())
+            if len(values) < DICT_NULL and len(values) <= DICT_MAX_RATIO * len(series):
+                fields.append({"name": col, "type": "dict"})
+                dictionaries[col] = values
+            else:
+                fields.append({"name": col, "type": "heap"})
+
+    record = record_struct(fields)
+    return {
+        "layout": "binary",
+        "record_size": record.size,
+        "fields": fields,
+        "dictionaries": dictionaries,
+    }
+
+
+def record_struct(fields):
+    return struct.Struct("<" + "".join(SLOT_FORMATS[f["type"]] for f in fields))
+
+
+def encode_country(schema, columns):
+    """
+    Encode one country's rows, given column-wise as {name: [values]}.
+    Returns (records_bytes, heap_bytes).
+    """
+    record = record_struct(schema["fields"])
+    codes = {
+        name: {value: code for code, value in enumerate(values)}
+        for name, values in schema["dictionaries"].items()
+    }
+
+    heap = bytearray()
+    slots = []  # per column, a list of slot tuples (one per row)
+    for field in schema["fields"]:
+        name, kind = field["name"], field["type"]
+        values = columns[name]
+        if kind == "dict":
+            lookup = codes[name]
+            slots.append([(DICT_NULL if v is None else lookup[v],) for v in values])
+        elif kind == "heap":
+            column_slots = []
+            for v in values:
+                if v is None or (isinstance(v, float) and math.isnan(v)):
+                    column_slots.append((0, HEAP_NULL))
+                    continue
+                data = str(v).encode("utf-8")
+                column_slots.append((len(heap), len(data)))
+                heap += data
+            slots.append(column_slots)
+        elif kind == "i32":
+            slots.append([(I32_NULL if v is None else v,) for v in values])
+        else:
+            slots.append([(v,) for v in values])
+
+    records = b"".join(
+        record.pack(*(x for slot in row for x in slot)) for row in zip(*slots)
+    )
+    return records, bytes(heap)
+
+
+def decode_country(schema, block, count):
+    """Decode a country block (records + heap) into a list of record dicts."""
+    record = record_struct(schema["fields"])
+    heap = memoryview(block)[count * record.size :]
+    dictionaries = schema["dictionaries"]
+
+    rows = []
+    for values in record.iter_unpack(block[: count * record.size]):
+        row = {}
+        pos = 0
+        for field in schema["fields"]:
+            name, kind = field["name"], field["type"]
+            if kind == "dict":
+                code = values[pos]
+                row[name] = None if code == DICT_NULL else dictionaries[name][code]
+                pos += 1
+            elif kind == "heap":
+                offset, length = values[pos], values[pos + 1]
+                row[name] = (
+                    None
+                    if length == HEAP_NULL
+                    else bytes(heap[offset : offset + length]).decode("utf-8")
+                )
+                pos += 2
+            elif kind == "i32":
+                row[name] = None if values[pos] == I32_NULL else values[pos]
+                pos += 1
+            else:
+                row[name] = values[pos]
+                pos += 1
+        rows.append(row)
+    return rows
+
+
+def read_country(path, schema, entry):
+    """Read and decode one country given its index entry ({start, count, heap_length})."""
+    size = entry["count"] * schema["record_size"] + entry["heap_length"]
+    with open(path, "rb") as f:
+        f.seek(entry["start"])
+        block = f.read(size)
+    return decode_country(schema, block, entry["count"])
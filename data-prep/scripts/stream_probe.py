@@ -0,0 +1,342 @@
+"""
+Stream Health Prober
+
+Opens radio streams concurrently with asyncio, reads their first bytes, and
+records whether they play and how fast.
+
+METHODOLOGY:
+- A minimal HTTP/1.1 client on asyncio streams: accepts the "ICY 200 OK"
+  status line that SHOUTcast v1 servers send, follows redirects and decodes
+  chunked bodies
+- Open connections are bounded overall (max_connections) and per host
+  (per_host), so a provider hosting thousands of stations is not flooded;
+  DNS lookups and the TLS context are shared across all probes
+- Streams never end, so each connection is closed once read_bytes arrive or
+  the timeout expires
+- Per stream it records the status, time to first body byte (TTFB, counted
+  from the start of the request, including DNS, TLS and redirects) and the
+  throughput of the bytes after the first
+- Results can be cached in a JSON file; entries younger than the TTL are
+  reused, so reruns only probe new or stale URLs
+
+STATUS VALUES:
+- "ok": body bytes arrived
+- "http_error": non-2xx response (http_status holds the code)
+- "empty": response ended before any body byte
+- "timeout": no body byte before the timeout
+- "error": DNS, connection, TLS or protocol failure (see "error")
+
+USAGE:
+    uv run scripts/stream_probe.py URL [URL ...]
+
+    # against the local stand-in server
+    uv run scripts/stream_standin.py &
+    uv run scripts/stream_probe.py http://127.0.0.1:8700/ok http://127.0.0.1:8700/slow
+"""
+
+import asyncio
+import json
+import os
+import socket
+import ssl
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_HEADERS = {
+    "User-Agent": "geo-hearo-probe/1.0",
+    "Accept": "*/*",
+    "Icy-MetaData": "0",
+}
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+HEADER_LIMIT = 64 * 1024
+
+
+class ProbeError(Exception):
+    pass
+
+
+class BodyReader:
+    """Reads a response body, undoing chunked transfer encoding if used."""
+
+    def __init__(self, reader, chunked):
+        self.reader = reader
+        self.chunked = chunked
+        self.chunk_left = 0
+        self.done = False
+
+    async def read(self, size=16 * 1024):
+        """Next bytes of the body (at most `size`); b"" at the end."""
+        if self.done:
+            return b""
+        if not self.chunked:
+            data = await self.reader.read(size)
+            self.done = not data
+            return data
+
+        if self.chunk_left == 0:
+            line = await self.reader.readline()
+            try:
+                self.chunk_left = int(line.split(b";")[0].strip() or b"0", 16)
+            except ValueError:
+                raise ProbeError(f"bad chunk size {line[:20]!r}")
+            if self.chunk_left == 0:
+                self.done = True
+                return b""
+        data = await self.reader.read(min(size, self.chunk_left))
+        if not data:
+            self.done = True
+            return b""
+        self.chunk_left -= len(data)
+        if self.chunk_left == 0:
+            await self.reader.readline()  # CRLF after the chunk
+        return data
+
+
+class StreamResponse:
+    def __init__(self, url, status, reason, headers, reader, writer):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        self.body = BodyReader(reader, chunked)
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+def host_of(url):
+    """Hostname of `url`; None if it does not parse (check() then reports the error)."""
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+
+def parse_head(head):
+    """Status code, reason and lowercased headers of a raw response head."""
+    lines = head.decode("latin-1").splitlines()
+    if not lines:
+        raise ProbeError("empty response")
+    parts = lines[0].split(None, 2)
+    if len(parts) < 2 or not (parts[0].startswith("HTTP/") or parts[0] == "ICY"):
+        raise ProbeError(f"bad status line {lines[0][:60]!r}")
+    try:
+        status = int(parts[1])
+    except ValueError:
+        raise ProbeError(f"bad status line {lines[0][:60]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return status, parts[2] if len(parts) > 2 else "", headers
+
+
+class StreamProber:
+    """Concurrent stream prober; reuse one instance for a whole batch of URLs."""
+
+    def __init__(
+        self,
+        max_connections=64,
+        per_host=4,
+        timeout=10.0,
+        read_bytes=32 * 1024,
+        max_redirects=5,
+        headers=None,
+    ):
+        self.timeout = timeout
+        self.read_bytes = read_bytes
+        self.max_redirects = max_redirects
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self.ssl_context = ssl.create_default_context()
+        self.addresses = {}
+
+    async def resolve(self, host, port):
+        """getaddrinfo once per (host, port); concurrent callers share the lookup."""
+        key = (host, port)
+        if key not in self.addresses:
+            loop = asyncio.get_running_loop()
+            self.addresses[key] = asyncio.ensure_future(
+                loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            )
+        return await asyncio.shield(self.addresses[key])
+
+    async def connect(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ProbeError(f"unsupported URL {url!r}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        tls = self.ssl_context if parts.scheme == "https" else None
+
+        last_error = None
+        for _, _, _, _, address in await self.resolve(parts.hostname, port):
+            try:
+                return await asyncio.open_connection(
+                    address[0],
+                    port,
+                    ssl=tls,
+                    server_hostname=parts.hostname if tls else None,
+                    limit=HEADER_LIMIT,
+                )
+            except OSError as e:
+                last_error = e
+        raise last_error or ProbeError(f"no address for {parts.hostname}")
+
+    async def open(self, url):
+        """
+        GET `url`, following redirects; returns a StreamResponse positioned at
+        the start of the body. The caller must close() it.
+        """
+        for _ in range(self.max_redirects + 1):
+            reader, writer = await self.connect(url)
+            parts = urlsplit(url)
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+            host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+            lines = [f"GET {target} HTTP/1.1", f"Host: {host}", "Connection: close"]
+            lines += [f"{name}: {value}" for name, value in self.headers.items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+            try:
+                await writer.drain()
+                head = await reader.readuntil(b"\r\n\r\n")
+                status, reason, headers = parse_head(head)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ProbeError):
+                writer.close()
+                raise ProbeError("malformed response head")
+            except BaseException:
+                writer.close()
+                raise
+
+            if status in REDIRECT_CODES and "location" in headers:
+                writer.close()
+                url = urljoin(url, headers["location"])
+                continue
+            return StreamResponse(url, status, reason, headers, reader, writer)
+        raise ProbeError(f"more than {self.max_redirects} redirects")
+
+    async def measure(self, url):
+        start = time.monotonic()
+        result = {
+            "url": url,
+            "status": "error",
+            "http_status": None,
+            "content_type": None,
+            "ttfb_ms": None,
+            "bytes": 0,
+            "kbps": None,
+            "error": None,
+        }
+        response = None
+        try:
+            async with asyncio.timeout(self.timeout):
+                response = await self.open(url)
+                result["http_status"] = response.status
+                result["content_type"] = response.headers.get("content-type")
+                if response.url != url:
+                    result["final_url"] = response.url
+                if not 200 <= response.status < 300:
+                    result["status"] = "http_error"
+                    return result
+
+                first_at = first_size = None
+                while result["bytes"] < self.read_bytes:
+                    data = await response.body.read()
+                    if not data:
+                        break
+                    if first_at is None:
+                        first_at, first_size = time.monotonic(), len(data)
+                        result["ttfb_ms"] = round(1000 * (first_at - start), 1)
+                    result["bytes"] += len(data)
+                if first_at is None:
+                    result["status"] = "empty"
+                    return result
+        except TimeoutError:
+            if result["bytes"] == 0:
+                result["status"] = "timeout"
+                return result
+        # ValueError: malformed URLs (bad port, broken IPv6 literal), overlong
+        # chunk-size lines and bad IDNA host names (UnicodeError)
+        except (OSError, ProbeError, ssl.SSLError, ValueError) as e:
+            result["error"] = f"{type(e).__name__}: {e}"[:200]
+            return result
+        finally:
+            if response is not None:
+                response.close()
+
+        # Reached only with body bytes: the read limit, end of body or timeout
+        result["status"] = "ok"
+        elapsed = time.monotonic() - first_at
+        if elapsed > 0 and result["bytes"] > first_size:
+            result["kbps"] = round((result["bytes"] - first_size) * 8 / 1000 / elapsed, 1)
+        return result
+
+    async def probe_many(self, urls, on_result=None, check=None):
+        """
+        Probe the distinct `urls`; returns {url: result}. `check(prober, url)`
+        replaces the default measurement (StreamProber.measure).
+        """
+        check = check or StreamProber.measure
+        connections = asyncio.Semaphore(self.max_connections)
+        hosts = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+
+        async def one(url):
+            # Redirect targets count against the host the URL names
+            async with hosts[host_of(url)], connections:
+                result = await check(self, url)
+            result["checked_at"] = time.time()
+            if on_result:
+                on_result(result)
+            return result
+
+        results = await asyncio.gather(*(one(url) for url in dict.fromkeys(urls)))
+        return {r["url"]: r for r in results}
+
+
+def load_cache(cache_path):
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(cache_path, cache):
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, cache_path)
+
+
+def probe_urls(urls, cache_path=None, ttl=24 * 3600, on_result=None, check=None, **prober_options):
+    """
+    Probe `urls`, reusing cached results younger than `ttl` seconds and
+    updating the cache at `cache_path` when given. Returns ({url: result},
+    number of URLs actually probed).
+    """
+    cache = load_cache(cache_path)
+    now = time.time()
+    urls = list(dict.fromkeys(urls))
+    stale = [u for u in urls if now - cache.get(u, {}).get("checked_at", 0) > ttl]
+
+    if stale:
+        prober = StreamProber(**prober_options)
+        cache.update(asyncio.run(prober.probe_many(stale, on_result, check)))
+        if cache_path:
+            save_cache(cache_path, cache)
+    return {u: cache[u] for u in urls}, len(stale)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__.split("USAGE:")[1])
+    results, _ = probe_urls(sys.argv[1:])
+    for result in results.values():
+        print(json.dumps(result))
@@ -0,0 +1,289 @@
+"""
+Stream Header Sniffer
+
+Reads the start of each radio stream, at most up to its first ICY metadata
+block, and records codec, bitrate, sample rate and metadata support.
+
+METHODOLOGY:
+- Connections, limits, redirects and caching come from stream_probe; the
+  request asks for metadata (Icy-MetaData: 1)
+- From the response headers: Content-Type, icy-br, ice-audio-info
+  (ice-samplerate / ice-bitrate / ice-channels), icy-sr, icy-name, icy-metaint
+- Reads are bounded: with icy-metaint, exactly the first interval of audio
+  plus the metadata block after it; without, MAX_AUDIO_BYTES of audio
+- The audio bytes are scanned for the first frame header (MP3 / MPEG audio,
+  AAC ADTS, Ogg Vorbis / Opus, FLAC). An MPEG/ADTS sync only counts when the
+  next frame header follows where the frame length says it should, unless the
+  frame runs past the bytes read
+- The metadata block's StreamTitle is kept as the now-playing title
+
+Header values win over the frame header for bitrate (streams often use VBR);
+the frame header wins for sample rate.
+
+USAGE:
+    uv run scripts/stream_sniff.py URL [URL ...]
+"""
+
+import asyncio
+import json
+import re
+import struct
+import sys
+import time
+
+from stream_probe import ProbeError, probe_urls
+
+ICY_HEADERS = {"Icy-MetaData": "1"}
+
+# Audio read when the stream has no icy-metaint, and the largest interval
+# read to reach the first metadata block (beyond it, metadata is skipped)
+MAX_AUDIO_BYTES = 16 * 1024
+MAX_METAINT = 64 * 1024
+
+CONTENT_TYPE_CODECS = {
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/mpeg3": "mp3",
+    "audio/aac": "aac",
+    "audio/aacp": "aac",
+    "audio/x-aac": "aac",
+    "audio/mp4": "aac",
+    "audio/ogg": "ogg",
+    "application/ogg": "ogg",
+    "audio/opus": "opus",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "application/vnd.apple.mpegurl": "hls",
+    "application/x-mpegurl": "hls",
+    "audio/x-mpegurl": "hls",
+}
+
+# MPEG audio: kbps by (version is MPEG-1, layer) and bitrate index
+MPEG_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Version bits -> sample rates; 1 is reserved
+MPEG_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+# ==============================================================================
+# FRAME HEADERS
+# ==============================================================================
+
+
+def mpeg_frame(data, i):
+    """(kbps, sample_rate, channels, frame_length) of an MPEG audio header at i, or None."""
+    if i + 4 > len(data) or data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[i + 1] >> 3) & 3
+    layer = 4 - ((data[i + 1] >> 1) & 3)
+    bitrate_index = data[i + 2] >> 4
+    rate_index = (data[i + 2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    kbps = MPEG_BITRATES[(mpeg1, layer)][bitrate_index]
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (data[i + 2] >> 1) & 1
+    channels = 1 if data[i + 3] >> 6 == 3 else 2
+    if layer == 1:
+        length = (12 * kbps * 1000 // sample_rate + padding) * 4
+    else:
+        length = (144 if mpeg1 or layer == 2 else 72) * kbps * 1000 // sample_rate + padding
+    return kbps, sample_rate, channels, length
+
+
+def adts_frame(data, i):
+    """(sample_rate, channels, frame_length) of an AAC ADTS header at i, or None."""
+    if i + 7 > len(data) or data[i] != 0xFF or data[i + 1] & 0xF6 != 0xF0:
+        return None
+    rate_index = (data[i + 2] >> 2) & 0xF
+    if rate_index >= len(ADTS_SAMPLE_RATES):
+        return None
+    channels = ((data[i + 2] & 1) << 2) | (data[i + 3] >> 6)
+    length = ((data[i + 3] & 3) << 11) | (data[i + 4] << 3) | (data[i + 5] >> 5)
+    if length < 7:
+        return None
+    return ADTS_SAMPLE_RATES[rate_index], channels, length
+
+
+def confirmed(data, i, length, parse):
+    """A sync is trusted if another header follows it (or the data ends first)."""
+    following = i + length
+    return following + 4 > len(data) or parse(data, following) is not None
+
+
+def sniff_audio(data):
+    """Codec details from the first recognizable frame header in `data`."""
+    if data.startswith(b"fLaC") and len(data) >= 18:
+        # STREAMINFO: 20-bit sample rate, 3-bit channels - 1
+        packed = int.from_bytes(data[18:21], "big") if len(data) >= 21 else 0
+        return {"codec": "flac", "sample_rate": packed >> 4 or None, "channels": ((packed >> 1) & 7) + 1}
+
+    ogg = data.find(b"OggS")
+    if ogg != -1:
+        vorbis = data.find(b"\x01vorbis", ogg)
+        if vorbis != -1 and vorbis + 16 <= len(data):
+            channels, rate = struct.unpack_from("<BI", data, vorbis + 11)
+            return {"codec": "vorbis", "sample_rate": rate, "channels": channels}
+        opus = data.find(b"OpusHead", ogg)
+        if opus != -1 and opus + 10 <= len(data):
+            # Opus always decodes at 48 kHz
+            return {"codec": "opus", "sample_rate": 48000, "channels": data[opus + 9]}
+
+    i = data.find(b"\xff")
+    while i != -1:
+        adts = adts_frame(data, i)
+        if adts and confirmed(data, i, adts[2], adts_frame):
+            return {"codec": "aac", "sample_rate": adts[0], "channels": adts[1]}
+        mpeg = mpeg_frame(data, i)
+        if mpeg and confirmed(data, i, mpeg[3], mpeg_frame):
+            return {"codec": "mp3", "kbps": mpeg[0], "sample_rate": mpeg[1], "channels": mpeg[2]}
+        i = data.find(b"\xff", i + 1)
+    return {}
+
+
+# ==============================================================================
+# HEADERS & METADATA
+# ==============================================================================
+
+
+def first_int(value):
+    match = re.search(r"\d+", value or "")
+    return int(match.group()) if match else None
+
+
+def audio_info(value):
+    """ice-audio-info ("ice-samplerate=44100;ice-bitrate=128;...") as a dict."""
+    info = {}
+    for part in (value or "").split(";"):
+        name, _, number = part.partition("=")
+        name = name.strip().lower().removeprefix("ice-")
+        if number.strip().isdigit():
+            info[name] = int(number)
+    return info
+
+
+def stream_title(block):
+    """StreamTitle from an ICY metadata block, or None."""
+    raw = block.rstrip(b"\0")
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("latin-1")
+    match = re.search(r"StreamTitle='(.*?)';", text, re.DOTALL)
+    return match.group(1).strip() or None if match else None
+
+
+async def read_exactly(body, count):
+    data = bytearray()
+    while len(data) < count:
+        block = await body.read(count - len(data))
+        if not block:
+            break
+        data += block
+    return bytes(data)
+
+
+# ==============================================================================
+# SNIFFING
+# ==============================================================================
+
+
+async def sniff(prober, url):
+    """Sniff one stream; a StreamProber check (see stream_probe.probe_many)."""
+    start = time.monotonic()
+    result = {
+        "url": url,
+        "status": "error",
+        "http_status": None,
+        "content_type": None,
+        "codec": None,
+        "kbps": None,
+        "sample_rate": None,
+        "channels": None,
+        "icy_metaint": None,
+        "icy_name": None,
+        "title": None,
+        "ttfb_ms": None,
+        "bytes": 0,
+        "error": None,
+    }
+    response = None
+    try:
+        async with asyncio.timeout(prober.timeout):
+            response = await prober.open(url)
+            headers = response.headers
+            result["http_status"] = response.status
+            if not 200 <= response.status < 300:
+                result["status"] = "http_error"
+                return result
+
+            content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            info = audio_info(headers.get("ice-audio-info"))
+            result["content_type"] = content_type or None
+            result["codec"] = CONTENT_TYPE_CODECS.get(content_type)
+            result["kbps"] = first_int(headers.get("icy-br")) or info.get("bitrate")
+            result["sample_rate"] = info.get("samplerate") or first_int(headers.get("icy-sr"))
+            result["channels"] = info.get("channels")
+            result["icy_name"] = headers.get("icy-name") or None
+            metaint = first_int(headers.get("icy-metaint"))
+            result["icy_metaint"] = metaint
+
+            read_metadata = metaint is not None and 0 < metaint <= MAX_METAINT
+            limit = metaint if read_metadata else MAX_AUDIO_BYTES
+            audio = await response.body.read(limit)
+            if audio:
+                result["ttfb_ms"] = round(1000 * (time.monotonic() - start), 1)
+                result["bytes"] = len(audio)
+                audio += await read_exactly(response.body, limit - len(audio))
+            result["bytes"] = len(audio)
+
+            if read_metadata and len(audio) == metaint:
+                length = await read_exactly(response.body, 1)
+                if length:
+                    block = await read_exactly(response.body, length[0] * 16)
+                    result["bytes"] += 1 + len(block)
+                    result["title"] = stream_title(block)
+    except TimeoutError:
+        if result["bytes"] == 0:
+            result["status"] = "timeout"
+            return result
+    # ValueError: malformed URLs and overlong chunk-size lines, as in measure()
+    except (OSError, ProbeError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"[:200]
+        return result
+    finally:
+        if response is not None:
+            response.close()
+
+    if result["bytes"] == 0:
+        result["status"] = "empty"
+        return result
+
+    result["status"] = "ok"
+    frame = sniff_audio(audio)
+    if frame.get("codec") and result["codec"] in (None, "ogg"):
+        result["codec"] = frame["codec"]
+    result["kbps"] = result["kbps"] or frame.get("kbps")
+    result["sample_rate"] = frame.get("sample_rate") or result["sample_rate"]
+    result["channels"] = frame.get("channels") or result["channels"]
+    return result
+
+
+def sniff_urls(urls, cache_path=None, ttl=7 * 24 * 3600, **prober_options):
+    """Sniff `urls` with caching; returns ({url: result}, number sniffed)."""
+    return probe_urls(urls, cache_path, ttl, check=sniff, headers=ICY_HEADERS, **prober_options)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__.split("USAGE:")[1])
+    results, _ = sniff_urls(sys.argv[1:])
+    for result in results.values():
+        print(json.dumps(result, ensure_ascii=False))
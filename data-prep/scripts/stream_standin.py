@@ -0,0 +1,130 @@
+"""
+Local Stand-In Stream Server
+
+Serves fake endless radio streams with controllable faults, for trying the
+stream prober without touching real stations.
+
+ROUTES (query parameters are optional):
+- /ok?kbps=128           endless audio at roughly `kbps`
+- /slow?delay=3          waits `delay` seconds before the first body byte
+- /status/503            responds with that status code and no body
+- /redirect?to=/ok       302 to `to`
+- /icy                   SHOUTcast v1 style "ICY 200 OK" response
+- /chunked               endless chunked transfer-encoded body
+- /meta?metaint=8000&title=Song
+                         icy-metaint stream with an ICY metadata block after
+                         every `metaint` audio bytes (sent when the client
+                         asks with Icy-MetaData: 1)
+- /empty                 200 with an empty body
+- /hang                  accepts the connection and never answers
+
+USAGE:
+    uv run scripts/stream_standin.py              # port 8700
+    uv run scripts/stream_standin.py --port 9000
+"""
+
+import argparse
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+# Silent MPEG-1 Layer III frames (128 kbps, 44.1 kHz, joint stereo, 417 bytes each)
+AUDIO_BLOCK = (b"\xff\xfb\x90\x44" + bytes(413)) * 10
+
+
+def metadata_block(title):
+    """ICY metadata: one length byte (x16) then the padded StreamTitle text."""
+    text = f"StreamTitle='{title}';".encode("utf-8")
+    blocks = -(-len(text) // 16)
+    return bytes([blocks]) + text.ljust(blocks * 16, b"\0")
+
+
+async def send_audio(writer, kbps, chunked=False, metaint=0, title=""):
+    """Write filler audio forever at about `kbps`, until the client goes away."""
+    per_tick = max(1, kbps * 1000 // 8 // 10)  # bytes per 100 ms
+    until_meta = metaint
+    while True:
+        payload = bytearray()
+        while len(payload) < per_tick:
+            take = min(len(AUDIO_BLOCK), per_tick - len(payload))
+            if metaint and take >= until_meta:
+                take = until_meta
+                payload += AUDIO_BLOCK[:take] + metadata_block(title)
+                until_meta = metaint
+                continue
+            payload += AUDIO_BLOCK[:take]
+            until_meta -= take
+        if chunked:
+            payload = f"{len(payload):x}\r\n".encode() + payload + b"\r\n"
+        writer.write(payload)
+        await writer.drain()
+        await asyncio.sleep(0.1)
+
+
+async def handle(reader, writer):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        target = request_line.split()[1]
+        headers = {
+            k.strip().lower(): v.strip()
+            for k, _, v in (line.partition(":") for line in header_lines if line)
+        }
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path
+
+        def respond(status_line, *extra):
+            lines = [status_line, "Content-Type: audio/mpeg", *extra]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        kbps = int(query.get("kbps", 128))
+        if path == "/ok":
+            respond("HTTP/1.1 200 OK", f"icy-br: {kbps}")
+            await send_audio(writer, kbps)
+        elif path == "/slow":
+            await asyncio.sleep(float(query.get("delay", 3)))
+            respond("HTTP/1.1 200 OK")
+            await send_audio(writer, kbps)
+        elif path.startswith("/status/"):
+            code = int(path.rsplit("/", 1)[1])
+            respond(f"HTTP/1.1 {code} Stand-In", "Content-Length: 0")
+        elif path == "/redirect":
+            respond("HTTP/1.1 302 Found", f"Location: {query.get('to', '/ok')}", "Content-Length: 0")
+        elif path == "/icy":
+            respond("ICY 200 OK", "icy-name: Stand-In", f"icy-br: {kbps}")
+            await send_audio(writer, kbps)
+        elif path == "/chunked":
+            respond("HTTP/1.1 200 OK", "Transfer-Encoding: chunked")
+            await send_audio(writer, kbps, chunked=True)
+        elif path == "/meta":
+            metaint = int(query.get("metaint", 8000))
+            if headers.get("icy-metadata") == "1":
+                respond("HTTP/1.1 200 OK", f"icy-metaint: {metaint}", f"icy-br: {kbps}")
+                await send_audio(writer, kbps, metaint=metaint, title=query.get("title", "Stand-In Song"))
+            else:
+                respond("HTTP/1.1 200 OK", f"icy-br: {kbps}")
+                await send_audio(writer, kbps)
+        elif path == "/empty":
+            respond("HTTP/1.1 200 OK", "Content-Length: 0")
+        elif path == "/hang":
+            await asyncio.sleep(3600)
+        else:
+            respond("HTTP/1.1 404 Not Found", "Content-Length: 0")
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port):
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    print(f"Stand-in streams on http://127.0.0.1:{port}/")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake radio streams")
+    parser.add_argument("--port", type=int, default=8700)
+    asyncio.run(serve(parser.parse_args().port))
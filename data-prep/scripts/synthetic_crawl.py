@@ -0,0 +1,393 @@
+"""
+Synthetic Crawl Generator
+
+Writes a crawl CSV in the crawldata.Station format (crawl/out/output.csv)
+with any number of stations, so the radio stages can be run and timed at
+sizes well beyond today's crawl without crawling.
+
+METHODOLOGY:
+- Countries come from the Natural Earth layer. Stations are spread over them
+  like in SAMPLE_CRAWL when a real crawl is there, otherwise in proportion to
+  POP_EST ** COUNTRY_SKEW: a few countries get thousands of stations and a
+  long tail gets a handful
+- Each country has a pool of places (more where there are more stations)
+  inside its polygon, and stations sit close to a place
+- Fields follow the two sources: Radio Garden rows (RG) always have
+  coordinates and no tags or language; Radio Browser rows (RB) have a
+  country code, tags and a language, and coordinates only
+  RB_COORDINATE_SHARE of the time
+- Names, URLs and tags are built from short word lists with lengths spread
+  like crawled ones, including a few very long names
+- Some rows are dirty the way crawled ones are: http or missing stream URLs,
+  countries spelled the Radio Browser way ("The Netherlands"), misspelled
+  or unknown countries, and streams listed by both sources under slightly
+  different names and URLs
+- The output only depends on the station count and the seed; rows are
+  written in batches, so memory does not grow with the station count
+
+INPUT:
+- data/ne/ne_110m_admin_0_countries.parquet
+- crawl/out/output.csv (optional; a real crawl whose country mix is copied)
+
+OUTPUT:
+- A crawl CSV (default data/bench/crawl_{stations}.csv)
+
+USAGE:
+    uv run scripts/synthetic_crawl.py 500000
+    uv run scripts/synthetic_crawl.py 500000 --seed 1 --output /tmp/output.csv
+"""
+
+import argparse
+import csv
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+from country_index import CountryIndex
+from ne_io import read_layer
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+NE_INPUT = "data/ne/ne_110m_admin_0_countries.parquet"
+SAMPLE_CRAWL = "crawl/out/output.csv"
+DEFAULT_OUTPUT = "data/bench/crawl_{stations}.csv"
+
+# Same columns, in the same order, as crawldata.Station's CSV tags
+COLUMNS = [
+    "source", "channel_id", "channel_name", "channel_resolved_url", "country", "country_code",
+    "geo_lat", "geo_lon", "place_name", "tags", "homepage", "language",
+]
+
+SEED = 0
+BATCH_ROWS = 100_000
+
+# Country mix when there is no SAMPLE_CRAWL: weight = POP_EST ** COUNTRY_SKEW
+COUNTRY_SKEW = 0.8
+# Places per country: PLACES_PER_SQRT_STATION * sqrt(expected stations)
+PLACES_PER_SQRT_STATION = 2.0
+MAX_PLACES = 2_000
+PLACE_JITTER_DEG = 0.05
+
+RB_SHARE = 0.55
+RB_COORDINATE_SHARE = 0.4
+HTTP_SHARE = 0.12
+MISSING_URL_SHARE = 0.02
+COUNTRY_VARIANT_SHARE = 0.15  # of RB rows: "The Netherlands", NAME_LONG, ...
+MISSPELLED_COUNTRY_SHARE = 0.002
+UNKNOWN_COUNTRY_SHARE = 0.002
+LONG_NAME_SHARE = 0.02
+CROSS_SOURCE_DUPLICATE_SHARE = 0.08
+
+SYLLABLES = [
+    "ka", "ro", "mi", "san", "tel", "vo", "lu", "na", "bra", "dor", "el", "ste", "qui", "zan", "por",
+    "ia", "ber", "go", "ha", "ni", "os", "val", "ku", "ri", "mon", "te", "sa", "li", "far", "ún",
+    "ö", "ña", "çe", "ło",
+]
+NAME_PREFIXES = ["Radio", "Radio", "Radio", "Rádio", "Radyo", "FM", "Web Radio", "Rádió", ""]
+NAME_SUFFIXES = ["", "", "", "FM", "AM", "Live", "Hits", "Classic", "News", "Jazz", "Gospel", "Latina", "Online"]
+TAGS = [
+    "pop", "rock", "news", "talk", "jazz", "classical", "dance", "hits", "oldies", "country", "christian",
+    "religious", "local news", "sports", "electronic", "hip hop", "folk", "world music", "80s", "90s",
+    "community radio", "public radio", "top 40", "latin", "reggae", "chillout", "ambient", "blues",
+]
+LANGUAGES = [
+    "english", "spanish", "german", "french", "portuguese", "russian", "italian", "arabic", "turkish",
+    "polish", "dutch", "greek", "hindi", "indonesian", "japanese", "chinese", "swahili", "english,spanish",
+]
+STREAM_HOSTS = [
+    "stream.zeno.fm", "ice1.somafm.com", "streaming.radio.co", "s{n}.radioboss.fm", "cast{n}.asurahosting.com",
+    "stream{n}.shoutcast.com", "live.{slug}.com", "{slug}.ice.infomaniak.ch", "radio{n}.{slug}.net",
+]
+STREAM_PATHS = ["/{slug}", "/{slug}.mp3", "/stream", "/live.aac", "/{slug}/{n}/stream.mp3", "/;stream/1", "/hls/{slug}/playlist.m3u8"]
+TLDS = ["com", "net", "org", "fm", "de", "fr", "co.uk", "com.br", "es", "it", "ru", "in"]
+UNKNOWN_COUNTRIES = ["International", "Internet", "Worldwide", "Unknown"]
+
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+# ==============================================================================
+# HELPER FUNCTIONS
+# ==============================================================================
+
+
+# Per-row helpers draw from a random.Random (much cheaper per call than numpy)
+
+
+def word(r, low=2, high=3):
+    return "".join(r.choices(SYLLABLES, k=r.randint(low, high))).capitalize()
+
+
+def slug(text):
+    return "".join(c for c in text.lower() if c.isascii() and c.isalnum()) or "radio"
+
+
+def base62(value, length):
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 62)
+        chars.append(BASE62[digit])
+    return "".join(chars)
+
+
+def format_coordinate(value):
+    # Go's encoding writes float64 zero as "0"
+    return "0" if value == 0 else f"{value:.6f}".rstrip("0").rstrip(".")
+
+
+def points_inside(geometry, n, rng, attempts=50):
+    """`n` random points inside `geometry` (rejection sampling in its bounds)."""
+    shapely.prepare(geometry)
+    xmin, ymin, xmax, ymax = geometry.bounds
+    xs, ys = [], []
+    found = 0
+    for _ in range(attempts):
+        x = rng.uniform(xmin, xmax, n * 4)
+        y = rng.uniform(ymin, ymax, n * 4)
+        inside = shapely.contains_xy(geometry, x, y)
+        xs.append(x[inside])
+        ys.append(y[inside])
+        found += int(inside.sum())
+        if found >= n:
+            break
+    x, y = np.concatenate(xs)[:n], np.concatenate(ys)[:n]
+    if len(x) < n:
+        # Slivers the sampling keeps missing: fall back to one interior point
+        point = geometry.representative_point()
+        x = np.concatenate([x, np.full(n - len(x), point.x)])
+        y = np.concatenate([y, np.full(n - len(y), point.y)])
+    return x, y
+
+
+def country_weights(countries, ne_path, sample_path):
+    """Share of stations per Natural Earth row, and where it came from."""
+    if sample_path and os.path.exists(sample_path):
+        names = pd.read_csv(sample_path, usecols=["country"], dtype=str)["country"]
+        positions = CountryIndex.load(ne_path).resolve_many(names).dropna().astype(int)
+        counts = positions.value_counts()
+        weights = np.array([counts.get(i, 0) for i in range(len(countries))], dtype=float)
+        if weights.sum() > 0:
+            return weights / weights.sum(), f"{sample_path} ({len(names):,} stations)"
+    population = countries["POP_EST"].fillna(0).clip(lower=10_000).to_numpy(dtype=float)
+    weights = population**COUNTRY_SKEW
+    return weights / weights.sum(), f"POP_EST ** {COUNTRY_SKEW}"
+
+
+def build_places(countries, expected, rng, r):
+    """Place names and coordinates per country, flattened, with each country's (start, count)."""
+    names, lats, lons, spans = [], [], [], []
+    for i, geometry in enumerate(countries.geometry):
+        count = int(min(MAX_PLACES, max(1, round(PLACES_PER_SQRT_STATION * np.sqrt(expected[i])))))
+        x, y = points_inside(geometry, count, rng)
+        spans.append((len(names), count))
+        names.extend(word(r) + (f" {word(r, 1, 2)}" if r.random() < 0.2 else "") for _ in range(count))
+        lons.extend(x)
+        lats.extend(y)
+    return np.array(names, dtype=object), np.array(lats), np.array(lons), np.array(spans)
+
+
+def country_variants(row):
+    """Spellings Radio Browser uses besides ADMIN."""
+    variants = {row["NAME"], row["NAME_LONG"], f"The {row['ADMIN'].title()}"}
+    variants.discard(row["ADMIN"])
+    return sorted(v for v in variants if isinstance(v, str)) or [row["ADMIN"]]
+
+
+def misspell(name, r):
+    if len(name) < 5:
+        return name
+    i = r.randint(1, len(name) - 3)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2 :]
+
+
+def station_name(r):
+    if r.random() < LONG_NAME_SHARE:
+        return " ".join(word(r) for _ in range(r.randint(6, 12)))
+    parts = [r.choice(NAME_PREFIXES), *(word(r) for _ in range(r.randint(1, 2)))]
+    suffix = r.choice(NAME_SUFFIXES)
+    if r.random() < 0.15:
+        suffix = f"{r.randint(87, 107)}.{r.randint(0, 9)} {suffix}".strip()
+    return " ".join(p for p in (*parts, suffix) if p)
+
+
+def stream_url(r, name, scheme):
+    n = r.randint(1, 39)
+    s = slug(name)[:24]
+    host = r.choice(STREAM_HOSTS).format(n=n, slug=s)
+    path = r.choice(STREAM_PATHS).format(n=n, slug=s)
+    # A mount point per stream, so separate stations on a shared host never
+    # get the same URL (only the cross-source duplicates do)
+    path = f"/{base62(r.getrandbits(47), 8)}{path}"
+    query = f"?listening-from-radio-garden={r.randrange(10**12, 10**13)}" if r.random() < 0.05 else ""
+    return f"{scheme}://{host}{path}{query}"
+
+
+def duplicate_url(url, r):
+    """The same stream as another source lists it."""
+    choice = r.randrange(4)
+    if choice == 0:
+        return url + "/"
+    if choice == 1:
+        return url.replace("https://", "http://", 1)
+    if choice == 2:
+        return url.split("?")[0]
+    return url
+
+
+def duplicate_name(name, r):
+    choice = r.randrange(4)
+    if choice == 0:
+        return name.upper()
+    if choice == 1:
+        return f"{name} FM" if not name.endswith("FM") else name[:-2].strip()
+    if choice == 2:
+        return name.replace("Radio ", "", 1)
+    return name
+
+
+# ==============================================================================
+# GENERATION
+# ==============================================================================
+
+
+def generate(output, stations, seed=SEED, ne_path=NE_INPUT, sample_path=SAMPLE_CRAWL):
+    """Write `stations` synthetic crawl rows to `output`. Returns a summary dict."""
+    rng = np.random.default_rng(seed)
+    r = random.Random(seed)
+    countries = read_layer(ne_path, columns=["ADMIN", "NAME", "NAME_LONG", "ISO_A2_EH", "POP_EST"])
+    countries = countries.reset_index(drop=True)
+    weights, weights_from = country_weights(countries, ne_path, sample_path)
+    place_names, place_lats, place_lons, spans = build_places(countries, weights * stations, rng, r)
+    variants = [country_variants(row) for _, row in countries.iterrows()]
+    codes = countries["ISO_A2_EH"].where(countries["ISO_A2_EH"] != "-99", "").fillna("").tolist()
+    admins = countries["ADMIN"].tolist()
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tmp_path = output + ".tmp"
+    written = 0
+    counts = np.zeros(len(countries), dtype=np.int64)
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        while written < stations:
+            n = min(BATCH_ROWS, stations - written)
+            country = rng.choice(len(countries), size=n, p=weights)
+            counts += np.bincount(country, minlength=len(countries))
+            start, count = spans[country, 0], spans[country, 1]
+            place = start + (rng.random(n) * count).astype(np.int64)
+            is_rb = rng.random(n) < RB_SHARE
+            has_coordinates = ~is_rb | (rng.random(n) < RB_COORDINATE_SHARE)
+            lat = np.where(has_coordinates, place_lats[place] + rng.normal(0, PLACE_JITTER_DEG, n), 0.0)
+            lon = np.where(has_coordinates, place_lons[place] + rng.normal(0, PLACE_JITTER_DEG, n), 0.0)
+            url_kind = rng.random(n)
+            country_kind = rng.random(n)
+            positions = np.arange(n)
+            duplicate_of = np.where(
+                (rng.random(n) < CROSS_SOURCE_DUPLICATE_SHARE) & (positions > 0),
+                (rng.random(n) * positions).astype(np.int64),
+                -1,
+            )
+            # Plain lists: indexing numpy arrays one element at a time is slow
+            country, place, is_rb, lat, lon, url_kind, country_kind, duplicate_of = (
+                a.tolist() for a in (country, place, is_rb, lat, lon, url_kind, country_kind, duplicate_of)
+            )
+
+            rows = []
+            for i in range(n):
+                row_id = written + i
+                c = country[i]
+                if duplicate_of[i] >= 0:
+                    # Another source's listing of an earlier station in this batch
+                    original = rows[duplicate_of[i]]
+                    source = "RG" if original[0] == "RB" else "RB"
+                    name = duplicate_name(original[2], r)
+                    url = duplicate_url(original[3], r) if original[3] else ""
+                    country_name = original[4]
+                    code = original[5] if source == "RB" else ""
+                    lat_s, lon_s, place_name = original[6], original[7], original[8]
+                else:
+                    source = "RB" if is_rb[i] else "RG"
+                    name = station_name(r)
+                    if url_kind[i] < MISSING_URL_SHARE:
+                        url = ""
+                    else:
+                        url = stream_url(r, name, "http" if url_kind[i] < MISSING_URL_SHARE + HTTP_SHARE else "https")
+                    country_name = admins[c]
+                    if country_kind[i] < UNKNOWN_COUNTRY_SHARE:
+                        country_name = r.choice(UNKNOWN_COUNTRIES)
+                    elif country_kind[i] < UNKNOWN_COUNTRY_SHARE + MISSPELLED_COUNTRY_SHARE:
+                        country_name = misspell(country_name, r)
+                    elif is_rb[i] and r.random() < COUNTRY_VARIANT_SHARE:
+                        country_name = r.choice(variants[c])
+                    code = codes[c] if is_rb[i] else ""
+                    lat_s, lon_s = format_coordinate(lat[i]), format_coordinate(lon[i])
+                    place_name = place_names[place[i]] if not is_rb[i] or r.random() < 0.6 else ""
+
+                if source == "RG":
+                    # Unique per row: the multiplier is coprime with 62**8
+                    channel_id = base62(row_id * 0x9E3779B97F4A7C15 % 62**8, 8)
+                    tags = language = ""
+                else:
+                    h = "%032x" % r.getrandbits(128)
+                    channel_id = f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{h[16:20]}-{h[20:]}"
+                    tags = ",".join(r.sample(TAGS, r.randint(0, 6)))
+                    language = r.choice(LANGUAGES) if r.random() < 0.7 else ""
+                homepage = f"https://www.{slug(name)[:20]}.{r.choice(TLDS)}/" if r.random() < 0.75 else ""
+                rows.append(
+                    [source, channel_id, name, url, country_name, code, lat_s, lon_s, place_name, tags, homepage, language]
+                )
+            writer.writerows(rows)
+            written += n
+    os.replace(tmp_path, output)
+
+    return {
+        "stations": stations,
+        "seed": seed,
+        "countries": int((counts > 0).sum()),
+        "largest": sorted(zip(counts.tolist(), admins), reverse=True)[:5],
+        "weights_from": weights_from,
+        "bytes": os.path.getsize(output),
+    }
+
+
+# ==============================================================================
+# MAIN PROCESSING
+# ==============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic crawl CSV.")
+    parser.add_argument("stations", type=int, help="Number of stations to write")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help=f"CSV path (default {DEFAULT_OUTPUT})")
+    args = parser.parse_args()
+
+    output = args.output or DEFAULT_OUTPUT.format(stations=args.stations)
+    console.print(f"\n[bold cyan]Generating {args.stations:,} synthetic stations...[/bold cyan]")
+    start = time.perf_counter()
+    summary = generate(output, args.stations, args.seed)
+    elapsed = time.perf_counter() - start
+
+    table = Table(title="Largest Countries")
+    table.add_column("Country", style="cyan")
+    table.add_column("Stations", justify="right", style="green")
+    for count, name in summary["largest"]:
+        table.add_row(name, f"{count:,}")
+    console.print(table)
+    console.print(
+        f"{summary['countries']} countries, mix from {summary['weights_from']}; "
+        f"{summary['bytes'] / 1024**2:,.1f} MB in {elapsed:.1f}s"
+    )
+    console.print(f"[bold green]✓ Saved to {output}[/bold green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
  * npm test -- dailyChallenge
  */
 
-import { readFileSync } from "fs";
+import { existsSync, readFileSync } from "fs";
 import { resolve } from "path";
 import { describe, expect, it } from "vitest";
 import { SeededRandom } from "../useRadio";
@@ -20,8 +20,8 @@ import { SeededRandom } from "../useRadio";
  */
 
 interface IndexStructure {
-  config: { line_length: number };
-  countries: Record<string, { start: number; count: number }>;
+  config: { line_length: number; layout?: string; compression?: string };
+  countries: Record<string, { file?: number; start: number; count: number }>;
 }
 
 /**
@@ -124,3 +124,63 @@ describe("daily challenge country selection", () => {
     expect(sortedNames.length).toBe(142);
   });
 });
+
+/**
+ * Parity check for the bundles written by data-prep/scripts/07_daily_bundles.py.
+ * Every bundled day must match what the TypeScript selection picks from
+ * index.json and the stations chunks.
+ */
+function checkBundles(dataDir: string) {
+  const indexData: IndexStructure = JSON.parse(
+    readFileSync(resolve(dataDir, "index.json"), "utf-8"),
+  );
+  const dailyIndex = JSON.parse(readFileSync(resolve(dataDir, "daily_index.json"), "utf-8"));
+  const daily = readFileSync(resolve(dataDir, "daily.jsonl"));
+  const sortedNames = Object.keys(indexData.countries).sort();
+  const lineLength = indexData.config.line_length;
+  const chunks = new Map<number, Buffer>();
+
+  for (let i = 0; i < dailyIndex.days; i++) {
+    const line = daily.subarray(i * dailyIndex.line_length, (i + 1) * dailyIndex.line_length);
+    const bundle = JSON.parse(line.toString("utf-8").trim());
+
+    const { country, stationIndices } = selectCountryAndStations(
+      bundle.seed,
+      sortedNames,
+      indexData.countries,
+    );
+    expect(bundle.country).toBe(country);
+
+    const { file = 0, start } = indexData.countries[country]!;
+    if (!chunks.has(file)) {
+      chunks.set(file, readFileSync(resolve(dataDir, `stations_${file}.jsonl`)));
+    }
+    const chunk = chunks.get(file)!;
+    const stations = stationIndices.map((idx) => {
+      const offset = start + idx * lineLength;
+      return JSON.parse(chunk.subarray(offset, offset + lineLength).toString("utf-8").trim());
+    });
+    expect(bundle.stations).toEqual(stations);
+  }
+}
+
+describe("daily challenge bundles match the TypeScript selection", () => {
+  // 14 days over five small countries (incl. non-ASCII names, which sort by
+  // UTF-16 code units), written by 07_daily_bundles.py with START_DATE =
+  // "2026-02-02" and DAYS = 14, its paths pointed at the fixture directory
+  it("fixture bundles", () => {
+    checkBundles(resolve(__dirname, "fixtures/daily"));
+  });
+
+  // The real bundles, once copy.sh has copied them (fixed-width, uncompressed only)
+  const dataDir = resolve(__dirname, "../../../public/data");
+  const indexPath = resolve(dataDir, "index.json");
+  const config: Partial<IndexStructure["config"]> = existsSync(indexPath)
+    ? JSON.parse(readFileSync(indexPath, "utf-8")).config
+    : {};
+  const fixedWidth = !config.layout && !config.compression && config.line_length;
+
+  it.skipIf(!existsSync(resolve(dataDir, "daily_index.json")) || !fixedWidth)("every bundled day", () => {
+    checkBundles(dataDir);
+  });
+});